@@ -0,0 +1,151 @@
+"""Mixed read throughput while code generation streams are in flight, async vs sync sessions.
+
+Runs the real app in-process against SQLite with the fake LLM provider. The
+"sync" mode serves the same reads the way the handlers did before, through a
+blocking Session on the event loop; "async" uses the AsyncSession handlers.
+Set DATABASE_URL to a MySQL database to include real network round trips:
+
+    python -m benchmarks.bench_async_db --projects 5000 --readers 16 --generations 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_async.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+os.environ.setdefault("RATE_LIMIT_RPS", "100000")
+os.environ.setdefault("RATE_LIMIT_BURST", "100000")
+os.environ.setdefault("RATE_LIMIT_GENERATE_PER_MINUTE", "100000")
+os.environ.setdefault("RATE_LIMIT_GENERATE_BURST", "100000")
+os.environ.setdefault("FAKE_LLM_LATENCY", "0.2")
+os.environ.setdefault("FAKE_LLM_TOKENS_PER_SECOND", "200")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import httpx
+from fastapi import Depends
+
+import main
+from models.database import Base, SessionLocal, engine
+from models.project import Project
+from models.user import User
+from services.auth_service import AuthService
+from services.db_service import DatabaseService
+
+STRUCTURE = {"frontend": {"files": ["src/pages/index.tsx"]}, "backend": {"files": ["main.py"]}}
+
+
+def legacy_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# The read handlers as they were before the AsyncSession layer
+@main.app.get("/bench/sync/projects")
+async def sync_list(limit: int = 20, db=Depends(legacy_db)):
+    items, _ = await DatabaseService.list_projects(db, limit)
+    return items
+
+
+@main.app.get("/bench/sync/projects/search")
+async def sync_search(q: str, db=Depends(legacy_db)):
+    return await DatabaseService.search_projects(db, q, 20)
+
+
+@main.app.get("/bench/sync/projects/{project_id}")
+async def sync_get(project_id: int, db=Depends(legacy_db)):
+    project = await DatabaseService.get_project(db, project_id)
+    return {"id": project.id, "name": project.name}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def seed(count):
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    owner = User(email="bench@example.com", username="bench", hashed_password="x")
+    db.add(owner)
+    db.commit()
+    for start in range(0, count, 1000):
+        db.add_all([
+            Project(name=f"project {i}", description=f"benchmark todo app {i}", project_type="web",
+                    structure=STRUCTURE, owner_id=owner.id)
+            for i in range(start, min(start + 1000, count))
+        ])
+        db.commit()
+    token = AuthService.create_access_token({"sub": str(owner.id)})
+    db.close()
+    return token
+
+
+async def run(client, token, mode, args):
+    prefix = "/api" if mode == "async" else "/bench/sync"
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    generations = 0
+    done = asyncio.Event()
+
+    async def reader(worker):
+        i = worker
+        while not done.is_set():
+            i += 1
+            path = (f"{prefix}/projects?limit=20", f"{prefix}/projects/{i % args.projects + 1}",
+                    f"{prefix}/projects/search?q=tod")[i % 3]
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+
+    async def generation():
+        nonlocal generations
+        while not done.is_set():
+            response = await client.post("/api/generate/stream", headers=headers,
+                                         json={"prompt": "todo app", "model": "fake",
+                                               "project_structure": STRUCTURE})
+            assert response.status_code == 200, response.text
+            generations += 1
+
+    tasks = [asyncio.create_task(generation()) for _ in range(args.generations)]
+    tasks += [asyncio.create_task(reader(w)) for w in range(args.readers)]
+    await asyncio.sleep(args.duration)
+    done.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "reads_per_sec": len(latencies) / args.duration,
+        "read_p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "read_p99_ms": percentile(latencies, 99),
+        "generations_per_sec": generations / args.duration,
+    }
+
+
+async def main_async(args):
+    token = seed(args.projects)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for mode in ("sync", "async"):
+            result = await run(client, token, mode, args)
+            print(f"{mode:>6}: " + "  ".join(f"{k}={v:.1f}" for k, v in result.items()))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=5000)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--generations", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
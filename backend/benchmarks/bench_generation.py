@@ -0,0 +1,207 @@
+"""Generation pipeline throughput and latency against the local OpenAI-compatible stub server.
+
+Every LLM call goes through the real provider client over HTTP to
+benchmarks.llm_stub_server, so connection pooling, per-provider concurrency
+limits and database writes are all part of the measurement while no API is
+paid for. Two scenarios:
+
+    pipeline  analyze_requirements -> generate_code -> DatabaseService.create_project, in-process
+    api       POST /api/generate, executed by an in-process GenerationWorker, polled until finished
+
+Results are printed and, with --output, written as JSON; --baseline prints
+the change of every metric against an earlier results file:
+
+    python -m benchmarks.bench_generation --scenario pipeline --concurrency 8 --output before.json
+    python -m benchmarks.bench_generation --scenario pipeline --concurrency 8 --baseline before.json
+    python -m benchmarks.bench_generation --latency pareto:0.5:2.5 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_generation.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+os.environ.setdefault("RATE_LIMIT_RPS", "100000")
+os.environ.setdefault("RATE_LIMIT_BURST", "100000")
+os.environ.setdefault("RATE_LIMIT_GENERATE_PER_MINUTE", "100000")
+os.environ.setdefault("RATE_LIMIT_GENERATE_BURST", "100000")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("JOB_WORKERS", "0")
+
+import httpx
+
+import main
+from benchmarks.harness import LoopLagMonitor, compare_results, result_document, summarize, write_results
+from benchmarks.llm_stub_server import StubServer, add_stub_arguments, stub_config
+from config import settings
+from models.database import AsyncSessionLocal, Base, SessionLocal, engine
+from models.user import User
+from services.ai_service import AICodeGenerator
+from services.auth_service import AuthService
+from services.db_service import DatabaseService
+from services.job_service import GenerationWorker
+
+
+def seed():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    owner = User(email="bench@example.com", username="bench", hashed_password="x")
+    db.add(owner)
+    db.commit()
+    owner_id = owner.id
+    db.close()
+    return owner_id
+
+
+def pipeline_scenario(generator, client, owner_id, args, timings):
+    async def pipeline(i):
+        start = time.perf_counter()
+        structure = await generator.analyze_requirements(f"benchmark todo app {i}", args.model)
+        analyzed = time.perf_counter()
+        files = await generator.generate_code(structure)
+        generated = time.perf_counter()
+        db = SessionLocal()
+        try:
+            await DatabaseService.create_project(db, f"benchmark todo app {i}", "web", structure,
+                                                 files, owner_id, args.model)
+        finally:
+            db.close()
+        persisted = time.perf_counter()
+        timings["analyze"].append(analyzed - start)
+        timings["generate"].append(generated - analyzed)
+        timings["persist"].append(persisted - generated)
+        timings["total"].append(persisted - start)
+
+    return pipeline
+
+
+def api_scenario(generator, client, owner_id, args, timings):
+    token = AuthService.create_access_token({"sub": str(owner_id)})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def pipeline(i):
+        start = time.perf_counter()
+        response = await client.post("/api/generate", headers=headers,
+                                     json={"prompt": f"benchmark todo app {i}", "model": args.model})
+        assert response.status_code == 202, response.text
+        job = response.json()
+        while job["status"] in ("queued", "running"):
+            await asyncio.sleep(args.poll_interval)
+            job = (await client.get(f"/api/generate/jobs/{job['id']}", headers=headers)).json()
+        if job["status"] != "succeeded":
+            raise RuntimeError(job["error"])
+        created, started, finished = (
+            datetime.fromisoformat(job[field]) for field in ("created_at", "started_at", "finished_at")
+        )
+        timings["queue_wait"].append((started - created).total_seconds())
+        timings["run"].append((finished - started).total_seconds())
+        timings["total"].append(time.perf_counter() - start)
+
+    return pipeline
+
+
+SCENARIOS = {"pipeline": pipeline_scenario, "api": api_scenario}
+
+
+async def run(args, base_url):
+    settings.OPENAI_API_BASE = base_url
+    settings.DEEPSEEK_API_BASE = base_url
+    generator = AICodeGenerator()
+    generator.default_model = args.model
+    owner_id = seed()
+    timings = defaultdict(list)
+    failures = []
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=60)
+    pipeline = SCENARIOS[args.scenario](generator, client, owner_id, args, timings)
+
+    worker = None
+    if args.scenario == "api":
+        worker = GenerationWorker(AsyncSessionLocal, generator=generator, concurrency=args.workers,
+                                  poll_interval=args.poll_interval, retry_backoff=0)
+        worker.start()
+
+    done = asyncio.Event()
+    counter = iter(range(1_000_000_000))
+
+    async def loop():
+        while not done.is_set():
+            try:
+                await pipeline(next(counter))
+            except Exception as e:
+                failures.append(str(e) or type(e).__name__)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(loop()) for _ in range(args.concurrency)]
+    await asyncio.sleep(args.duration)
+    done.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    loop_lag = await monitor.stop()
+
+    if worker:
+        await worker.stop()
+    await client.aclose()
+    await generator.providers.aclose()
+
+    completed = len(timings["total"])
+    return {
+        "pipelines": completed,
+        "failures": len(failures),
+        "elapsed_sec": elapsed,
+        "pipelines_per_sec": completed / elapsed,
+        "latency_ms": {stage: summarize(samples) for stage, samples in timings.items()},
+        "loop_lag_ms": loop_lag,
+        "hedging": {key: value for key, value in generator.hedging.stats.items() if key != "latency"},
+        "single_flight": generator.single_flight.stats,
+    }, failures
+
+
+async def main_async(args):
+    config = dict(vars(args))
+    config.pop("output")
+    config.pop("baseline")
+    if args.base_url:
+        results, failures = await run(args, args.base_url)
+    else:
+        with StubServer(stub_config(args)) as stub:
+            results, failures = await run(args, stub.base_url)
+            results["stub"] = stub.stats
+            results["llm_requests_per_sec"] = stub.stats["requests"] / results["elapsed_sec"]
+
+    document = result_document("bench_generation", config, results)
+    print(json.dumps(document, indent=2, sort_keys=True))
+    if failures:
+        print(f"{len(failures)} pipelines failed, first error: {failures[0]}")
+    if args.output:
+        write_results(args.output, document)
+    if args.baseline:
+        print("\n".join(compare_results(args.baseline, document)))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="pipeline")
+    parser.add_argument("--concurrency", type=int, default=8, help="pipelines in flight")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--model", default="gpt-4-turbo-preview")
+    parser.add_argument("--workers", type=int, default=4, help="GenerationWorker concurrency (api scenario)")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--base-url", help="use an already running OpenAI-compatible server instead of the stub")
+    parser.add_argument("--output", help="write the results JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    add_stub_arguments(parser)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,101 @@
+"""Compare per-row ORM writes of project files with the bulk/diff write path.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_project_files --files 500 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.database import Base
+from models.project import Project, ProjectFile
+from models.user import User
+import models.collaboration  # noqa: F401  (registers relationship targets)
+import models.project_share  # noqa: F401
+from services.blob_store import BlobStore
+from services.db_service import DatabaseService
+
+
+def make_files(count: int, revision: int = 0, changed_every: int = 1):
+    return {
+        f"backend/module_{i}.py": f"# revision {revision if i % changed_every == 0 else 0}\n" + "x = 1\n" * 200
+        for i in range(count)
+    }
+
+
+def orm_create(db, files, owner_id):
+    project = Project(description="bench", project_type="web", structure={}, owner_id=owner_id)
+    db.add(project)
+    db.flush()
+    hashes = BlobStore.put_files(db, files)
+    for file_path in files:
+        db.add(ProjectFile(project_id=project.id, file_path=file_path, blob_hash=hashes[file_path], file_type="backend"))
+    db.commit()
+    return project.id
+
+
+def orm_save(db, project_id, files):
+    db.query(ProjectFile).filter(ProjectFile.project_id == project_id).delete()
+    hashes = BlobStore.put_files(db, files)
+    for file_path in files:
+        db.add(ProjectFile(project_id=project_id, file_path=file_path, blob_hash=hashes[file_path], file_type="backend"))
+    db.commit()
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return min(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--changed-every", type=int, default=10,
+                        help="rewrite every Nth file when re-saving")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    owner = User(email="bench@example.com", username="bench", hashed_password="x")
+    db.add(owner)
+    db.commit()
+
+    files = make_files(args.files)
+    revisions = iter(range(1, 10 ** 6))
+
+    results = {
+        "create_orm_ms": timed(lambda: orm_create(db, files, owner.id), args.rounds),
+        "create_bulk_ms": timed(lambda: asyncio.run(DatabaseService.create_project(
+            db, "bench", "web", {}, files, owner.id)), args.rounds),
+    }
+
+    project_id = orm_create(db, files, owner.id)
+    results["save_orm_ms"] = timed(
+        lambda: orm_save(db, project_id, make_files(args.files, next(revisions), args.changed_every)),
+        args.rounds)
+    results["save_diff_ms"] = timed(
+        lambda: asyncio.run(DatabaseService.save_project_files(
+            db, project_id, make_files(args.files, next(revisions), args.changed_every))),
+        args.rounds)
+
+    print(f"files={args.files} changed_every={args.changed_every} (best of {args.rounds})")
+    for name, value in results.items():
+        print(f"{name:>16}: {value:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compare OFFSET pagination of full project rows with keyset pagination of the listing projection.
+
+Run from the backend directory (the first run seeds the database, which takes a while at 1M rows):
+
+    python -m benchmarks.bench_project_listing --projects 1000000 --db /tmp/projects.db
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, desc, text
+from sqlalchemy.orm import sessionmaker
+
+from models.database import Base
+from models.project import Project
+import models.user  # noqa: F401  (registers relationship targets)
+import models.collaboration  # noqa: F401
+import models.project_share  # noqa: F401
+from services.db_service import DatabaseService
+from utils.pagination import encode_cursor
+
+
+def seed(engine, count: int, structure_size: int):
+    with engine.connect() as conn:
+        existing = conn.execute(text("SELECT COUNT(*) FROM projects")).scalar()
+    if existing >= count:
+        return
+    structure = {"frontend": {"files": ["x" * 32] * (structure_size // 32)}}
+    start = datetime(2024, 1, 1)
+    batch = 10000
+    with engine.begin() as conn:
+        for offset in range(existing, count, batch):
+            conn.execute(
+                Project.__table__.insert(),
+                [
+                    {
+                        "name": f"project {i}",
+                        "description": f"benchmark project {i}",
+                        "project_type": "web" if i % 4 else "mobile",
+                        "model": "fake",
+                        "structure": structure,
+                        # Second resolution so that many rows share a created_at and the id tiebreak matters
+                        "created_at": start + timedelta(seconds=i // 3),
+                        "updated_at": start,
+                    }
+                    for i in range(offset, min(offset + batch, count))
+                ]
+            )
+
+
+def offset_page(db, skip, limit):
+    return db.query(Project).order_by(desc(Project.created_at)).offset(skip).limit(limit).all()
+
+
+def keyset_walk(db, pages, limit):
+    """Follow cursors from the first page and return the cursor reached after ``pages`` pages"""
+    cursor = None
+    for _ in range(pages):
+        _, cursor = asyncio.run(DatabaseService.list_projects(db, limit, cursor=cursor))
+    return cursor
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return min(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--structure-size", type=int, default=2048,
+                        help="approximate bytes of structure JSON per project")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_projects.db"),
+                        help="SQLite file, reused between runs")
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    Base.metadata.create_all(engine)
+    seed(engine, args.projects, args.structure_size)
+    db = sessionmaker(bind=engine)()
+
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM projects WHERE (created_at, id) < (:c, :i) "
+        "ORDER BY created_at DESC, id DESC LIMIT 51"
+    ), {"c": "2024-06-01 00:00:00", "i": 1}).fetchall()
+    print("keyset plan:", "; ".join(row[-1] for row in plan))
+
+    print(f"projects={args.projects} limit={args.limit} (best of {args.rounds}, ms)")
+    print(f"{'depth':>10} {'offset_full':>12} {'keyset_slim':>12}")
+    for depth in (0, args.projects // 100, args.projects // 10, args.projects // 2, args.projects - args.limit):
+        depth = max(depth, 0)
+        # Position a cursor at the same depth as the offset; walking there is not part of the measurement
+        if depth:
+            last = db.query(Project.created_at, Project.id).order_by(
+                desc(Project.created_at), desc(Project.id)).offset(depth - 1).limit(1).one()
+            cursor = encode_cursor(last.created_at, last.id)
+        else:
+            cursor = None
+        offset_ms = timed(lambda: offset_page(db, depth, args.limit), args.rounds)
+        keyset_ms = timed(lambda: asyncio.run(DatabaseService.list_projects(db, args.limit, cursor=cursor)),
+                          args.rounds)
+        db.expunge_all()
+        print(f"{depth:>10} {offset_ms:>12.1f} {keyset_ms:>12.1f}")
+
+    walk_pages = 20
+    print(f"keyset walk of {walk_pages} pages: {timed(lambda: keyset_walk(db, walk_pages, args.limit), 1):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measure the per-request overhead of RateLimitMiddleware.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_rate_limit --requests 20000 --clients 1000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from middleware.rate_limit import MemoryBackend, RateLimiter, RateLimitMiddleware, SQLiteBackend
+from services.auth_service import AuthService
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def send(message):
+    pass
+
+
+def make_scopes(count, clients):
+    tokens = [AuthService.create_access_token({"sub": str(i)}) for i in range(clients)]
+    return [
+        {
+            "type": "http",
+            "path": "/api/generate" if i % 10 == 0 else "/api/projects/1",
+            "method": "POST" if i % 10 == 0 else "GET",
+            "client": (f"10.0.{(i % clients) // 256}.{(i % clients) % 256}", 1234),
+            "headers": [(b"authorization", f"Bearer {tokens[i % clients]}".encode())],
+        }
+        for i in range(count)
+    ]
+
+
+async def run(handler, scopes):
+    start = time.perf_counter()
+    for scope in scopes:
+        await handler(scope, None, send)
+    return (time.perf_counter() - start) / len(scopes) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=1000)
+    args = parser.parse_args()
+
+    scopes = make_scopes(args.requests, args.clients)
+    path = os.path.join(tempfile.mkdtemp(), "limits.db")
+    handlers = {
+        "no limiter": app,
+        "memory backend": RateLimitMiddleware(app, RateLimiter(
+            RateLimiter.from_env().rules, MemoryBackend())),
+        "sqlite backend": RateLimitMiddleware(app, RateLimiter(
+            RateLimiter.from_env().rules, SQLiteBackend(path))),
+    }
+
+    baseline = None
+    print(f"requests={args.requests} clients={args.clients}")
+    for name, handler in handlers.items():
+        per_request = asyncio.run(run(handler, scopes))
+        baseline = per_request if baseline is None else baseline
+        print(f"{name:>16}: {per_request:7.2f} us/request (+{per_request - baseline:.2f} us)")
+
+
+if __name__ == "__main__":
+    main()
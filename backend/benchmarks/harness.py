@@ -0,0 +1,101 @@
+"""Measurement helpers shared by the benchmarks: latency summaries, event-loop lag, JSON results."""
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def summarize(samples: Iterable[float], scale: float = 1000) -> Dict[str, float]:
+    """p50/p95/p99/max of ``samples`` in seconds, reported in milliseconds by default"""
+    samples = [sample * scale for sample in samples]
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples, default=0.0),
+    }
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes a sleeping task
+
+    Anything that blocks the loop (sync database calls, JSON encoding of
+    large payloads) delays every request in the process by the same amount.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - start - self.interval, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        return summarize(self.samples)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_document(benchmark: str, config: Dict, results: Dict) -> Dict:
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def write_results(path: str, document: Dict):
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def compare_results(baseline_path: str, document: Dict) -> List[str]:
+    """One line per metric present in both runs, with the relative change"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before, after = flatten(baseline["results"]), flatten(document["results"])
+    lines = [f"baseline {baseline.get('commit') or 'unknown'} -> current {document.get('commit') or 'unknown'}"]
+    for name in sorted(before.keys() & after.keys()):
+        change = (after[name] - before[name]) / before[name] * 100 if before[name] else 0.0
+        lines.append(f"{name:<40} {before[name]:>12.2f} {after[name]:>12.2f} {change:>+8.1f}%")
+    return lines
@@ -0,0 +1,216 @@
+"""OpenAI-compatible chat completion stub with configurable latency, token rate and errors.
+
+Serves /v1/chat/completions (plain and streamed) and /v1/models, so the real
+provider clients, connection pools and concurrency limits can be load-tested
+without paying for API calls. Run it standalone and point the app at it:
+
+    python -m benchmarks.llm_stub_server --port 8900 --latency lognormal:0.8:0.6 --tokens-per-second 80
+    OPENAI_API_BASE=http://127.0.0.1:8900/v1 DEEPSEEK_API_BASE=http://127.0.0.1:8900/v1 uvicorn main:app
+
+or in-process from a benchmark with ``StubServer``. Latency is the time to
+the first token, drawn from one of:
+
+    fixed:SECONDS  uniform:LOW:HIGH  lognormal:MEDIAN:SIGMA  pareto:SCALE:ALPHA
+
+Injected errors are answered with ``--error-status``; note the OpenAI SDK
+retries 429 and 5xx responses itself before the app sees a failure.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class LatencyDistribution:
+    """Time to first token, parsed from ``kind:param[:param]``"""
+
+    KINDS = {"fixed": 1, "uniform": 2, "lognormal": 2, "pareto": 2}
+
+    def __init__(self, spec: str, rng: Optional[random.Random] = None):
+        kind, *params = spec.split(":")
+        if self.KINDS.get(kind) != len(params):
+            raise ValueError(f"Invalid latency distribution {spec!r}, expected one of {', '.join(self.KINDS)}")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(param) for param in params]
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return self.rng.lognormvariate(math.log(median), sigma)
+        scale, alpha = self.params
+        return scale * self.rng.paretovariate(alpha)
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency: str = "fixed:0.2",
+        tokens_per_second: float = 200,
+        completion_tokens: int = 300,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        seed: Optional[int] = None
+    ):
+        self.rng = random.Random(seed)
+        self.latency = LatencyDistribution(latency, self.rng)
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI()
+    stats = {"requests": 0, "streams": 0, "errors": 0, "completion_tokens": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def respond(body: Dict) -> List[str]:
+        messages = body.get("messages") or [{"content": ""}]
+        prompt = messages[-1].get("content", "")
+        if "JSON format" in prompt:
+            # Unique per request, so per-file prompts of different pipelines never coincide
+            return [json.dumps({
+                "frontend": {"framework": "next.js"},
+                "backend": {"framework": "fastapi"},
+                "request": stats["requests"],
+            })]
+        count = min(config.completion_tokens, int(body.get("max_tokens") or config.completion_tokens))
+        return ["# generated by stub\n"] + ["pass\n"] * max(count - 1, 0)
+
+    def envelope(body: Dict, **fields) -> Dict:
+        return {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()),
+                "model": body.get("model", "stub"), **fields}
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "benchmark"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if config.error_rate and config.rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=config.error_status, content={
+                "error": {"message": "Injected stub error", "type": "server_error", "code": None}
+            })
+        tokens = respond(body)
+        delay = config.latency.sample()
+        per_token = 1 / config.tokens_per_second if config.tokens_per_second else 0.0
+        stats["completion_tokens"] += len(tokens)
+
+        if not body.get("stream"):
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(delay + len(tokens) * per_token)
+            finally:
+                stats["in_flight"] -= 1
+            return envelope(
+                body, object="chat.completion",
+                choices=[{"index": 0, "finish_reason": "stop",
+                          "message": {"role": "assistant", "content": "".join(tokens)}}],
+                usage={"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            )
+
+        async def stream():
+            stats["streams"] += 1
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(delay)
+                for token in tokens:
+                    chunk = envelope(body, object="chat.completion.chunk", choices=[
+                        {"index": 0, "finish_reason": None, "delta": {"content": token}}
+                    ])
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(per_token)
+                done = envelope(body, object="chat.completion.chunk",
+                                choices=[{"index": 0, "finish_reason": "stop", "delta": {}}])
+                yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    app.state.stats = stats
+    return app
+
+
+class StubServer:
+    """Run the stub on its own thread and event loop, so it never competes with the measured loop"""
+
+    def __init__(self, config: StubConfig, host: str = "127.0.0.1", port: int = 0):
+        self.app = create_app(config)
+        self.socket = socket.socket()
+        self.socket.bind((host, port))
+        self.host, self.port = self.socket.getsockname()[:2]
+        self.server = uvicorn.Server(uvicorn.Config(self.app, log_level="warning", lifespan="off"))
+        self._thread = threading.Thread(target=self.server.run, kwargs={"sockets": [self.socket]}, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self.app.state.stats)
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("LLM stub server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join()
+        self.socket.close()
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="fixed:0.2", help="time to first token distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def stub_config(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(args.latency, args.tokens_per_second, args.completion_tokens,
+                      args.error_rate, args.error_status, args.seed)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(stub_config(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,114 @@
+"""Load test: /health latency while concurrent logins hash passwords.
+
+Runs the real app in-process against a SQLite database and compares hashing
+inline on the event loop with hashing on the PasswordHasher pool:
+
+    python -m benchmarks.load_login --logins 40 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+os.environ.setdefault("RATE_LIMIT_RPS", "100000")
+os.environ.setdefault("RATE_LIMIT_BURST", "100000")
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+import models.database
+from models.database import Base
+from models.user import User
+from services.auth_service import AuthService
+from services.password_hasher import PasswordHasher
+
+EMAIL = "load@example.com"
+PASSWORD = "correct horse battery staple"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(client, logins, concurrency):
+    health = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/health")
+            health.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.01)
+
+    async def login_worker(count):
+        for _ in range(count):
+            response = await client.post("/api/auth/token", json={"username": EMAIL, "password": PASSWORD})
+            assert response.status_code == 200, response.text
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*[login_worker(logins // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return {
+        "logins_per_sec": logins / elapsed,
+        "health_p50_ms": statistics.median(health),
+        "health_p99_ms": percentile(health, 99),
+        "health_max_ms": max(health),
+    }
+
+
+async def main_async(args):
+    engine = create_engine(
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}",
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[main.get_db] = override_get_db
+    main.app.dependency_overrides[models.database.get_db] = override_get_db
+
+    db = Session()
+    db.add(User(email=EMAIL, username="load", hashed_password=AuthService.get_password_hash(PASSWORD)))
+    db.commit()
+    db.close()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode, workers in (("inline", 0), ("pool", args.workers)):
+            AuthService.password_hasher = PasswordHasher(
+                AuthService.pwd_context, max_workers=workers, max_queue=args.logins
+            )
+            result = await run(client, args.logins, args.concurrency)
+            print(f"{mode:>6}: " + "  ".join(f"{k}={v:.1f}" for k, v in result.items()))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
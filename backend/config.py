@@ -8,19 +8,101 @@ class Settings(BaseSettings):
     DB_MAX_OVERFLOW: int = 10
     DB_POOL_TIMEOUT: int = 30
     DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Server-side connection limit (MySQL max_connections), used for pool sizing warnings
+    DB_MAX_CONNECTIONS: int = 151
+    # Worker processes sharing DB_MAX_CONNECTIONS
+    WEB_CONCURRENCY: int = 1
     
     # Security configuration
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 60
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    ACCESS_CACHE_SIZE: int = 10000
+    ACCESS_CACHE_TTL: float = 30
     
     # OpenAI configuration
     OPENAI_API_KEY: str
+    OPENAI_API_BASE: Optional[str] = None
+    OPENAI_MAX_CONCURRENCY: int = 4
     
     # DeepSeek configuration
     DEEPSEEK_API_KEY: str
     DEEPSEEK_API_BASE: str = "https://api.deepseek.com/v1"
+    DEEPSEEK_MAX_CONCURRENCY: int = 4
     DEFAULT_LLM_MODEL: str = "deepseek-coder-33b-instruct"  # or gpt-4-turbo-preview
     
+    # LLM client configuration
+    LLM_FILE_TIMEOUT: float = 120
+    LLM_STREAM_BUFFER: int = 256
+    LLM_PROMPT_TOKEN_BUDGET: int = 3000
+    LLM_SINGLE_FLIGHT: bool = True
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    LLM_KEEPALIVE_EXPIRY: float = 60
+    LLM_CONNECT_TIMEOUT: float = 10
+    LLM_READ_TIMEOUT: float = 120
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LLM_CACHE_TTL: float = 86400
+    # Sampled completions are only cached when raised above 0, e.g. to 0.7
+    LLM_CACHE_MAX_TEMPERATURE: float = 0
+    LLM_CACHE_PATH: Optional[str] = None
+    # Comma-separated provider=model pairs used as hedge backups
+    LLM_HEDGE_MODELS: str = "openai=gpt-4-turbo-preview,deepseek=deepseek-coder-33b-instruct"
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_DEFAULT_DELAY: float = 10
+    LLM_HEDGE_MIN_DELAY: float = 0.5
+    LLM_HEDGE_MAX_DELAY: float = 60
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    FAKE_LLM_LATENCY: float = 0.5
+    FAKE_LLM_TOKENS_PER_SECOND: float = 200
+    FAKE_LLM_ERROR_RATE: float = 0
+    FAKE_LLM_MAX_CONCURRENCY: int = 64
+    
+    # Storage configuration
+    BLOB_COMPRESSION: str = "zlib"  # none / zlib / zstd
+    BLOB_COMPRESSION_MIN_SIZE: int = 256
+    VERSION_DELTA_STORAGE: bool = True
+    VERSION_SNAPSHOT_INTERVAL: int = 10
+    SEARCH_BACKEND: str = "auto"  # auto / memory
+    SEARCH_INDEX_FILE_CONTENTS: bool = False
+    SEARCH_MAX_CONTENT_BYTES: int = 1024 * 1024
+    STATS_CACHE_TTL: float = 10
+    STATS_RECONCILE_INTERVAL: float = 3600
+    
+    # Rate limiting configuration
+    RATE_LIMIT_BACKEND: str = "memory"  # memory / sqlite
+    RATE_LIMIT_SQLITE_PATH: str = "rate_limits.db"
+    RATE_LIMIT_MAX_KEYS: int = 10000
+    RATE_LIMIT_RPS: float = 10
+    RATE_LIMIT_BURST: int = 20
+    RATE_LIMIT_GENERATE_PER_MINUTE: float = 10
+    RATE_LIMIT_GENERATE_BURST: int = 3
+    
+    # Generation job configuration
+    JOB_WORKERS: int = 2
+    JOB_POLL_INTERVAL: float = 1
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 30
+    JOB_LEASE_SECONDS: float = 60
+    
+    # Observability configuration
+    METRICS_MULTIPROC_DIR: str = ""
+    METRICS_FLUSH_INTERVAL: float = 5
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json / text
+    LOG_FILE: str = "logs/app.log"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_ROTATE_WHEN: str = ""
+    LOG_BACKUP_COUNT: int = 5
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_DEBUG_SAMPLE_RATE: float = 0.1
+    
     # Server configuration
     HOST: str = "0.0.0.0"
     PORT: int = 80
@@ -28,5 +110,7 @@ class Settings(BaseSettings):
     
     class Config:
         env_file = ".env"
+        # Undeclared keys in .env are ignored rather than rejected
+        extra = "ignore"
 
 settings = Settings() 
\ No newline at end of file
@@ -1,23 +1,40 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
+import asyncio
+import json
 
 # 导入其他必要的模块
-from models.database import SessionLocal, engine
+from models.database import SessionLocal, AsyncSessionLocal, get_async_db, pool_stats
 from models.user import User             # 新增：导入User类型
+from models.project import Project
+from models import project_share, collaboration, generation_job  # 注册 ORM 关系所引用的模型
 from services import ai_service, user_service, project_service
-from services.ai_service import AIService
+from services.ai_service import AIService, AICodeGenerator, get_code_generator, close_code_generator
 from services.user_service import UserService
 from services.project_service import ProjectService
+from services.async_db_service import AsyncDatabaseService
+from services.stats_service import StatsService, STATS_RECONCILE_INTERVAL
+from services.job_service import JobService, GenerationWorker, JOB_WORKERS
 from services.auth_service import AuthService, get_current_user
-from schemas.project import ProjectCreate, ProjectResponse
+from schemas.project import ProjectCreate, ProjectResponse, ProjectListItem, ProjectSearchResult
+from schemas.generation_job import GenerationJobResponse
+from middleware.compression import StreamingAwareGZipMiddleware
+from middleware.rate_limit import RateLimitMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.request_id import RequestIdMiddleware, REQUEST_ID_HEADER
+from utils.metrics import metrics, run_flusher
+from utils.logger import setup_logger, shutdown_logger
 
 app = FastAPI()
 
+# 添加限流中间件（放在 CORS 内层，429 响应也带 CORS 头）
+app.add_middleware(RateLimitMiddleware)
+
 # 添加 CORS 中间件
 app.add_middleware(
     CORSMiddleware,
@@ -25,83 +42,251 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", REQUEST_ID_HEADER],
 )
 
 # 添加可信主机中间件
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
-# 添加压缩中间件
-app.add_middleware(GZipMiddleware)
+# 添加压缩中间件（流式接口不压缩，保证事件及时推送）
+app.add_middleware(StreamingAwareGZipMiddleware)
+
+# 添加指标中间件（最外层，限流返回的 429 也计入各路由的延迟直方图）
+app.add_middleware(MetricsMiddleware)
+
+# 添加请求 ID 中间件（最外层，所有中间件和路由的日志都带上请求 ID）
+app.add_middleware(RequestIdMiddleware)
+
+# 日志经队列交给后台线程写出，请求路径上不做格式化和磁盘 I/O
+@app.on_event("startup")
+async def start_logging():
+    setup_logger()
+
+# 启动时开始定期校准项目统计计数器（STATS_RECONCILE_INTERVAL 为 0 时关闭）
+@app.on_event("startup")
+async def start_stats_reconciler():
+    if STATS_RECONCILE_INTERVAL > 0:
+        app.state.stats_reconciler = asyncio.create_task(
+            StatsService.run_reconciler(SessionLocal, STATS_RECONCILE_INTERVAL)
+        )
+
+# 启动生成任务工作池（JOB_WORKERS 为 0 时本进程只入队不执行）
+@app.on_event("startup")
+async def start_generation_workers():
+    if JOB_WORKERS > 0:
+        app.state.job_worker = GenerationWorker(AsyncSessionLocal)
+        app.state.job_worker.start()
+
+# 多 worker 部署时定期写出本进程的指标快照，/metrics 合并所有 worker
+@app.on_event("startup")
+async def start_metrics_flusher():
+    if metrics.multiproc_dir:
+        app.state.metrics_flusher = asyncio.create_task(run_flusher(metrics))
+
+# 关闭时释放 LLM 提供方的连接池和密码哈希线程池
+@app.on_event("shutdown")
+async def shutdown_llm_providers():
+    reconciler = getattr(app.state, "stats_reconciler", None)
+    if reconciler:
+        reconciler.cancel()
+    flusher = getattr(app.state, "metrics_flusher", None)
+    if flusher:
+        flusher.cancel()
+        metrics.flush()
+    # 未完成的生成任务退回队列，由其他工作进程接手
+    job_worker = getattr(app.state, "job_worker", None)
+    if job_worker:
+        await job_worker.stop()
+    await close_code_generator()
+    AuthService.password_hasher.shutdown()
+    shutdown_logger()
 
-# 依赖项：获取数据库会话
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# 依赖项：获取异步数据库会话（与认证依赖共用同一个函数，测试中覆盖一次即可）
+get_db = get_async_db
 
-# 请求模型
+# 生成任务请求模型：未提供项目结构时由工作进程先进行需求分析
 class GenerateRequest(BaseModel):
     prompt: str
-    language: Optional[str] = "python"
-    
-# 响应模型
-class GenerateResponse(BaseModel):
-    code: str
-    message: Optional[str] = None
-
-@app.post("/api/generate", response_model=GenerateResponse)
-async def generate_code(request: GenerateRequest, db: Session = Depends(get_db)):
-    try:
-        # 调用 AI 服务生成代码
-        generated_code = await ai_service.generate_code(
-            prompt=request.prompt,
-            language=request.language,
-            db=db
-        )
-        return GenerateResponse(code=generated_code)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    model: Optional[str] = None
+    project_structure: Optional[Dict[str, Any]] = None
+    project_type: str = "web"
+    priority: int = Field(0, ge=0, le=9)
+
+# 增量重新生成请求模型：只重新生成受结构变更影响的文件
+class RegenerateRequest(BaseModel):
+    project_structure: Dict[str, Any]
+    model: Optional[str] = None
+    priority: int = Field(0, ge=0, le=9)
+
+# 流式生成请求模型：未提供项目结构时先进行需求分析
+class StreamGenerateRequest(BaseModel):
+    prompt: str
+    model: Optional[str] = None
+    project_structure: Optional[Dict[str, Any]] = None
+
+# 认证请求模型
+class LoginRequest(BaseModel):
+    username: str  # 邮箱
+    password: str
+
+class RegisterRequest(BaseModel):
+    email: str
+    username: str
+    password: str
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# 生成任务：入队后立即返回任务 ID，由后台工作池执行，客户端轮询进度与结果
+@app.post("/api/generate", status_code=202, response_model=GenerationJobResponse)
+async def enqueue_generation(
+    request: GenerateRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    return await JobService.enqueue(
+        db, user.id, request.prompt, request.model, request.project_structure,
+        request.project_type, request.priority
+    )
+
+@app.get("/api/generate/jobs/{job_id}", response_model=GenerationJobResponse)
+async def get_generation_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    return await JobService.get_job(db, job_id, user)
+
+# 取消任务：排队中的任务立即取消，执行中的任务由工作进程在下次心跳时停止
+@app.delete("/api/generate/jobs/{job_id}", response_model=GenerationJobResponse)
+async def cancel_generation_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    return await JobService.cancel_job(db, job_id, user)
+
+# 增量重新生成：与已保存的项目结构比较，未受影响的文件沿用原内容（需要写权限）
+@app.post("/api/projects/{project_id}/regenerate", status_code=202, response_model=GenerationJobResponse)
+async def enqueue_regeneration(
+    project_id: int,
+    request: RegenerateRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    return await JobService.enqueue_regeneration(
+        db, project_id, request.project_structure, user, request.model, request.priority
+    )
+
+@app.post("/api/generate/stream")
+async def generate_code_stream(
+    request: StreamGenerateRequest,
+    user: User = Depends(get_current_user),
+    generator: AICodeGenerator = Depends(get_code_generator)
+):
+    async def event_stream():
+        structure = request.project_structure
+        if structure is None:
+            try:
+                structure = await generator.analyze_requirements(request.prompt, request.model)
+            except Exception as e:
+                yield format_sse("error", {"detail": str(e)})
+                return
+            yield format_sse("structure", structure)
+        async for event in generator.stream_code(structure, model=request.model):
+            yield format_sse(event.pop("event"), event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # 健康检查接口
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
 
+# 连接池状态：检出次数、溢出连接与等待时间，用于发现连接池耗尽
+@app.get("/health/db")
+def database_pool_health():
+    return pool_stats()
+
+# Prometheus 指标：路由延迟、数据库查询与连接池、LLM 调用与缓存命中率（同步函数，在线程池中合并快照）
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 认证路由：密码哈希在独立线程池中执行，不阻塞事件循环
+@app.post("/api/auth/token")
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
+    user = await UserService.authenticate_user(db, request.username, request.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    return {
+        "access_token": AuthService.create_access_token({"sub": str(user.id)}),
+        "token_type": "bearer"
+    }
+
+@app.post("/api/auth/register")
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db)):
+    user = await UserService.create_user(db, request.email, request.username, request.password)
+    return {"id": user.id, "email": user.email, "username": user.username}
+
 # 项目管理路由
 @app.post("/api/projects", response_model=ProjectResponse)
 async def create_project(
     project: ProjectCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    db_project = await AsyncDatabaseService.create_project(db, project.name, project.description, user.id)
+    return ProjectResponse.from_orm(db_project)
+
+# 项目统计：读取增量维护的计数器，耗时与项目总数无关
+@app.get("/api/projects/stats")
+async def get_project_stats(
+    max_age: Optional[float] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
-    return await ProjectService.create_project(db, project)
+    return await AsyncDatabaseService.get_project_stats(db, max_age)
+
+# 全文搜索：每个词按前缀匹配，按相关度排序（需在 /api/projects/{project_id} 之前注册）
+@app.get("/api/projects/search", response_model=List[ProjectSearchResult])
+async def search_projects(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    return await AsyncDatabaseService.search_projects(db, q, limit, offset)
 
 @app.get("/api/projects/{project_id}", response_model=ProjectResponse)
 async def get_project(
     project_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
-    return await ProjectService.get_project(db, project_id)
+    # 项目与访问权限在同一次查询中解析
+    project = await AsyncDatabaseService.get_project(db, project_id, user)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return ProjectResponse.from_orm(project)
 
 # 公开路由
-@app.get("/api/projects")
+# 键集分页：下一页游标通过 X-Next-Cursor 响应头返回，最后一页不返回
+@app.get("/api/projects", response_model=List[ProjectListItem])
 async def read_projects_public(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
-):
-    return db.query(Project).offset(skip).limit(limit).all()
-
-# 需要认证的路由
-@app.post("/api/generate")
-async def generate_code_protected(
-    request: GenerateRequest,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    response: Response,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    project_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    return await ai_service.generate_code(request.prompt, request.language, db)
+    items, next_cursor = await AsyncDatabaseService.list_projects(db, limit, project_type, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 # 其他路由...
\ No newline at end of file
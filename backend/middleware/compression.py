@@ -0,0 +1,19 @@
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """GZip middleware that passes streaming endpoints through uncompressed.
+
+    The gzip writer buffers output until it has enough data to compress, which
+    would hold back server-sent events instead of flushing them as they arrive.
+    """
+
+    def __init__(self, app, minimum_size: int = 500, exclude_suffixes=("/stream",)):
+        super().__init__(app, minimum_size=minimum_size)
+        self.exclude_suffixes = tuple(exclude_suffixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].endswith(self.exclude_suffixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -14,7 +14,7 @@ async def error_handler(request: Request, call_next):
             content={"detail": exc.detail}
         )
     except Exception as exc:
-        logger.error(f"Unexpected error: {exc}", exc_info=True)
+        logger.error("Unexpected error: %s", exc, exc_info=True)
         return JSONResponse(
             status_code=500,
             content={"detail": "Internal server error"}
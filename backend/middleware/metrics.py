@@ -0,0 +1,68 @@
+from typing import Dict
+import time
+
+from starlette.routing import Match
+from starlette.types import Receive, Scope, Send
+
+from utils.metrics import metrics
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Time from request to the end of the response body",
+    ("method", "route", "status")
+)
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request per route template
+
+    Routes are labelled by their path template (``/api/projects/{project_id}``),
+    never the raw path, to keep the number of series bounded. Streaming
+    responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route(self, scope: Scope) -> str:
+        # The router records the matched endpoint in the shared scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return self._match(scope)
+        if endpoint not in self._routes:
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+            else:
+                self._routes[endpoint] = getattr(endpoint, "__name__", "unknown")
+        return self._routes[endpoint]
+
+    def _match(self, scope: Scope) -> str:
+        """Template of the route a request never reached, e.g. one rejected by the rate limiter"""
+        for route in getattr(scope.get("app"), "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, scope["method"], self._route(scope), str(status)
+            )
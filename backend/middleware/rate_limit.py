@@ -1,23 +1,271 @@
 from fastapi import Request, HTTPException
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+import asyncio
+import json
+import math
+import re
+import sqlite3
+import threading
 import time
-from typing import Dict, Tuple
+from config import settings
+from services.auth_service import AuthService
+from utils.metrics import metrics
+
+RATE_LIMIT_DECISIONS = metrics.counter(
+    "rate_limit_requests_total", "Requests counted against each rate limit rule", ("rule", "decision")
+)
+
+# Limiter state is a small tuple of floats whose meaning depends on the algorithm
+State = Tuple[float, ...]
+
+class RateLimitRule:
+    """Request budget applied to every request whose path starts with ``path``
+
+    ``pattern``, a regular expression matched from the start of the path,
+    replaces the prefix for budgets that span routes with path parameters.
+    ``rate`` is the sustained number of requests per second and ``burst`` the
+    number that may arrive at once. ``per`` selects the key the budget is
+    tracked by: ``ip`` or ``user`` (the id of a verified bearer token, falling
+    back to the IP so that unverified tokens cannot buy a fresh budget).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        path: str = "/",
+        pattern: Optional[str] = None,
+        methods: Optional[Iterable[str]] = None,
+        per: str = "ip",
+        algorithm: str = "token_bucket"
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+        self.pattern = re.compile(pattern) if pattern else None
+        self.methods = {m.upper() for m in methods} if methods else None
+        self.per = per
+        self.algorithm = algorithm
+        # Idle state older than this is indistinguishable from a fresh client
+        self.ttl = 2 * burst / rate
+
+    def matches(self, path: str, method: str) -> bool:
+        if self.pattern is not None:
+            matched = self.pattern.match(path) is not None
+        else:
+            matched = path.startswith(self.path)
+        return matched and (self.methods is None or method in self.methods)
+
+def token_bucket(state: Optional[State], rule: RateLimitRule, now: float) -> Tuple[State, bool, float]:
+    tokens, updated = state if state else (float(rule.burst), now)
+    tokens = min(rule.burst, tokens + (now - updated) * rule.rate)
+    if tokens >= 1:
+        return (tokens - 1, now), True, 0.0
+    return (tokens, now), False, (1 - tokens) / rule.rate
+
+def sliding_window(state: Optional[State], rule: RateLimitRule, now: float) -> Tuple[State, bool, float]:
+    """Sliding window counter: the previous window is weighted by its overlap"""
+    window = rule.burst / rule.rate
+    previous, current, started = state if state else (0.0, 0.0, now)
+    elapsed = now - started
+    if elapsed >= 2 * window:
+        previous, current, started, elapsed = 0.0, 0.0, now, 0.0
+    elif elapsed >= window:
+        previous, current, started, elapsed = current, 0.0, started + window, elapsed - window
+    estimated = previous * (window - elapsed) / window + current
+    if estimated + 1 <= rule.burst:
+        return (previous, current + 1, started), True, 0.0
+    return (previous, current, started), False, max(window - elapsed, 1 / rule.rate)
+
+ALGORITHMS = {
+    "token_bucket": token_bucket,
+    "sliding_window": sliding_window,
+}
+
+class MemoryBackend:
+    """Per-process limiter state in an LRU bounded by ``max_keys``"""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._states: "OrderedDict[str, Tuple[State, float]]" = OrderedDict()
+
+    def hit(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        entry = self._states.get(key)
+        state = entry[0] if entry and entry[1] > now else None
+        state, allowed, retry_after = ALGORITHMS[rule.algorithm](state, rule, now)
+        self._states[key] = (state, now + rule.ttl)
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_keys:
+            self._states.popitem(last=False)
+            self.evictions += 1
+        return allowed, retry_after
+
+    async def hit_async(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        return self.hit(key, rule, now)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+class SQLiteBackend:
+    """Limiter state in a local SQLite file shared by all workers on the host
+
+    ``hit`` may wait up to the 5 s busy timeout for another process's write
+    lock, so requests go through ``hit_async``, which runs it on a dedicated
+    thread instead of the event loop.
+    """
+
+    def __init__(self, path: str, prune_interval: float = 60):
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def hit(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            # BEGIN IMMEDIATE serialises read-modify-write across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT state, expires_at FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                state = tuple(json.loads(row[0])) if row and row[1] > now else None
+                state, allowed, retry_after = ALGORITHMS[rule.algorithm](state, rule, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, state, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(state), now + rule.ttl)
+                )
+                if now >= self._next_prune:
+                    self._conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+                    self._next_prune = now + self.prune_interval
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed, retry_after
+
+    async def hit_async(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.hit, key, rule, now)
 
 class RateLimiter:
-    def __init__(self, requests_per_second: int = 10):
-        self.requests_per_second = requests_per_second
-        self.requests: Dict[str, Tuple[int, float]] = {}
+    def __init__(self, rules: List[RateLimitRule], backend=None):
+        self.rules = rules
+        self.backend = backend or MemoryBackend()
+        self.rejected = 0
 
-    async def check_rate_limit(self, request: Request):
-        client_ip = request.client.host
-        current_time = time.time()
-        
-        if client_ip in self.requests:
-            count, start_time = self.requests[client_ip]
-            if current_time - start_time >= 1:
-                self.requests[client_ip] = (1, current_time)
-            elif count >= self.requests_per_second:
-                raise HTTPException(status_code=429, detail="Too many requests")
-            else:
-                self.requests[client_ip] = (count + 1, start_time)
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Global per-IP limit plus a separate per-user budget for code generation"""
+        rules = [
+            RateLimitRule(
+                "default",
+                rate=settings.RATE_LIMIT_RPS,
+                burst=settings.RATE_LIMIT_BURST
+            ),
+            RateLimitRule(
+                "generate",
+                rate=settings.RATE_LIMIT_GENERATE_PER_MINUTE / 60,
+                burst=settings.RATE_LIMIT_GENERATE_BURST,
+                # Regenerating a project enqueues the same LLM job as a new generation
+                pattern=r"/api/(generate|projects/[^/]+/regenerate)(/|$)",
+                methods=["POST"],
+                per="user"
+            ),
+        ]
+        if settings.RATE_LIMIT_BACKEND == 'sqlite':
+            backend = SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
         else:
-            self.requests[client_ip] = (1, current_time) 
\ No newline at end of file
+            backend = MemoryBackend(settings.RATE_LIMIT_MAX_KEYS)
+        return cls(rules, backend)
+
+    async def check(self, path: str, method: str, client_ip: str,
+                    token: Optional[str] = None) -> Optional[Tuple[RateLimitRule, float]]:
+        """Count the request against every matching rule
+
+        Returns the violated rule and the seconds until a retry can succeed,
+        or None when the request is allowed.
+        """
+        now = time.monotonic() if isinstance(self.backend, MemoryBackend) else time.time()
+        for rule in self.rules:
+            if not rule.matches(path, method):
+                continue
+            user_id = AuthService.token_subject(token) if rule.per == "user" and token else None
+            identity = "u:" + user_id if user_id else "ip:" + client_ip
+            allowed, retry_after = await self.backend.hit_async(f"{rule.name}:{identity}", rule, now)
+            if not allowed:
+                self.rejected += 1
+                RATE_LIMIT_DECISIONS.inc(rule.name, "rejected")
+                return rule, retry_after
+            RATE_LIMIT_DECISIONS.inc(rule.name, "allowed")
+        return None
+
+    async def check_rate_limit(self, request: Request):
+        """FastAPI dependency form of the limiter"""
+        token = request.headers.get("authorization", "")
+        violation = await self.check(
+            request.url.path,
+            request.method,
+            request.client.host if request.client else "unknown",
+            token[7:] if token.lower().startswith("bearer ") else None
+        )
+        if violation:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(violation[1]))}
+            )
+
+class RateLimitMiddleware:
+    """ASGI middleware rejecting requests over budget with 429 before routing"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or RateLimiter.from_env()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                value = value.decode("latin-1")
+                if value.lower().startswith("bearer "):
+                    token = value[7:]
+                break
+        client = scope.get("client")
+        violation = await self.limiter.check(
+            scope["path"], scope["method"], client[0] if client else "unknown", token
+        )
+        if violation is None:
+            await self.app(scope, receive, send)
+            return
+
+        rule, retry_after = violation
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+                (b"x-ratelimit-policy", rule.name.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,47 @@
+import re
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import Message, Receive, Scope, Send
+
+from utils.logger import request_id_var
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Accept IDs from a proxy only if they are short and cannot break a log line
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+class RequestIdMiddleware:
+    """ASGI middleware giving every request an ID for its log records
+
+    An ``X-Request-ID`` sent by a proxy is reused, otherwise one is generated.
+    It is set in ``request_id_var`` for the duration of the request, so every
+    record logged while handling it carries the ID, and is echoed in the
+    response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
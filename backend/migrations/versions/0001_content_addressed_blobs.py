@@ -0,0 +1,139 @@
+"""Store project and version file contents as content-addressed blobs
+
+Revision ID: 0001_content_addressed_blobs
+Revises: 
+Create Date: 2026-10-17 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+from models.blob import content_hash, encode_content, decode_content
+
+# revision identifiers, used by Alembic.
+revision = '0001_content_addressed_blobs'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+FILE_TABLES = ("project_files", "version_files")
+BATCH_SIZE = 500
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    # Fresh databases get the new schema from Base.metadata.create_all
+    if not _has_table("project_files"):
+        return
+
+    blobs = op.create_table(
+        "file_blobs",
+        sa.Column("hash", sa.String(64), primary_key=True),
+        sa.Column("data", sa.LargeBinary().with_variant(mysql.LONGBLOB(), "mysql"), nullable=False),
+        sa.Column("compression", sa.String(10), nullable=False),
+        sa.Column("size", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+    )
+    bind = op.get_bind()
+    stored = set()
+
+    for table_name in FILE_TABLES:
+        if not _has_table(table_name):
+            continue
+        op.add_column(table_name, sa.Column("blob_hash", sa.String(64), nullable=True))
+        table = sa.table(table_name, sa.column("id"), sa.column("content"), sa.column("blob_hash"))
+
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.select(table.c.id, table.c.content)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            new_blobs = []
+            updates = []
+            for row_id, content in rows:
+                blob_hash = content_hash(content)
+                if blob_hash not in stored:
+                    data, compression = encode_content(content)
+                    new_blobs.append({
+                        "hash": blob_hash,
+                        "data": data,
+                        "compression": compression,
+                        "size": len(content.encode("utf-8")),
+                    })
+                    stored.add(blob_hash)
+                updates.append({"row_id": row_id, "new_hash": blob_hash})
+            if new_blobs:
+                op.bulk_insert(blobs, new_blobs)
+            bind.execute(
+                table.update()
+                .where(table.c.id == sa.bindparam("row_id"))
+                .values(blob_hash=sa.bindparam("new_hash")),
+                updates
+            )
+            last_id = rows[-1][0]
+
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column("content")
+            batch_op.alter_column("blob_hash", existing_type=sa.String(64), nullable=False)
+            batch_op.create_index(f"ix_{table_name}_blob_hash", ["blob_hash"])
+            batch_op.create_foreign_key(
+                f"fk_{table_name}_blob_hash", "file_blobs", ["blob_hash"], ["hash"]
+            )
+
+
+def downgrade():
+    if not _has_table("file_blobs"):
+        return
+
+    bind = op.get_bind()
+    blobs = sa.table(
+        "file_blobs", sa.column("hash"), sa.column("data"), sa.column("compression")
+    )
+    content_types = {
+        "project_files": sa.Text().with_variant(mysql.LONGTEXT(), "mysql"),
+        "version_files": sa.Text(),
+    }
+
+    for table_name in FILE_TABLES:
+        if not _has_table(table_name):
+            continue
+        op.add_column(table_name, sa.Column("content", content_types[table_name], nullable=True))
+        table = sa.table(table_name, sa.column("id"), sa.column("content"), sa.column("blob_hash"))
+
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.select(table.c.id, blobs.c.data, blobs.c.compression)
+                .select_from(table.join(blobs, blobs.c.hash == table.c.blob_hash))
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            bind.execute(
+                table.update()
+                .where(table.c.id == sa.bindparam("row_id"))
+                .values(content=sa.bindparam("text")),
+                [
+                    {"row_id": row_id, "text": decode_content(data, compression)}
+                    for row_id, data, compression in rows
+                ]
+            )
+            last_id = rows[-1][0]
+
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_constraint(f"fk_{table_name}_blob_hash", type_="foreignkey")
+            batch_op.drop_index(f"ix_{table_name}_blob_hash")
+            batch_op.drop_column("blob_hash")
+            batch_op.alter_column("content", existing_type=content_types[table_name], nullable=False)
+
+    op.drop_table("file_blobs")
@@ -0,0 +1,95 @@
+"""Delta-encoded project versions and cached blob diffs
+
+Revision ID: 0002_version_deltas
+Revises: 0001_content_addressed_blobs
+Create Date: 2026-10-17 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = '0002_version_deltas'
+down_revision = '0001_content_addressed_blobs'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("project_versions"):
+        return
+
+    with op.batch_alter_table("project_versions") as batch_op:
+        batch_op.add_column(sa.Column("parent_id", sa.Integer, nullable=True))
+        batch_op.add_column(sa.Column("is_delta", sa.Boolean, nullable=True, server_default=sa.false()))
+        batch_op.create_foreign_key(
+            "fk_project_versions_parent_id", "project_versions", ["parent_id"], ["id"]
+        )
+
+    with op.batch_alter_table("version_files") as batch_op:
+        batch_op.add_column(sa.Column("is_deleted", sa.Boolean, nullable=True, server_default=sa.false()))
+        batch_op.alter_column("blob_hash", existing_type=sa.String(64), nullable=True)
+
+    op.create_table(
+        "blob_diffs",
+        sa.Column("old_hash", sa.String(64), primary_key=True),
+        sa.Column("new_hash", sa.String(64), primary_key=True),
+        sa.Column("diff", sa.Text().with_variant(mysql.LONGTEXT(), "mysql"), nullable=False),
+        sa.Column("created_at", sa.DateTime),
+    )
+
+
+def _expand_delta_versions():
+    """Rewrite delta versions as full snapshots before the delta columns go away"""
+    bind = op.get_bind()
+    versions = sa.table("project_versions", sa.column("id"), sa.column("parent_id"), sa.column("is_delta"))
+    files = sa.table(
+        "version_files", sa.column("version_id"), sa.column("file_path"),
+        sa.column("blob_hash"), sa.column("is_deleted")
+    )
+
+    manifests = {}
+    for version_id, parent_id, is_delta in bind.execute(
+        sa.select(versions.c.id, versions.c.parent_id, versions.c.is_delta).order_by(versions.c.id)
+    ):
+        rows = bind.execute(
+            sa.select(files.c.file_path, files.c.blob_hash, files.c.is_deleted)
+            .where(files.c.version_id == version_id)
+        ).fetchall()
+        manifest = dict(manifests[parent_id]) if is_delta and parent_id in manifests else {}
+        for file_path, blob_hash, is_deleted in rows:
+            if is_deleted:
+                manifest.pop(file_path, None)
+            else:
+                manifest[file_path] = blob_hash
+        manifests[version_id] = manifest
+
+        if is_delta:
+            bind.execute(files.delete().where(files.c.version_id == version_id))
+            if manifest:
+                bind.execute(files.insert(), [
+                    {"version_id": version_id, "file_path": file_path, "blob_hash": blob_hash, "is_deleted": False}
+                    for file_path, blob_hash in manifest.items()
+                ])
+
+
+def downgrade():
+    if not _has_table("blob_diffs"):
+        return
+
+    _expand_delta_versions()
+    op.drop_table("blob_diffs")
+
+    with op.batch_alter_table("version_files") as batch_op:
+        batch_op.drop_column("is_deleted")
+        batch_op.alter_column("blob_hash", existing_type=sa.String(64), nullable=False)
+
+    with op.batch_alter_table("project_versions") as batch_op:
+        batch_op.drop_constraint("fk_project_versions_parent_id", type_="foreignkey")
+        batch_op.drop_column("is_delta")
+        batch_op.drop_column("parent_id")
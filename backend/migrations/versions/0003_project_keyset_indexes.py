@@ -0,0 +1,35 @@
+"""Composite indexes for keyset pagination of projects
+
+Revision ID: 0003_project_keyset_indexes
+Revises: 0002_version_deltas
+Create Date: 2026-10-17 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_project_keyset_indexes'
+down_revision = '0002_version_deltas'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("projects"):
+        return
+
+    op.create_index("ix_projects_created_at_id", "projects", ["created_at", "id"])
+    op.create_index("ix_projects_type_created_at_id", "projects", ["project_type", "created_at", "id"])
+
+
+def downgrade():
+    if not _has_table("projects"):
+        return
+
+    op.drop_index("ix_projects_type_created_at_id", table_name="projects")
+    op.drop_index("ix_projects_created_at_id", table_name="projects")
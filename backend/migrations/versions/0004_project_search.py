@@ -0,0 +1,60 @@
+"""Full-text project search index
+
+Revision ID: 0004_project_search
+Revises: 0003_project_keyset_indexes
+Create Date: 2026-10-17 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_project_search'
+down_revision = '0003_project_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+# Kept in step with models.project.PROJECT_SEARCH_DDL
+SEARCH_DDL = {
+    "sqlite": (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS project_search USING fts5("
+        "name, description, content, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ),
+    "mysql": (
+        "CREATE TABLE IF NOT EXISTS project_search ("
+        "project_id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(255), description TEXT, content MEDIUMTEXT, "
+        "FULLTEXT KEY ft_project_search (name, description, content)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ),
+}
+
+BACKFILL = {
+    "sqlite": (
+        "INSERT INTO project_search (rowid, name, description, content) "
+        "SELECT id, COALESCE(name, ''), COALESCE(description, ''), '' FROM projects"
+    ),
+    "mysql": (
+        "INSERT INTO project_search (project_id, name, description, content) "
+        "SELECT id, COALESCE(name, ''), COALESCE(description, ''), '' FROM projects"
+    ),
+}
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    # Other databases fall back to the in-process index, which needs no schema
+    if dialect not in SEARCH_DDL or not _has_table("projects"):
+        return
+
+    # File contents are only indexed when SEARCH_INDEX_FILE_CONTENTS is set;
+    # run SearchService.rebuild_index afterwards to include them.
+    op.execute(SEARCH_DDL[dialect])
+    op.execute(BACKFILL[dialect])
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS project_search")
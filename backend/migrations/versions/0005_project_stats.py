@@ -0,0 +1,51 @@
+"""Incrementally maintained project statistics
+
+Revision ID: 0005_project_stats
+Revises: 0004_project_search
+Create Date: 2026-10-17 12:00:00
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_project_stats'
+down_revision = '0004_project_search'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    # Fresh databases get the new schema from Base.metadata.create_all
+    if not _has_table("projects"):
+        return
+
+    stats = op.create_table(
+        "project_stats",
+        sa.Column("project_type", sa.String(50), primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime),
+        sa.Column("reconciled_at", sa.DateTime),
+    )
+
+    # Seed the counters with the current totals
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT COALESCE(project_type, ''), COUNT(id) FROM projects GROUP BY COALESCE(project_type, '')"
+    )).fetchall()
+    now = datetime.utcnow()
+    if rows:
+        op.bulk_insert(stats, [
+            {"project_type": project_type, "count": count, "updated_at": now, "reconciled_at": now}
+            for project_type, count in rows
+        ])
+
+
+def downgrade():
+    op.drop_table("project_stats")
@@ -0,0 +1,73 @@
+"""Database-backed queue of project generation jobs
+
+Revision ID: 0006_generation_jobs
+Revises: 0005_project_stats
+Create Date: 2026-10-17 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_generation_jobs'
+down_revision = '0005_project_stats'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    # Fresh databases get the new schema from Base.metadata.create_all; the
+    # foreign keys below need users and projects to exist already
+    if not _has_table("projects"):
+        return
+
+    op.create_table(
+        "generation_jobs",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("owner_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("prompt", sa.Text, nullable=False),
+        sa.Column("model", sa.String(100)),
+        sa.Column("project_type", sa.String(50)),
+        sa.Column("structure", sa.JSON),
+        sa.Column(
+            "status",
+            sa.Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", "CANCELLED", name="jobstatus"),
+            nullable=False
+        ),
+        sa.Column("priority", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer, nullable=False, server_default="3"),
+        sa.Column("run_after", sa.DateTime, nullable=False),
+        sa.Column("cancel_requested", sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Column("worker_id", sa.String(64)),
+        sa.Column("heartbeat_at", sa.DateTime),
+        sa.Column("error", sa.Text),
+        sa.Column("project_id", sa.Integer, sa.ForeignKey("projects.id", ondelete="SET NULL")),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("started_at", sa.DateTime),
+        sa.Column("finished_at", sa.DateTime),
+    )
+    op.create_index("ix_generation_jobs_id", "generation_jobs", ["id"])
+    op.create_index("ix_generation_jobs_owner_id", "generation_jobs", ["owner_id"])
+    op.create_index("ix_generation_jobs_claim", "generation_jobs", ["status", "priority", "run_after"])
+
+    op.create_table(
+        "generation_job_files",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("job_id", sa.Integer, sa.ForeignKey("generation_jobs.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("file_path", sa.String(255), nullable=False),
+        sa.Column("status", sa.Enum("PENDING", "DONE", "FAILED", name="filestatus"), nullable=False),
+        sa.Column("error", sa.Text),
+        sa.Column("updated_at", sa.DateTime),
+        sa.UniqueConstraint("job_id", "file_path", name="uq_generation_job_files_path"),
+    )
+    op.create_index("ix_generation_job_files_id", "generation_job_files", ["id"])
+
+
+def downgrade():
+    op.drop_table("generation_job_files")
+    op.drop_table("generation_jobs")
@@ -0,0 +1,71 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, Text
+from sqlalchemy.dialects.mysql import LONGBLOB, LONGTEXT
+from datetime import datetime
+from typing import Tuple
+import hashlib
+import logging
+import zlib
+from .database import Base
+from config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BLOB_COMPRESSION = settings.BLOB_COMPRESSION
+BLOB_COMPRESSION_MIN_SIZE = settings.BLOB_COMPRESSION_MIN_SIZE
+
+if BLOB_COMPRESSION == 'zstd' and zstandard is None:
+    logger.warning("zstandard is not installed, falling back to zlib blob compression")
+    BLOB_COMPRESSION = 'zlib'
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def encode_content(content: str) -> Tuple[bytes, str]:
+    """Encode file content for storage, compressing it when that pays off"""
+    raw = content.encode("utf-8")
+    if BLOB_COMPRESSION == 'none' or len(raw) < BLOB_COMPRESSION_MIN_SIZE:
+        return raw, 'none'
+    if BLOB_COMPRESSION == 'zstd':
+        data = zstandard.ZstdCompressor().compress(raw)
+    else:
+        data = zlib.compress(raw)
+    if len(data) >= len(raw):
+        return raw, 'none'
+    return data, BLOB_COMPRESSION
+
+def decode_content(data: bytes, compression: str) -> str:
+    if compression == 'zlib':
+        data = zlib.decompress(data)
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed blobs")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode("utf-8")
+
+class FileBlob(Base):
+    """Unique file content, addressed by the SHA-256 of its text"""
+    __tablename__ = "file_blobs"
+    
+    hash = Column(String(64), primary_key=True)
+    data = Column(LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=False)
+    compression = Column(String(10), nullable=False, default="none")
+    size = Column(Integer, nullable=False)  # Uncompressed size in bytes
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    @property
+    def text(self) -> str:
+        return decode_content(self.data, self.compression)
+
+class BlobDiff(Base):
+    """Cached unified diff between two blobs, shared by every version pair containing them"""
+    __tablename__ = "blob_diffs"
+    
+    old_hash = Column(String(64), primary_key=True)
+    new_hash = Column(String(64), primary_key=True)
+    diff = Column(Text().with_variant(LONGTEXT, "mysql"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import Optional
 from .database import Base
+from .blob import FileBlob
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -43,6 +45,8 @@ class ProjectVersion(Base):
     description = Column(String)
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    parent_id = Column(Integer, ForeignKey("project_versions.id"), nullable=True)  # Previous version of the project
+    is_delta = Column(Boolean, default=False)  # Files only hold changes against the parent
     
     project = relationship("Project", back_populates="versions")
     files = relationship("VersionFile", back_populates="version")
@@ -55,6 +59,13 @@ class VersionFile(Base):
     id = Column(Integer, primary_key=True, index=True)
     version_id = Column(Integer, ForeignKey("project_versions.id", ondelete="CASCADE"))
     file_path = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
+    blob_hash = Column(String(64), ForeignKey("file_blobs.hash"), nullable=True, index=True)
+    is_deleted = Column(Boolean, default=False)  # Tombstone for files removed in a delta version
+    
+    version = relationship("ProjectVersion", back_populates="files")
+    blob = relationship(FileBlob, lazy="joined")
     
-    version = relationship("ProjectVersion", back_populates="files") 
\ No newline at end of file
+    @property
+    def content(self) -> Optional[str]:
+        # Tombstones carry no blob
+        return self.blob.text if self.blob else None 
\ No newline at end of file
@@ -0,0 +1,78 @@
+from sqlalchemy import Column, Integer, String, Text, JSON, Boolean, Enum, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from typing import Dict
+import enum
+from .database import Base
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+class FileStatus(str, enum.Enum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+class GenerationJob(Base):
+    """A queued project generation, executed by services.job_service.GenerationWorker"""
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    prompt = Column(Text, nullable=False)
+    model = Column(String(100))
+    project_type = Column(String(50), default="web")
+    structure = Column(JSON)  # Given by the client, or filled in by requirements analysis
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)  # Higher runs first
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)  # Retry backoff
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    worker_id = Column(String(64))
+    heartbeat_at = Column(DateTime)
+    error = Column(Text)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="SET NULL"))  # Created, or regenerated in place
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    files = relationship(
+        "GenerationJobFile", back_populates="job",
+        order_by="GenerationJobFile.id", cascade="all, delete-orphan"
+    )
+
+    # Workers claim the highest priority queued job whose backoff has elapsed
+    __table_args__ = (
+        Index("ix_generation_jobs_claim", "status", "priority", "run_after"),
+    )
+
+    @property
+    def progress(self) -> Dict[str, int]:
+        counts = {status.value: 0 for status in FileStatus}
+        for job_file in self.files:
+            counts[job_file.status.value] += 1
+        return dict(counts, total=len(self.files))
+
+class GenerationJobFile(Base):
+    """Per-file progress of a generation job"""
+    __tablename__ = "generation_job_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("generation_jobs.id", ondelete="CASCADE"), nullable=False)
+    file_path = Column(String(255), nullable=False)
+    status = Column(Enum(FileStatus), default=FileStatus.PENDING, nullable=False)
+    error = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    job = relationship("GenerationJob", back_populates="files")
+
+    __table_args__ = (
+        UniqueConstraint("job_id", "file_path", name="uq_generation_job_files_path"),
+    )
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey
-from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
+from .blob import FileBlob
 
 class Project(Base):
     __tablename__ = "projects"
@@ -22,6 +22,12 @@ class Project(Base):
     shares = relationship("ProjectShare", back_populates="project")
     comments = relationship("Comment", back_populates="project")
     versions = relationship("ProjectVersion", back_populates="project")
+    
+    # Keyset pagination seeks on (created_at, id), optionally within one project_type
+    __table_args__ = (
+        Index("ix_projects_created_at_id", "created_at", "id"),
+        Index("ix_projects_type_created_at_id", "project_type", "created_at", "id"),
+    )
 
 class ProjectFile(Base):
     __tablename__ = "project_files"
@@ -29,9 +35,52 @@ class ProjectFile(Base):
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"))
     file_path = Column(String(255), nullable=False)
-    content = Column(LONGTEXT, nullable=False)
+    blob_hash = Column(String(64), ForeignKey("file_blobs.hash"), nullable=False, index=True)
     file_type = Column(String(50))  # frontend/backend
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    project = relationship("Project", back_populates="files") 
\ No newline at end of file
+    project = relationship("Project", back_populates="files")
+    blob = relationship(FileBlob, lazy="joined")
+    
+    @property
+    def content(self) -> str:
+        return self.blob.text 
+
+class ProjectStat(Base):
+    """Running project count per project_type, maintained by services.stats_service"""
+    __tablename__ = "project_stats"
+    
+    project_type = Column(String(50), primary_key=True)  # '' for projects without a type
+    count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    reconciled_at = Column(DateTime)
+
+# Full-text index over project name, description and optionally file contents,
+# kept in sync by services.search_service. Not mapped: SQLite needs a virtual table.
+PROJECT_SEARCH_DDL = {
+    "sqlite": (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS project_search USING fts5("
+        "name, description, content, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ),
+    "mysql": (
+        "CREATE TABLE IF NOT EXISTS project_search ("
+        "project_id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(255), description TEXT, content MEDIUMTEXT, "
+        "FULLTEXT KEY ft_project_search (name, description, content)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ),
+}
+
+def _fts5_available(ddl, target, bind, **kw) -> bool:
+    options = {row[0] for row in bind.exec_driver_sql("PRAGMA compile_options")}
+    return "ENABLE_FTS5" in options
+
+event.listen(
+    Project.__table__, "after_create",
+    DDL(PROJECT_SEARCH_DDL["sqlite"]).execute_if(dialect="sqlite", callable_=_fts5_available)
+)
+event.listen(
+    Project.__table__, "after_create",
+    DDL(PROJECT_SEARCH_DDL["mysql"]).execute_if(dialect="mysql")
+)
+event.listen(Project.__table__, "before_drop", DDL("DROP TABLE IF EXISTS project_search"))
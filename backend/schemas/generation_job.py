@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+from models.generation_job import FileStatus, JobStatus
+
+class GenerationJobFileResponse(BaseModel):
+    file_path: str
+    status: FileStatus
+    error: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        orm_mode = True
+
+class GenerationJobResponse(BaseModel):
+    """Job state for polling; ``project_id`` is set once the job succeeded, or from the start for regenerations"""
+    id: int
+    status: JobStatus
+    priority: int
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    error: Optional[str] = None
+    project_id: Optional[int] = None
+    progress: Dict[str, int]
+    files: List[GenerationJobFileResponse]
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        orm_mode = True
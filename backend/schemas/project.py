@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 class ProjectBase(BaseModel):
     name: str
@@ -25,4 +26,23 @@ class ProjectResponse(BaseModel):
     owner_id: int
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+        orm_mode = True
+
+class ProjectListItem(BaseModel):
+    """Listing row: project metadata without structure or files"""
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    project_type: Optional[str] = None
+    model: Optional[str] = None
+    owner_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        orm_mode = True
+
+class ProjectSearchResult(ProjectListItem):
+    score: float
@@ -1,25 +1,224 @@
-from openai import OpenAI
-import os
-from typing import Dict, List, Optional, Any
+from typing import Any, AsyncIterator, Awaitable, Callable, Collection, Dict, List, Optional, Tuple
+import asyncio
 import json
+import logging
+import time
 from sqlalchemy.orm import Session
 from models.project import Project
+from services.llm_cache import LLMResponseCache
+from services.llm_latency import LATENCY_BUCKETS, HedgePolicy
+from services.llm_providers import LLMProvider, ProviderRouter, model_label
+from services.prompt_builder import PROMPT_TOKEN_BUDGET, StructurePrompts, file_side, structure_view
+from services.single_flight import SingleFlight
+from utils.metrics import family, metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "llm_request_duration_seconds", "Upstream completion time by outcome: ok, error, timeout, invalid, cancelled",
+    ("provider", "model", "outcome"), LATENCY_BUCKETS
+)
+STRUCTURE_TOKENS = metrics.counter(
+    "llm_structure_prompt_tokens_total", "Project structure tokens embedded in per-file prompts, and saved", ("kind",)
+)
+
+class GenerationResult:
+    """Files generated for a project structure, plus per-file failures
+
+    ``reused`` lists the files of an incremental regeneration carried over
+    unchanged from the previous generation.
+    """
+
+    def __init__(self, files: Dict[str, str], errors: Dict[str, str],
+                 prompt_stats: Optional[Dict[str, int]] = None,
+                 reused: Optional[List[str]] = None):
+        self.files = files
+        self.errors = errors
+        self.prompt_stats = prompt_stats or {}
+        self.reused = reused or []
+
+    @property
+    def is_partial(self) -> bool:
+        return bool(self.errors)
 
 class AICodeGenerator:
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.deepseek_client = OpenAI(
-            api_key=os.getenv('DEEPSEEK_API_KEY'),
-            base_url=os.getenv('DEEPSEEK_API_BASE', "https://api.deepseek.com/v1")
-        )
-        self.default_model = os.getenv('DEFAULT_LLM_MODEL', "gpt-4-turbo-preview")
+        # Async providers holding one pooled HTTP client each, shared by all requests
+        self.providers = ProviderRouter.from_env()
+        self.default_model = settings.DEFAULT_LLM_MODEL
+        # Upper bound on in-flight completions per provider during fan-out generation
+        self.max_concurrency = {
+            'openai': settings.OPENAI_MAX_CONCURRENCY,
+            'deepseek': settings.DEEPSEEK_MAX_CONCURRENCY,
+            'fake': settings.FAKE_LLM_MAX_CONCURRENCY,
+        }
+        self.file_timeout = settings.LLM_FILE_TIMEOUT
+        self.stream_buffer = settings.LLM_STREAM_BUFFER
+        self.prompt_token_budget = PROMPT_TOKEN_BUDGET
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.cache = LLMResponseCache.from_env()
+        # Deduplicates identical completions in flight, in front of the provider clients
+        self.single_flight = SingleFlight()
+        self.single_flight_enabled = settings.LLM_SINGLE_FLIGHT
+        # Per-provider latency histograms, and backup requests for slow completions when enabled
+        self.hedging = HedgePolicy.from_env()
+
+    def _get_provider(self, model: str) -> str:
+        return self.providers.provider_name(model)
+
+    def _get_client(self, provider: str) -> LLMProvider:
+        return self.providers.get(provider)
+
+    def _get_semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.max_concurrency[provider])
+        return self._semaphores[provider]
+
+    async def _complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: Optional[float] = None,
+        validate: Optional[Callable[[str], Any]] = None
+    ) -> str:
+        """Run a chat completion, serving repeated requests from the response cache
+
+        Identical requests already in flight share that upstream call instead
+        of starting their own, whether or not the response is cacheable.
+        ``validate`` raises for an unusable response; with hedging enabled an
+        invalid or failed primary response starts the backup right away.
+        """
+        key = LLMResponseCache.make_key(model, messages, temperature, max_tokens)
+        cacheable = self.cache.is_cacheable(temperature)
+        if cacheable:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        async def call() -> str:
+            content, provider = await self._hedged(model, messages, temperature, max_tokens, timeout, validate)
+            # A backup model's answer is not cached under the requested model
+            if cacheable and provider == self._get_provider(model):
+                await self.cache.set(key, content)
+            return content
+
+        if not self.single_flight_enabled:
+            return await call()
+        return await self.single_flight.do(key, call)
+
+    async def _attempt(
+        self,
+        provider: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: Optional[float],
+        validate: Optional[Callable[[str], Any]]
+    ) -> str:
+        """One upstream completion, recorded in the provider's latency histogram"""
+        async with self._get_semaphore(provider):
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                content = await asyncio.wait_for(
+                    self._get_client(provider).complete(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens
+                    ),
+                    timeout=timeout
+                )
+                if validate:
+                    outcome = "invalid"
+                    validate(content)
+                outcome = "ok"
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                raise
+            finally:
+                elapsed = time.monotonic() - started
+                LLM_REQUEST_SECONDS.observe(elapsed, provider, model_label(model), outcome)
+                # A cancelled call, typically the loser of a hedge, or a timed out one still
+                # ran for at least ``elapsed``; dropping it would hide the slowest calls
+                self.hedging.observe(
+                    provider, elapsed, ok=outcome == "ok", censored=outcome in ("cancelled", "timeout")
+                )
+        return content
+
+    async def _hedged(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: Optional[float],
+        validate: Optional[Callable[[str], Any]]
+    ) -> Tuple[str, str]:
+        """Race the primary provider against a delayed backup, returning the first valid response
+
+        The backup request goes to the other provider configured for hedging
+        once the primary has been running for longer than its usual
+        (``LLM_HEDGE_QUANTILE``) latency, or at once if the primary fails.
+        The losing request is cancelled. Returns the content and the provider
+        that produced it.
+        """
+        primary = self._get_provider(model)
+        backup = self.hedging.backup_for(primary, self.providers.configured())
+        if backup is None:
+            return await self._attempt(primary, model, messages, temperature, max_tokens, timeout, validate), primary
+
+        def start(provider: str, provider_model: str) -> asyncio.Task:
+            return asyncio.create_task(self._attempt(
+                provider, provider_model, messages, temperature, max_tokens, timeout, validate
+            ))
+
+        tasks = {start(primary, model): primary}
+        delay = self.hedging.delay(primary)
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=None if hedged else delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            if provider == primary:
+                                self.hedging.primary_wins += 1
+                            else:
+                                self.hedging.backup_wins += 1
+                        return task.result(), provider
+                    error = task.exception()
+                    logger.warning("%s completion failed%s: %s", provider,
+                                   "" if hedged else ", hedging", error)
+                if not hedged:
+                    hedged = True
+                    self.hedging.hedged += 1
+                    tasks[start(backup, self.hedging.models[backup])] = backup
+        finally:
+            for task in tasks:
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()
+                else:
+                    task.cancel()
+        raise error
 
     async def analyze_requirements(self, description: str, model: Optional[str] = None) -> Dict:
         """Analyze project requirements and generate project structure"""
         # Select model based on configuration or parameter
-        client = self.deepseek_client if (model or self.default_model).startswith('deepseek') else self.openai_client
         model = model or self.default_model
-        
+
         prompt = f"""
         As a professional software architect, please analyze the following project requirements 
         and generate a detailed project structure for the AppMagic project from 
@@ -40,54 +239,246 @@ class AICodeGenerator:
         """
 
         try:
-            response = await client.chat.completions.create(
+            content = await self._complete(
                 model=model,
                 messages=[
                     {"role": "system", "content": "You are a professional software architect."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
-                max_tokens=2000
+                max_tokens=2000,
+                validate=json.loads
             )
-            return json.loads(response.choices[0].message.content)
+            return json.loads(content)
         except json.JSONDecodeError:
             raise ValueError("Invalid JSON response from AI service")
         except Exception as e:
             raise RuntimeError(f"AI service error: {str(e)}")
 
-    async def generate_code(self, project_structure: Dict) -> Dict[str, str]:
+    async def generate_code(self, project_structure: Dict, concurrent: bool = True) -> Dict[str, str]:
         """Generate code based on project structure"""
+        result = await self.generate_files(project_structure, concurrent=concurrent)
+        if result.errors and not result.files:
+            raise RuntimeError(f"AI service error: all {len(result.errors)} files failed")
+        return result.files
+
+    async def generate_files(
+        self,
+        project_structure: Dict,
+        concurrent: bool = True,
+        model: Optional[str] = None,
+        on_file: Optional[Callable[[str, Optional[Exception]], Awaitable[None]]] = None,
+        file_paths: Optional[List[str]] = None
+    ) -> GenerationResult:
+        """Generate every file of the project, reporting failed files instead of aborting
+
+        ``on_file`` is awaited as each file finishes, with the exception if it failed.
+        ``file_paths`` restricts generation to a subset of the project's files.
+        """
+        model = model or self.default_model
+        if file_paths is None:
+            file_paths = self._get_file_paths(project_structure)
+        prompts = StructurePrompts(project_structure, self.prompt_token_budget)
+
+        async def generate(file_path: str) -> str:
+            try:
+                content = await self._generate_file(model, file_path, prompts)
+            except Exception as e:
+                if on_file:
+                    await on_file(file_path, e)
+                raise
+            if on_file:
+                await on_file(file_path, None)
+            return content
+
+        if concurrent:
+            # Fan out one completion per file, bounded by the provider semaphore
+            outcomes = await asyncio.gather(*[
+                generate(file_path) for file_path in file_paths
+            ], return_exceptions=True)
+        else:
+            outcomes = []
+            for file_path in file_paths:
+                try:
+                    outcomes.append(await generate(file_path))
+                except Exception as e:
+                    outcomes.append(e)
+
         files = {}
-        
-        # Select model based on configuration
-        client = self.deepseek_client if self.default_model.startswith('deepseek') else self.openai_client
-        model = self.default_model
-        
-        # Generate code for each file
+        errors = {}
+        for file_path, outcome in zip(file_paths, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                errors[file_path] = f"Timed out after {self.file_timeout}s"
+            elif isinstance(outcome, Exception):
+                errors[file_path] = str(outcome)
+            else:
+                files[file_path] = outcome
+
+        if errors:
+            logger.warning("Code generation failed for %d of %d files: %s",
+                           len(errors), len(file_paths), ", ".join(errors))
+        logger.info("Project structure prompts: %d tokens sent, %d saved",
+                    prompts.prompt_tokens, prompts.tokens_saved)
+        STRUCTURE_TOKENS.inc("sent", amount=prompts.prompt_tokens)
+        STRUCTURE_TOKENS.inc("saved", amount=prompts.tokens_saved)
+        return GenerationResult(files, errors, prompts.stats)
+
+    def plan_regeneration(
+        self,
+        previous_structure: Optional[Dict],
+        project_structure: Dict,
+        existing_paths: Collection[str]
+    ) -> Tuple[List[str], List[str]]:
+        """Split the files of ``project_structure`` into those to regenerate and those to reuse
+
+        A file depends on the structure sections embedded in its prompt, so it
+        is regenerated when one of them differs from ``previous_structure`` or
+        when no previous content exists.
+        """
+        regenerate, reuse = [], []
+        changed: Dict[Optional[str], bool] = {}
         for file_path in self._get_file_paths(project_structure):
-            prompt = f"""
-            Generate complete code for {file_path} based on the following project structure:
+            side = file_side(file_path)
+            if side not in changed:
+                changed[side] = (
+                    structure_view(previous_structure, side) != structure_view(project_structure, side)
+                )
+            if changed[side] or file_path not in existing_paths:
+                regenerate.append(file_path)
+            else:
+                reuse.append(file_path)
+        return regenerate, reuse
 
-            Project Structure:
-            {json.dumps(project_structure, indent=2)}
+    async def regenerate_files(
+        self,
+        previous_structure: Optional[Dict],
+        project_structure: Dict,
+        existing_files: Dict[str, str],
+        model: Optional[str] = None,
+        on_file: Optional[Callable[[str, Optional[Exception]], Awaitable[None]]] = None
+    ) -> GenerationResult:
+        """Regenerate only the files affected by a structure change, reusing the rest
 
-            Please generate maintainable code following best practices.
-            Include necessary comments and documentation.
-            """
+        Files that fail to regenerate keep their previous content but are still
+        reported in ``errors``. ``on_file`` is awaited for reused files as well.
+        """
+        regenerate, reuse = self.plan_regeneration(previous_structure, project_structure, existing_files)
+        logger.info("Incremental regeneration: %d files affected, %d reused", len(regenerate), len(reuse))
+        for file_path in reuse:
+            if on_file:
+                await on_file(file_path, None)
+        result = await self.generate_files(
+            project_structure, model=model, on_file=on_file, file_paths=regenerate
+        )
+        for file_path in reuse + [path for path in result.errors if path in existing_files]:
+            result.files.setdefault(file_path, existing_files[file_path])
+        result.reused = reuse
+        return result
 
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a professional software developer."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
+    async def _generate_file(self, model: str, file_path: str, prompts: StructurePrompts) -> str:
+        """Generate a single file, holding a provider slot for the duration of the call"""
+        return await self._complete(
+            model=model,
+            messages=self._build_file_messages(file_path, prompts),
+            temperature=0.7,
+            max_tokens=2000,
+            timeout=self.file_timeout
+        )
+
+    async def stream_code(self, project_structure: Dict, model: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream generated code as per-file events while tokens arrive
+
+        Yields ``file_start``, ``delta``, ``file_end`` and ``error`` events tagged
+        with the file path, followed by a final ``done`` event. Files are
+        generated concurrently, so events of different files may interleave.
+        """
+        model = model or self.default_model
+        provider = self._get_provider(model)
+        file_paths = self._get_file_paths(project_structure)
+        prompts = StructurePrompts(project_structure, self.prompt_token_budget)
+        # Bounded so a slow consumer applies backpressure to the upstream streams
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.stream_buffer)
+
+        async def produce(file_path: str):
+            try:
+                await self._stream_file(provider, model, file_path, prompts, queue)
+                await queue.put({"event": "file_end", "path": file_path})
+            except asyncio.TimeoutError:
+                await queue.put({"event": "error", "path": file_path,
+                                 "detail": f"Timed out after {self.file_timeout}s"})
+            except Exception as e:
+                await queue.put({"event": "error", "path": file_path, "detail": str(e)})
+
+        tasks = [asyncio.create_task(produce(file_path)) for file_path in file_paths]
+        pending = len(tasks)
+        failed = 0
+        try:
+            while pending:
+                event = await queue.get()
+                if event["event"] in ("file_end", "error"):
+                    pending -= 1
+                    failed += event["event"] == "error"
+                yield event
+        finally:
+            # Stop upstream streams when the client goes away
+            for task in tasks:
+                task.cancel()
+            STRUCTURE_TOKENS.inc("sent", amount=prompts.prompt_tokens)
+            STRUCTURE_TOKENS.inc("saved", amount=prompts.tokens_saved)
 
-            files[file_path] = response.choices[0].message.content
+        yield {"event": "done", "files": len(file_paths) - failed, "errors": failed,
+               "prompt_tokens": prompts.prompt_tokens, "tokens_saved": prompts.tokens_saved}
 
-        return files
+    async def _stream_file(self, provider: str, model: str, file_path: str,
+                           prompts: StructurePrompts, queue: asyncio.Queue):
+        """Relay completion tokens of a single file into the event queue
+
+        ``file_timeout`` bounds the time spent waiting on the provider only:
+        waiting for the provider's semaphore, or for a slow client to drain
+        the queue, does not count against it.
+        """
+        async with self._get_semaphore(provider):
+            await queue.put({"event": "file_start", "path": file_path})
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                stream = self._get_client(provider).stream(
+                    model=model,
+                    messages=self._build_file_messages(file_path, prompts),
+                    temperature=0.7,
+                    max_tokens=2000
+                ).__aiter__()
+                upstream = 0.0
+                while True:
+                    waited = time.monotonic()
+                    try:
+                        content = await asyncio.wait_for(stream.__anext__(), timeout=self.file_timeout - upstream)
+                    except StopAsyncIteration:
+                        break
+                    upstream += time.monotonic() - waited
+                    await queue.put({"event": "delta", "path": file_path, "content": content})
+                outcome = "ok"
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                raise
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.monotonic() - started, provider, model_label(model), outcome)
+
+    def _build_file_messages(self, file_path: str, prompts: StructurePrompts) -> List[Dict[str, str]]:
+        """Per-file prompt embedding only the structure sections relevant to ``file_path``"""
+        prompt = (
+            f"Generate complete code for {file_path} based on the following project structure.\n\n"
+            f"Project Structure (JSON):\n{prompts.for_file(file_path)}\n\n"
+            "Please generate maintainable code following best practices.\n"
+            "Include necessary comments and documentation."
+        )
+        return [
+            {"role": "system", "content": "You are a professional software developer."},
+            {"role": "user", "content": prompt}
+        ]
 
     def _get_file_paths(self, project_structure: Dict) -> List[str]:
         """Extract file paths to be generated from project structure"""
@@ -126,8 +517,8 @@ class AICodeGenerator:
         {code}
         """
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
+        return await self._complete(
+            model=self.default_model,
             messages=[
                 {"role": "system", "content": "You are a code optimization expert."},
                 {"role": "user", "content": prompt}
@@ -136,8 +527,6 @@ class AICodeGenerator:
             max_tokens=2000
         )
 
-        return response.choices[0].message.content
-
     async def generate_tests(self, code: str, language: str) -> str:
         """Generate test cases for the generated code"""
         prompt = f"""
@@ -150,17 +539,15 @@ class AICodeGenerator:
         {code}
         """
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
+        return await self._complete(
+            model=self.default_model,
             messages=[
                 {"role": "system", "content": "You are a testing expert."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
             max_tokens=2000
-        )
-
-        return response.choices[0].message.content 
+        ) 
 
 class AIService:
     @staticmethod
@@ -171,4 +558,44 @@ class AIService:
     @staticmethod
     async def analyze_requirements(description: str, model: str = None) -> Dict[str, Any]:
         # TODO: Implement requirements analysis logic
-        return {"description": description, "model": model} 
\ No newline at end of file
+        return {"description": description, "model": model}
+
+_code_generator: Optional[AICodeGenerator] = None
+
+def get_code_generator() -> AICodeGenerator:
+    """Shared generator instance, created on first use"""
+    global _code_generator
+    if _code_generator is None:
+        _code_generator = AICodeGenerator()
+    return _code_generator
+
+def _generator_metric_families():
+    generator = _code_generator
+    if generator is None:
+        return []
+    cache = generator.cache.stats
+    flights = generator.single_flight.stats
+    hedging = generator.hedging
+    return [
+        family("cache_hits_total", "counter", "Cache lookups answered from the cache", ("cache",),
+               [(("llm_response",), cache["hits"] + cache["disk_hits"])]),
+        family("cache_misses_total", "counter", "Cache lookups that missed", ("cache",),
+               [(("llm_response",), cache["misses"])]),
+        family("llm_single_flight_calls_total", "counter", "Completions started upstream or joined in flight",
+               ("result",), [(("originated",), flights["originated"]), (("coalesced",), flights["coalesced"])]),
+        family("llm_hedged_requests_total", "counter", "Completions that fired a backup request",
+               (), [((), hedging.hedged)]),
+        family("llm_hedge_wins_total", "counter", "Hedged completions by the request that answered first",
+               ("winner",), [(("primary",), hedging.primary_wins), (("backup",), hedging.backup_wins)]),
+        family("llm_hedge_delay_seconds", "gauge", "Current delay before a backup request is fired",
+               ("provider",), [((provider,), hedging.delay(provider)) for provider in hedging.histograms]),
+    ]
+
+metrics.register_collector(_generator_metric_families)
+
+async def close_code_generator():
+    """Release pooled provider connections on shutdown"""
+    global _code_generator
+    if _code_generator is not None:
+        await _code_generator.providers.aclose()
+        _code_generator = None
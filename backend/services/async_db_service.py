@@ -0,0 +1,95 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Tuple
+from models.project import Project
+from models.user import User
+from models.project_share import ProjectShare
+from fastapi import HTTPException
+from services.db_service import PROJECT_LIST_COLUMNS, _access_cache, _permission, _search_projects, _share_join
+from services.stats_service import StatsService
+from utils.pagination import apply_keyset, split_page
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AsyncDatabaseService:
+    """DatabaseService operations for request handlers holding an AsyncSession
+
+    Queries go through the async driver, so a slow statement suspends only
+    its own request instead of the worker's event loop. Logic that lives in
+    the sync services (search backends, stats) runs through ``run_sync``,
+    which drives the same sync code over the async connection.
+    """
+
+    @staticmethod
+    async def create_project(
+        db: AsyncSession,
+        name: str,
+        description: str,
+        owner_id: int,
+        project_type: str = "web"
+    ) -> Project:
+        project = Project(name=name, description=description, project_type=project_type, owner_id=owner_id)
+        db.add(project)
+        try:
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error("Error creating project: %s", e)
+            raise HTTPException(status_code=500, detail="Failed to create project")
+        return project
+
+    @staticmethod
+    async def get_project(
+        db: AsyncSession,
+        project_id: int,
+        user: Optional[User] = None
+    ) -> Optional[Project]:
+        if not user:
+            return await db.get(Project, project_id)
+
+        # Load the project together with the caller's share in one round trip
+        row = (await db.execute(
+            select(Project, ProjectShare.permission).outerjoin(
+                ProjectShare, _share_join(user)
+            ).where(Project.id == project_id)
+        )).first()
+        if not row:
+            return None
+        project, share_permission = row
+        permission = _permission(project.owner_id, share_permission, user)
+        _access_cache.set((user.id, project_id), permission)
+        if permission is None:
+            raise HTTPException(status_code=403, detail="No access permission")
+        return project
+
+    @staticmethod
+    async def list_projects(
+        db: AsyncSession,
+        limit: int = 10,
+        project_type: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        query = select(*PROJECT_LIST_COLUMNS)
+        if project_type:
+            query = query.where(Project.project_type == project_type)
+        query = apply_keyset(query, Project.created_at, Project.id, limit, cursor)
+        rows, next_cursor = split_page((await db.execute(query)).all(), limit)
+        return [dict(row._mapping) for row in rows], next_cursor
+
+    @staticmethod
+    async def search_projects(
+        db: AsyncSession,
+        keyword: str,
+        limit: int = 10,
+        offset: int = 0
+    ) -> List[Dict]:
+        # The search backends issue FTS5 / FULLTEXT statements on a sync connection
+        return await db.run_sync(_search_projects, keyword, limit, offset)
+
+    @staticmethod
+    async def get_project_stats(
+        db: AsyncSession,
+        max_age: Optional[float] = None
+    ) -> Dict:
+        return await StatsService.get_stats(db, max_age)
@@ -4,18 +4,41 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import OAuth2PasswordBearer
-from models.user import User
-from sqlalchemy.orm import Session
-from models.database import get_db
+from models.user import User, UserRole
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from models.database import get_async_db
+from utils.cache import TTLCache
+from utils.metrics import family, metrics
+from services.password_hasher import PasswordHasher
+import time
+from config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified token -> column snapshot of its user. Repeat requests skip both the
+# signature check and the user SELECT. The cache is per process, so changes
+# made by another worker become visible after at most AUTH_CACHE_TTL seconds.
+_principal_cache = TTLCache(
+    maxsize=settings.AUTH_CACHE_SIZE,
+    ttl=settings.AUTH_CACHE_TTL,
+    name="auth_principal"
+)
+
+# Changes to these columns alter what a token grants and evict cached principals
+_PRINCIPAL_COLUMNS = ("is_active", "role", "hashed_password")
+
+def _snapshot(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
 class AuthService:
     SECRET_KEY = "your-secret-key"  # Use environment variable in production
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 30
     
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    password_hasher = PasswordHasher.from_env(pwd_context)
     
     @classmethod
     def verify_password(cls, plain_password: str, hashed_password: str) -> bool:
@@ -25,6 +48,16 @@ class AuthService:
     def get_password_hash(cls, password: str) -> str:
         return cls.pwd_context.hash(password)
     
+    @classmethod
+    async def verify_password_async(cls, plain_password: str, hashed_password: str) -> bool:
+        """Non-blocking verify for use from async request handlers"""
+        return await cls.password_hasher.verify(plain_password, hashed_password)
+    
+    @classmethod
+    async def get_password_hash_async(cls, password: str) -> str:
+        """Non-blocking hash for use from async request handlers"""
+        return await cls.password_hasher.hash(password)
+    
     @classmethod
     def create_access_token(cls, data: dict) -> str:
         to_encode = data.copy()
@@ -32,16 +65,32 @@ class AuthService:
         to_encode.update({"exp": expire})
         return jwt.encode(to_encode, cls.SECRET_KEY, algorithm=cls.ALGORITHM)
     
+    @classmethod
+    def token_subject(cls, token: str) -> Optional[str]:
+        """User id a token was issued to, or None if it does not verify"""
+        try:
+            payload = jwt.decode(token, cls.SECRET_KEY, algorithms=[cls.ALGORITHM])
+        except JWTError:
+            return None
+        return payload.get("sub")
+    
     @staticmethod
     async def get_current_user(
         token: str = Security(oauth2_scheme),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
     ) -> User:
         credentials_exception = HTTPException(
             status_code=401,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+        snapshot = _principal_cache.get(token)
+        if snapshot is not None:
+            # Attach a copy to this request's session without emitting a SELECT
+            user = User(**snapshot)
+            make_transient_to_detached(user)
+            return await db.merge(user, load=False)
+        
         try:
             payload = jwt.decode(token, AuthService.SECRET_KEY, algorithms=[AuthService.ALGORITHM])
             user_id: str = payload.get("sub")
@@ -50,11 +99,28 @@ class AuthService:
         except JWTError:
             raise credentials_exception
             
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
+        user = await db.get(User, int(user_id))
+        if user is None or not user.is_active:
             raise credentials_exception
+        
+        # Never serve a token from cache past its own expiry
+        ttl = _principal_cache.ttl
+        if payload.get("exp"):
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            _principal_cache.set(token, _snapshot(user), ttl=ttl)
         return user
     
+    @staticmethod
+    def invalidate_user(user_id: int) -> int:
+        """Evict every cached token of a user, e.g. after deactivation or a role change"""
+        return _principal_cache.invalidate(lambda token, snapshot: snapshot["id"] == user_id)
+    
+    @staticmethod
+    def invalidate_token(token: str):
+        """Evict a single token, e.g. on logout"""
+        _principal_cache.pop(token)
+    
     @classmethod
     def check_admin_permission(cls, user: User):
         if user.role != UserRole.ADMIN:
@@ -63,5 +129,34 @@ class AuthService:
                 detail="Admin permission required"
             )
 
+@event.listens_for(User, "after_update")
+def _invalidate_changed_principal(mapper, connection, target: User):
+    state = inspect(target)
+    if any(state.attrs[key].history.has_changes() for key in _PRINCIPAL_COLUMNS):
+        AuthService.invalidate_user(target.id)
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_principal(mapper, connection, target: User):
+    AuthService.invalidate_user(target.id)
+
+def _password_hasher_metric_families():
+    stats = AuthService.password_hasher.stats
+    return [
+        family("password_hash_running", "gauge", "Password hashes running on the thread pool",
+               samples=[((), stats["running"])]),
+        family("password_hash_queued", "gauge", "Password hashes waiting for a thread",
+               samples=[((), stats["queued"])]),
+        family("password_hash_completed_total", "counter", "Password hashes and verifications completed",
+               samples=[((), stats["completed"])]),
+        family("password_hash_rejected_total", "counter", "Password hashes rejected with 503 because the queue was full",
+               samples=[((), stats["rejected"])]),
+        family("password_hash_wait_seconds_total", "counter", "Time password hashes spent queued",
+               samples=[((), stats["wait_seconds_total"])]),
+        family("password_hash_run_seconds_total", "counter", "Time spent hashing passwords",
+               samples=[((), stats["run_seconds_total"])]),
+    ]
+
+metrics.register_collector(_password_hasher_metric_families)
+
 # 将静态方法导出为模块级别的名称，便于导入使用。
 get_current_user = AuthService.get_current_user 
\ No newline at end of file
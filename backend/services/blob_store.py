@@ -0,0 +1,103 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Dict, Iterable, Tuple
+from models.blob import BlobDiff, FileBlob, content_hash, encode_content
+import difflib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keep IN (...) lists well below the bind parameter limits of MySQL and SQLite
+_CHUNK_SIZE = 500
+
+def _chunks(items: list, size: int = _CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+class BlobStore:
+    @staticmethod
+    def put_files(db: Session, files: Dict[str, str]) -> Dict[str, str]:
+        """Store file contents as blobs and return the blob hash of every path
+
+        Only contents whose hash is not stored yet are written, so saving an
+        unchanged file costs a hash lookup rather than a copy of its text.
+        """
+        hashes = {file_path: content_hash(content) for file_path, content in files.items()}
+        contents = {}
+        for file_path, blob_hash in hashes.items():
+            contents.setdefault(blob_hash, files[file_path])
+        
+        missing = set(contents)
+        for chunk in _chunks(list(contents)):
+            missing -= {
+                blob_hash for (blob_hash,) in
+                db.query(FileBlob.hash).filter(FileBlob.hash.in_(chunk))
+            }
+        
+        if missing:
+            rows = []
+            for blob_hash in missing:
+                data, compression = encode_content(contents[blob_hash])
+                rows.append({
+                    "hash": blob_hash,
+                    "data": data,
+                    "compression": compression,
+                    "size": len(contents[blob_hash].encode("utf-8"))
+                })
+            # Another writer may store the same content concurrently; identical
+            # hashes mean identical data, so duplicates can be ignored
+            insert = FileBlob.__table__.insert() \
+                .prefix_with("IGNORE", dialect="mysql") \
+                .prefix_with("OR IGNORE", dialect="sqlite")
+            db.execute(insert, rows)
+        
+        return hashes
+    
+    @staticmethod
+    def get_texts(db: Session, hashes: Iterable[str]) -> Dict[str, str]:
+        """Load and decode the contents of the given blobs"""
+        texts = {}
+        for chunk in _chunks(list(set(hashes))):
+            for blob in db.query(FileBlob).filter(FileBlob.hash.in_(chunk)):
+                texts[blob.hash] = blob.text
+        return texts
+    
+    @staticmethod
+    def get_diffs(db: Session, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Unified diffs between (old, new) blob pairs, computed once and cached
+
+        New diffs are cached in a transaction of their own, so the caller's
+        session is only read from. Failing to cache them is not an error.
+        """
+        pairs = set(pairs)
+        diffs = {}
+        old_hashes = list({old_hash for old_hash, _ in pairs})
+        for chunk in _chunks(old_hashes):
+            for row in db.query(BlobDiff).filter(BlobDiff.old_hash.in_(chunk)):
+                if (row.old_hash, row.new_hash) in pairs:
+                    diffs[(row.old_hash, row.new_hash)] = row.diff
+        
+        missing = pairs - set(diffs)
+        if missing:
+            texts = BlobStore.get_texts(db, [h for pair in missing for h in pair])
+            rows = []
+            for old_hash, new_hash in missing:
+                diff = "\n".join(difflib.unified_diff(
+                    texts[old_hash].splitlines(),
+                    texts[new_hash].splitlines(),
+                    lineterm=""
+                ))
+                diffs[(old_hash, new_hash)] = diff
+                rows.append({"old_hash": old_hash, "new_hash": new_hash, "diff": diff})
+            insert = BlobDiff.__table__.insert() \
+                .prefix_with("IGNORE", dialect="mysql") \
+                .prefix_with("OR IGNORE", dialect="sqlite")
+            try:
+                with Session(db.get_bind()) as cache:
+                    cache.execute(insert, rows)
+                    cache.commit()
+            except SQLAlchemyError:
+                logger.warning("Could not cache %d blob diffs", len(rows), exc_info=True)
+        
+        return diffs
+
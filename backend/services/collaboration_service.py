@@ -1,10 +1,80 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from models.collaboration import Comment, CommentReply, ProjectVersion, VersionFile
 from models.user import User
 from models.project import Project
+from services.blob_store import BlobStore
 from fastapi import HTTPException
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import semver
+from config import settings
+
+# Store versions as changes against their parent instead of full snapshots
+VERSION_DELTA_STORAGE = settings.VERSION_DELTA_STORAGE
+# Every Nth version in a delta chain is a full snapshot, bounding materialisation cost
+VERSION_SNAPSHOT_INTERVAL = settings.VERSION_SNAPSHOT_INTERVAL
+
+def _version_chain(db: Session, version: ProjectVersion) -> List[int]:
+    """Version ids from the nearest full snapshot up to ``version``"""
+    rows = {
+        version_id: (parent_id, is_delta)
+        for version_id, parent_id, is_delta in db.query(
+            ProjectVersion.id, ProjectVersion.parent_id, ProjectVersion.is_delta
+        ).filter(ProjectVersion.project_id == version.project_id)
+    }
+    chain = [version.id]
+    parent_id, is_delta = rows[version.id]
+    while is_delta and parent_id is not None:
+        chain.append(parent_id)
+        parent_id, is_delta = rows[parent_id]
+    chain.reverse()
+    return chain
+
+def _materialise(db: Session, version: ProjectVersion, load_files: bool = False) -> Dict[str, Any]:
+    """Resolve the file set of a version by replaying its delta chain
+
+    Returns ``file_path -> blob_hash``, or ``file_path -> VersionFile`` when
+    ``load_files`` is set.
+    """
+    chain = _version_chain(db, version)
+    position = {version_id: i for i, version_id in enumerate(chain)}
+    columns = (VersionFile,) if load_files else (
+        VersionFile.version_id, VersionFile.file_path, VersionFile.blob_hash, VersionFile.is_deleted
+    )
+    rows = db.query(*columns).filter(VersionFile.version_id.in_(chain)).all()
+    rows.sort(key=lambda row: position[row.version_id])
+    
+    files = {}
+    for row in rows:
+        if row.is_deleted:
+            files.pop(row.file_path, None)
+        else:
+            files[row.file_path] = row if load_files else row.blob_hash
+    return files
+
+def _compare(db: Session, old: Dict[str, str], new: Dict[str, str], include_diff: bool) -> List[Dict[str, Any]]:
+    changes = []
+    for file_path in sorted(set(old) | set(new)):
+        old_hash, new_hash = old.get(file_path), new.get(file_path)
+        if old_hash == new_hash:
+            continue
+        change_type = "added" if old_hash is None else "deleted" if new_hash is None else "modified"
+        changes.append({
+            "file_path": file_path,
+            "change_type": change_type,
+            "old_hash": old_hash,
+            "new_hash": new_hash
+        })
+    
+    if include_diff:
+        diffs = BlobStore.get_diffs(db, [
+            (change["old_hash"], change["new_hash"])
+            for change in changes if change["change_type"] == "modified"
+        ])
+        for change in changes:
+            change["diff"] = diffs.get((change["old_hash"], change["new_hash"]))
+    return changes
 
 class CollaborationService:
     @staticmethod
@@ -51,11 +121,46 @@ class CollaborationService:
         project_id: int,
         file_path: Optional[str] = None
     ) -> List[Comment]:
-        query = db.query(Comment).filter(Comment.project_id == project_id)
+        # Authors join into the comment query; replies and their authors come in one more
+        query = db.query(Comment).options(
+            joinedload(Comment.user),
+            selectinload(Comment.replies).joinedload(CommentReply.user)
+        ).filter(Comment.project_id == project_id)
         if file_path:
             query = query.filter(Comment.file_path == file_path)
         return query.order_by(Comment.created_at.desc()).all()
     
+    @staticmethod
+    async def get_comment_threads(
+        db: Session,
+        project_id: int,
+        file_path: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Comments with their replies as plain dicts, selecting only what is displayed"""
+        query = db.query(
+            Comment.id, Comment.content, Comment.file_path, Comment.line_number,
+            Comment.created_at, Comment.user_id, User.username
+        ).outerjoin(User, User.id == Comment.user_id).filter(Comment.project_id == project_id)
+        if file_path:
+            query = query.filter(Comment.file_path == file_path)
+        threads = [
+            dict(row._mapping, replies=[])
+            for row in query.order_by(Comment.created_at.desc()).all()
+        ]
+        if not threads:
+            return threads
+        
+        by_id = {thread["id"]: thread for thread in threads}
+        replies = db.query(
+            CommentReply.id, CommentReply.comment_id, CommentReply.content,
+            CommentReply.created_at, CommentReply.user_id, User.username
+        ).outerjoin(User, User.id == CommentReply.user_id).filter(
+            CommentReply.comment_id.in_(list(by_id))
+        ).order_by(CommentReply.created_at).all()
+        for reply in replies:
+            by_id[reply.comment_id]["replies"].append(dict(reply._mapping))
+        return threads
+    
     @staticmethod
     async def create_version(
         db: Session,
@@ -63,7 +168,8 @@ class CollaborationService:
         version_number: str,
         description: str,
         created_by: int,
-        files: dict
+        files: dict,
+        delta: Optional[bool] = None
     ) -> ProjectVersion:
         # Validate version number format
         try:
@@ -86,23 +192,46 @@ class CollaborationService:
                 detail="Version number already exists"
             )
         
+        parent = db.query(ProjectVersion).filter(
+            ProjectVersion.project_id == project_id
+        ).order_by(ProjectVersion.id.desc()).first()
+        
+        # Save files as references to content-addressed blobs; unchanged
+        # content is already stored, so only new blobs are written
+        hashes = BlobStore.put_files(db, files) if files else {}
+        rows = [
+            {"file_path": file_path, "blob_hash": blob_hash, "is_deleted": False}
+            for file_path, blob_hash in hashes.items()
+        ]
+        
+        use_delta = VERSION_DELTA_STORAGE if delta is None else delta
+        is_delta = bool(
+            use_delta and parent
+            and len(_version_chain(db, parent)) < VERSION_SNAPSHOT_INTERVAL
+        )
+        if is_delta:
+            parent_files = _materialise(db, parent)
+            rows = [row for row in rows if parent_files.get(row["file_path"]) != row["blob_hash"]]
+            rows.extend(
+                {"file_path": file_path, "blob_hash": None, "is_deleted": True}
+                for file_path in parent_files if file_path not in hashes
+            )
+        
         version = ProjectVersion(
             project_id=project_id,
             version_number=version_number,
             description=description,
-            created_by=created_by
+            created_by=created_by,
+            parent_id=parent.id if parent else None,
+            is_delta=is_delta
         )
         db.add(version)
         db.flush()
         
-        # Save files
-        for file_path, content in files.items():
-            version_file = VersionFile(
-                version_id=version.id,
-                file_path=file_path,
-                content=content
-            )
-            db.add(version_file)
+        if rows:
+            for row in rows:
+                row["version_id"] = version.id
+            db.execute(VersionFile.__table__.insert(), rows)
         
         db.commit()
         db.refresh(version)
@@ -111,17 +240,131 @@ class CollaborationService:
     @staticmethod
     async def get_project_versions(
         db: Session,
-        project_id: int
+        project_id: int,
+        include_files: bool = False
     ) -> List[ProjectVersion]:
-        return db.query(ProjectVersion).filter(
+        """Versions of a project, newest first
+
+        With ``include_files`` each version's ``files`` holds its full file
+        set, delta versions resolved against their parents.
+        """
+        versions = db.query(ProjectVersion).options(joinedload(ProjectVersion.creator)).filter(
+            ProjectVersion.project_id == project_id
+        ).order_by(ProjectVersion.created_at.desc()).all()
+        if include_files:
+            # Stored file rows of every version in one query, replayed oldest first
+            rows: Dict[int, List[VersionFile]] = {}
+            for row in db.query(VersionFile).join(
+                ProjectVersion, ProjectVersion.id == VersionFile.version_id
+            ).filter(ProjectVersion.project_id == project_id):
+                rows.setdefault(row.version_id, []).append(row)
+            resolved: Dict[int, Dict[str, VersionFile]] = {}
+            for version in sorted(versions, key=lambda v: v.id):
+                files = dict(resolved.get(version.parent_id, {})) if version.is_delta else {}
+                for row in rows.get(version.id, []):
+                    if row.is_deleted:
+                        files.pop(row.file_path, None)
+                    else:
+                        files[row.file_path] = row
+                resolved[version.id] = files
+                # Populate the relationship without marking the version dirty
+                set_committed_value(version, "files", list(files.values()))
+        return versions
+    
+    @staticmethod
+    async def get_version_summaries(
+        db: Session,
+        project_id: int
+    ) -> List[Dict[str, Any]]:
+        """Version history rows with creator name and stored file count, without file contents"""
+        file_counts = db.query(
+            VersionFile.version_id,
+            func.count(VersionFile.id).label("file_count")
+        ).join(
+            ProjectVersion, ProjectVersion.id == VersionFile.version_id
+        ).filter(
+            ProjectVersion.project_id == project_id
+        ).group_by(VersionFile.version_id).subquery()
+        rows = db.query(
+            ProjectVersion.id, ProjectVersion.version_number, ProjectVersion.description,
+            ProjectVersion.created_at, ProjectVersion.parent_id, ProjectVersion.is_delta,
+            ProjectVersion.created_by, User.username.label("created_by_name"),
+            func.coalesce(file_counts.c.file_count, 0).label("file_count")
+        ).outerjoin(
+            User, User.id == ProjectVersion.created_by
+        ).outerjoin(
+            file_counts, file_counts.c.version_id == ProjectVersion.id
+        ).filter(
             ProjectVersion.project_id == project_id
         ).order_by(ProjectVersion.created_at.desc()).all()
+        return [dict(row._mapping) for row in rows]
     
     @staticmethod
     async def get_version_files(
         db: Session,
         version_id: int
     ) -> List[VersionFile]:
-        return db.query(VersionFile).filter(
+        version = db.query(ProjectVersion).filter(ProjectVersion.id == version_id).first()
+        if not version:
+            raise HTTPException(status_code=404, detail="Version not found")
+        if not version.is_delta:
+            return db.query(VersionFile).filter(
+                VersionFile.version_id == version_id
+            ).all()
+        return list(_materialise(db, version, load_files=True).values())
+    
+    @staticmethod
+    async def get_version_changes(
+        db: Session,
+        version_id: int,
+        include_diff: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Files changed by a version relative to its parent"""
+        version = db.query(ProjectVersion).filter(ProjectVersion.id == version_id).first()
+        if not version:
+            raise HTTPException(status_code=404, detail="Version not found")
+        if not version.parent_id:
+            return _compare(db, {}, _materialise(db, version), include_diff)
+        if not version.is_delta:
+            parent = db.query(ProjectVersion).filter(ProjectVersion.id == version.parent_id).first()
+            return _compare(db, _materialise(db, parent), _materialise(db, version), include_diff)
+        
+        # A delta version stores exactly its changes; only the previous hashes
+        # of the touched paths are needed from the parent
+        own = db.query(VersionFile.file_path, VersionFile.blob_hash).filter(
             VersionFile.version_id == version_id
-        ).all() 
\ No newline at end of file
+        ).all()
+        parent = db.query(ProjectVersion).filter(ProjectVersion.id == version.parent_id).first()
+        parent_files = _materialise(db, parent)
+        touched = {file_path for file_path, _ in own}
+        old = {path: parent_files[path] for path in touched if path in parent_files}
+        new = {path: blob_hash for path, blob_hash in own if blob_hash is not None}
+        return _compare(db, old, new, include_diff)
+    
+    @staticmethod
+    async def diff_versions(
+        db: Session,
+        from_version_id: int,
+        to_version_id: int,
+        include_diff: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Per-file changes between two versions of the same project
+
+        File sets are compared by blob hash, so only modified files are ever
+        decoded, and their diffs are cached per blob pair.
+        """
+        versions = {
+            version.id: version for version in db.query(ProjectVersion).filter(
+                ProjectVersion.id.in_([from_version_id, to_version_id])
+            )
+        }
+        if from_version_id not in versions or to_version_id not in versions:
+            raise HTTPException(status_code=404, detail="Version not found")
+        if versions[from_version_id].project_id != versions[to_version_id].project_id:
+            raise HTTPException(status_code=400, detail="Versions belong to different projects")
+        return _compare(
+            db,
+            _materialise(db, versions[from_version_id]),
+            _materialise(db, versions[to_version_id]),
+            include_diff
+        ) 
\ No newline at end of file
@@ -1,22 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
-from typing import Generator
-from config import settings
+from typing import Dict, Generator, Optional
+from models.database import engine as default_engine, SessionLocal, pool_stats
 import logging
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
-    def __init__(self, database_url: str):
-        self.engine = create_engine(
-            database_url,
-            pool_size=5,
-            max_overflow=10,
-            pool_timeout=30,
-            pool_recycle=1800
-        )
-        self.SessionLocal = sessionmaker(
+    def __init__(self, engine: Optional[Engine] = None):
+        # Share the application engine so its pool is not duplicated per process
+        self.engine = engine or default_engine
+        self.SessionLocal = SessionLocal if engine is None else sessionmaker(
             autocommit=False,
             autoflush=False,
             bind=self.engine
@@ -30,7 +25,7 @@ class DatabaseManager:
             session.commit()
         except Exception as e:
             session.rollback()
-            logger.error(f"Database error: {str(e)}")
+            logger.error("Database error: %s", e)
             raise
         finally:
             session.close()
@@ -47,8 +42,12 @@ class DatabaseManager:
                 session.execute("SELECT 1")
             return True
         except Exception as e:
-            logger.error(f"Database health check failed: {str(e)}")
+            logger.error("Database health check failed: %s", e)
             return False
 
+    def pool_status(self) -> Dict:
+        """Checkout, overflow and wait time counters of the connection pool"""
+        return pool_stats(self.engine)
+
 # Create global database manager instance
-db_manager = DatabaseManager(settings.DATABASE_URL) 
\ No newline at end of file
+db_manager = DatabaseManager() 
\ No newline at end of file
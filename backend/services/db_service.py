@@ -1,16 +1,196 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import Dict, List, Optional
+from sqlalchemy import desc, bindparam, and_, or_, event, inspect
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
 from models.project import Project, ProjectFile
 from models.user import User, UserRole
 from fastapi import HTTPException
-from models.project_share import ProjectShare
-from services.database_manager import db_manager
+from models.project_share import ProjectShare, SharePermission
+from models.blob import content_hash
+from services.blob_store import BlobStore
+from services.search_service import SearchService, SEARCH_INDEX_FILE_CONTENTS
+from services.stats_service import StatsService
+from utils.cache import TTLCache
+from utils.pagination import keyset_page
 import json
 import logging
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+# (user_id, project_id) -> resolved SharePermission, or None for no access
+_access_cache = TTLCache(
+    maxsize=settings.ACCESS_CACHE_SIZE,
+    ttl=settings.ACCESS_CACHE_TTL,
+    name="project_access"
+)
+_NOT_CACHED = object()
+
+# Columns returned by project listings; structure and files are fetched per project
+PROJECT_LIST_COLUMNS = (
+    Project.id, Project.name, Project.description, Project.project_type,
+    Project.model, Project.owner_id, Project.created_at, Project.updated_at
+)
+
+def _share_join(user: User):
+    return and_(ProjectShare.project_id == Project.id, ProjectShare.user_id == user.id)
+
+def _permission(owner_id: int, share_permission: Optional[SharePermission], user: User) -> Optional[SharePermission]:
+    """Owners and admins hold full permission, everyone else what the share grants"""
+    if owner_id == user.id or user.role == UserRole.ADMIN:
+        return SharePermission.ADMIN
+    return share_permission
+
+def _file_type(file_path: str) -> str:
+    return "frontend" if "frontend/" in file_path else "backend"
+
+def _insert_files(db: Session, project_id: int, files: Dict[str, str]) -> int:
+    """Insert all files in a single executemany round trip, bypassing the ORM"""
+    if not files:
+        return 0
+    hashes = BlobStore.put_files(db, files)
+    now = datetime.utcnow()
+    db.execute(ProjectFile.__table__.insert(), [
+        {
+            "project_id": project_id,
+            "file_path": file_path,
+            "blob_hash": hashes[file_path],
+            "file_type": _file_type(file_path),
+            "created_at": now,
+            "updated_at": now
+        } for file_path in files
+    ])
+    return len(files)
+
+def _search_projects(db: Session, keyword: str, limit: int, offset: int) -> List[Dict]:
+    ranked = SearchService.search(db, keyword, limit, offset)
+    if not ranked:
+        return []
+    rows = db.query(*PROJECT_LIST_COLUMNS).filter(
+        Project.id.in_([project_id for project_id, _ in ranked])
+    ).all()
+    by_id = {row.id: dict(row._mapping) for row in rows}
+    # Ids whose project has gone since it was indexed are skipped
+    return [
+        dict(by_id[project_id], score=score)
+        for project_id, score in ranked if project_id in by_id
+    ]
+
+def _create_project(
+    db: Session,
+    description: str,
+    project_type: str,
+    structure: Dict,
+    generated_files: Dict[str, str],
+    owner_id: int,
+    model: Optional[str] = None,
+    commit: bool = True
+) -> Project:
+    # Create project record
+    project = Project(
+        description=description,
+        project_type=project_type,
+        structure=structure,
+        model=model,
+        owner_id=owner_id
+    )
+    db.add(project)
+    db.flush()
+    
+    # Save generated files
+    _insert_files(db, project.id, generated_files)
+    if SEARCH_INDEX_FILE_CONTENTS:
+        SearchService.index_project(db.connection(), project.id)
+    
+    if commit:
+        db.commit()
+    db.refresh(project)
+    
+    # Log project creation
+    logger.info("Project created: %s by user %s", project.id, owner_id)
+    
+    return project
+
+def _sync_project_files(db: Session, project_id: int, files: Dict[str, str]) -> Dict[str, int]:
+    """Make the stored files of a project match ``files``, without committing"""
+    table = ProjectFile.__table__
+    # Compare content hashes so stored file contents never have to be loaded
+    existing = db.query(
+        ProjectFile.id,
+        ProjectFile.file_path,
+        ProjectFile.blob_hash
+    ).filter(ProjectFile.project_id == project_id).all()
+    
+    stale_ids = []
+    changed = []
+    unchanged = 0
+    for file_id, file_path, blob_hash in existing:
+        if file_path not in files:
+            stale_ids.append(file_id)
+        elif content_hash(files[file_path]) != blob_hash:
+            changed.append({"file_id": file_id, "file_path": file_path})
+        else:
+            unchanged += 1
+    
+    stored_paths = {file_path for _, file_path, _ in existing}
+    new_files = {
+        file_path: content for file_path, content in files.items()
+        if file_path not in stored_paths
+    }
+    
+    if stale_ids:
+        db.execute(table.delete().where(table.c.id.in_(stale_ids)))
+    if changed:
+        hashes = BlobStore.put_files(
+            db, {row["file_path"]: files[row["file_path"]] for row in changed}
+        )
+        now = datetime.utcnow()
+        db.execute(
+            table.update()
+            .where(table.c.id == bindparam("file_id"))
+            .values(blob_hash=bindparam("new_hash"), updated_at=bindparam("now")),
+            [
+                {"file_id": row["file_id"], "new_hash": hashes[row["file_path"]], "now": now}
+                for row in changed
+            ]
+        )
+    _insert_files(db, project_id, new_files)
+    if SEARCH_INDEX_FILE_CONTENTS and (stale_ids or changed or new_files):
+        SearchService.index_project(db.connection(), project_id)
+    return {
+        "inserted": len(new_files),
+        "updated": len(changed),
+        "deleted": len(stale_ids),
+        "unchanged": unchanged
+    }
+
+def _project_sources(db: Session, project_id: int) -> Tuple[Optional[Dict], Dict[str, str]]:
+    """Stored structure and file contents of a project, the input of an incremental regeneration"""
+    structure = db.query(Project.structure).filter(Project.id == project_id).scalar()
+    files = db.query(ProjectFile).filter(ProjectFile.project_id == project_id).all()
+    return structure, {f.file_path: f.content for f in files}
+
+def _update_generated_project(
+    db: Session,
+    project_id: int,
+    structure: Dict,
+    generated_files: Dict[str, str],
+    model: Optional[str] = None,
+    commit: bool = True
+) -> Dict[str, int]:
+    """Store a regenerated structure and its files on an existing project"""
+    updated = db.query(Project).filter(Project.id == project_id).update(
+        {"structure": structure, "model": model, "updated_at": datetime.utcnow()},
+        synchronize_session=False
+    )
+    if not updated:
+        raise ValueError(f"Project {project_id} no longer exists")
+    stats = _sync_project_files(db, project_id, generated_files)
+    if commit:
+        db.commit()
+    logger.info("Project %d regenerated: %s", project_id, stats)
+    return stats
+
 class DatabaseService:
     @staticmethod
     async def create_project(
@@ -23,39 +203,10 @@ class DatabaseService:
         model: Optional[str] = None
     ) -> Project:
         try:
-            # Create project record
-            project = Project(
-                description=description,
-                project_type=project_type,
-                structure=structure,
-                model=model,
-                owner_id=owner_id
-            )
-            db.add(project)
-            db.flush()
-            
-            # Save generated files
-            for file_path, content in generated_files.items():
-                file_type = "frontend" if "frontend/" in file_path else "backend"
-                project_file = ProjectFile(
-                    project_id=project.id,
-                    file_path=file_path,
-                    content=content,
-                    file_type=file_type
-                )
-                db.add(project_file)
-            
-            db.commit()
-            db.refresh(project)
-            
-            # Log project creation
-            logger.info(f"Project created: {project.id} by user {owner_id}")
-            
-            return project
-            
+            return _create_project(db, description, project_type, structure, generated_files, owner_id, model)
         except Exception as e:
             db.rollback()
-            logger.error(f"Error creating project: {str(e)}")
+            logger.error("Error creating project: %s", e)
             raise HTTPException(
                 status_code=500,
                 detail="Failed to create project"
@@ -66,32 +217,16 @@ class DatabaseService:
         db: Session,
         project_id: int,
         files: Dict[str, str]
-    ) -> List[ProjectFile]:
+    ) -> Dict[str, int]:
+        """Sync stored files with ``files``, rewriting only rows whose content changed"""
         try:
-            # Delete existing files
-            db.query(ProjectFile).filter(
-                ProjectFile.project_id == project_id
-            ).delete()
-            
-            # Save new files
-            saved_files = []
-            for file_path, content in files.items():
-                file_type = "frontend" if "frontend/" in file_path else "backend"
-                project_file = ProjectFile(
-                    project_id=project_id,
-                    file_path=file_path,
-                    content=content,
-                    file_type=file_type
-                )
-                db.add(project_file)
-                saved_files.append(project_file)
-            
+            stats = _sync_project_files(db, project_id, files)
             db.commit()
-            return saved_files
+            return stats
             
         except Exception as e:
             db.rollback()
-            logger.error(f"Error saving project files: {str(e)}")
+            logger.error("Error saving project files: %s", e)
             raise HTTPException(
                 status_code=500,
                 detail="Failed to save files"
@@ -130,7 +265,7 @@ class DatabaseService:
             return json.dumps(backup_data, ensure_ascii=False)
             
         except Exception as e:
-            logger.error(f"Error backing up project: {str(e)}")
+            logger.error("Error backing up project: %s", e)
             raise HTTPException(
                 status_code=500,
                 detail="Failed to backup project"
@@ -142,8 +277,19 @@ class DatabaseService:
         project_id: int,
         user: Optional[User] = None
     ) -> Project:
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if user and not await DatabaseService.check_project_access(db, project_id, user):
+        if not user:
+            return db.query(Project).filter(Project.id == project_id).first()
+        
+        # Load the project together with the caller's share in one round trip
+        row = db.query(Project, ProjectShare.permission).outerjoin(
+            ProjectShare, _share_join(user)
+        ).filter(Project.id == project_id).first()
+        if not row:
+            return None
+        project, share_permission = row
+        permission = _permission(project.owner_id, share_permission, user)
+        _access_cache.set((user.id, project_id), permission)
+        if permission is None:
             raise HTTPException(status_code=403, detail="No access permission")
         return project
     
@@ -156,16 +302,22 @@ class DatabaseService:
     @staticmethod
     async def list_projects(
         db: Session,
-        skip: int = 0,
         limit: int = 10,
-        project_type: Optional[str] = None
-    ) -> List[Project]:
-        query = db.query(Project).order_by(desc(Project.created_at))
+        project_type: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """One page of projects newest first, and the cursor of the next page
+
+        Only the listing columns are selected, so the structure JSON and the
+        files never leave the database.
+        """
+        query = db.query(*PROJECT_LIST_COLUMNS)
         
         if project_type:
             query = query.filter(Project.project_type == project_type)
             
-        return query.offset(skip).limit(limit).all()
+        rows, next_cursor = keyset_page(query, Project.created_at, Project.id, limit, cursor)
+        return [dict(row._mapping) for row in rows], next_cursor
     
     @staticmethod
     async def update_project(
@@ -201,17 +353,18 @@ class DatabaseService:
         # Then delete the project
         db.delete(project)
         db.commit()
+        DatabaseService.invalidate_access(project_id=project_id)
         return True
     
     @staticmethod
     async def search_projects(
         db: Session,
         keyword: str,
-        limit: int = 10
-    ) -> List[Project]:
-        return db.query(Project).filter(
-            Project.description.ilike(f"%{keyword}%")
-        ).limit(limit).all()
+        limit: int = 10,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Projects matching every word of ``keyword`` as a prefix, best match first"""
+        return _search_projects(db, keyword, limit, offset)
     
     @staticmethod
     async def check_project_access(
@@ -219,48 +372,70 @@ class DatabaseService:
         project_id: int,
         user: User
     ) -> bool:
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
-            return False
-            
-        # Check if user is owner or admin
-        if project.owner_id == user.id or user.role == UserRole.ADMIN:
-            return True
-            
-        # Check if user has share permission
-        share = db.query(ProjectShare).filter(
-            ProjectShare.project_id == project_id,
-            ProjectShare.user_id == user.id
-        ).first()
+        return await DatabaseService.resolve_project_access(db, project_id, user) is not None
+    
+    @staticmethod
+    async def resolve_project_access(
+        db: Session,
+        project_id: int,
+        user: User
+    ) -> Optional[SharePermission]:
+        """Permission level of ``user`` on a project, or None without access
+        
+        Owner, admin and share checks are answered by a single joined query,
+        and the result is cached until the share or project changes.
+        """
+        permission = _access_cache.get((user.id, project_id), _NOT_CACHED)
+        if permission is not _NOT_CACHED:
+            return permission
         
-        return share is not None
+        row = db.query(Project.owner_id, ProjectShare.permission).outerjoin(
+            ProjectShare, _share_join(user)
+        ).filter(Project.id == project_id).first()
+        if not row:
+            return None
+        permission = _permission(row[0], row[1], user)
+        _access_cache.set((user.id, project_id), permission)
+        return permission
+    
+    @staticmethod
+    async def filter_accessible_projects(
+        db: Session,
+        project_ids: Iterable[int],
+        user: User
+    ) -> List[int]:
+        """The subset of ``project_ids`` the user may read, in one statement"""
+        project_ids = list(project_ids)
+        if not project_ids:
+            return []
+        query = db.query(Project.id).filter(Project.id.in_(project_ids))
+        if user.role != UserRole.ADMIN:
+            query = query.outerjoin(ProjectShare, _share_join(user)).filter(
+                or_(Project.owner_id == user.id, ProjectShare.id.isnot(None))
+            )
+        accessible = {project_id for (project_id,) in query}
+        return [project_id for project_id in project_ids if project_id in accessible]
+    
+    @staticmethod
+    def invalidate_access(project_id: Optional[int] = None, user_id: Optional[int] = None) -> int:
+        """Evict cached permissions matching the given project and/or user"""
+        if project_id is not None and user_id is not None:
+            return 1 if _access_cache.pop((user_id, project_id), _NOT_CACHED) is not _NOT_CACHED else 0
+        return _access_cache.invalidate(
+            lambda key, _: (project_id is None or key[1] == project_id)
+            and (user_id is None or key[0] == user_id)
+        )
 
     @staticmethod
     async def get_project_stats(
-        db: Session
+        db: Session,
+        max_age: Optional[float] = None
     ) -> Dict:
-        # Get project statistics
-        total_projects = db.query(Project).count()
-        
-        # Count projects by type
-        projects_by_type = db.query(
-            Project.project_type,
-            func.count(Project.id)
-        ).group_by(Project.project_type).all()
-        
-        # Get recent projects
-        recent_projects = db.query(Project).order_by(
-            desc(Project.created_at)
-        ).limit(5).all()
-        
-        return {
-            "total_projects": total_projects,
-            "projects_by_type": dict(projects_by_type),
-            "recent_projects": [
-                {
-                    "id": p.id,
-                    "description": p.description,
-                    "created_at": p.created_at
-                } for p in recent_projects
-            ]
-        } 
\ No newline at end of file
+        # Served from incrementally maintained counters, see StatsService
+        return await StatsService.get_stats(db, max_age)
+
+@event.listens_for(User, "after_update")
+def _invalidate_admin_access(mapper, connection, target: User):
+    # Admins can read every project, so a role change affects all cached entries of the user
+    if inspect(target).attrs.role.history.has_changes():
+        DatabaseService.invalidate_access(user_id=target.id)
@@ -0,0 +1,450 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from models.generation_job import FINISHED_STATUSES, FileStatus, GenerationJob, GenerationJobFile, JobStatus
+from models.project import Project
+from models.project_share import ProjectShare, SharePermission
+from models.user import User, UserRole
+from services.ai_service import AICodeGenerator, get_code_generator
+from services.db_service import _create_project, _permission, _project_sources, _share_join, _update_generated_project
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = settings.JOB_WORKERS
+JOB_POLL_INTERVAL = settings.JOB_POLL_INTERVAL
+JOB_MAX_ATTEMPTS = settings.JOB_MAX_ATTEMPTS
+JOB_RETRY_BACKOFF = settings.JOB_RETRY_BACKOFF
+JOB_LEASE_SECONDS = settings.JOB_LEASE_SECONDS
+
+# Why _watch stopped a generation before it finished
+CANCEL_REQUESTED = "cancel_requested"
+LEASE_LOST = "lease_lost"
+
+class LeaseLost(Exception):
+    """The job was recovered and handed to another worker while this one ran it"""
+
+class JobService:
+    @staticmethod
+    async def enqueue(
+        db: AsyncSession,
+        owner_id: int,
+        prompt: str,
+        model: Optional[str] = None,
+        project_structure: Optional[Dict] = None,
+        project_type: str = "web",
+        priority: int = 0,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        project_id: Optional[int] = None
+    ) -> GenerationJob:
+        """Queue a generation; with ``project_id`` the job regenerates that project in place"""
+        job = GenerationJob(
+            owner_id=owner_id,
+            prompt=prompt,
+            model=model,
+            structure=project_structure,
+            project_type=project_type,
+            priority=priority,
+            max_attempts=max_attempts,
+            project_id=project_id,
+            run_after=datetime.utcnow()
+        )
+        db.add(job)
+        await db.commit()
+        return await JobService._load(db, job.id)
+
+    @staticmethod
+    async def enqueue_regeneration(
+        db: AsyncSession,
+        project_id: int,
+        project_structure: Dict,
+        user: User,
+        model: Optional[str] = None,
+        priority: int = 0
+    ) -> GenerationJob:
+        """Queue an incremental regeneration of a project the user may write to"""
+        row = (await db.execute(
+            select(Project.owner_id, ProjectShare.permission, Project.description, Project.project_type)
+            .outerjoin(ProjectShare, _share_join(user))
+            .where(Project.id == project_id)
+        )).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Project not found")
+        permission = _permission(row.owner_id, row.permission, user)
+        if permission is None:
+            raise HTTPException(status_code=403, detail="No access permission")
+        if permission == SharePermission.READ:
+            raise HTTPException(status_code=403, detail="Write permission required")
+        return await JobService.enqueue(
+            db, user.id, row.description or "", model, project_structure,
+            row.project_type or "web", priority, project_id=project_id
+        )
+
+    @staticmethod
+    async def _load(db: AsyncSession, job_id: int) -> Optional[GenerationJob]:
+        # populate_existing: progress rows change underneath a long-lived session
+        return (await db.execute(
+            select(GenerationJob).options(selectinload(GenerationJob.files))
+            .where(GenerationJob.id == job_id)
+            .execution_options(populate_existing=True)
+        )).scalar_one_or_none()
+
+    @staticmethod
+    async def get_job(db: AsyncSession, job_id: int, user: User) -> GenerationJob:
+        job = await JobService._load(db, job_id)
+        # Other users' jobs are reported as missing rather than forbidden
+        if not job or (job.owner_id != user.id and user.role != UserRole.ADMIN):
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    @staticmethod
+    async def cancel_job(db: AsyncSession, job_id: int, user: User) -> GenerationJob:
+        """Cancel a queued job at once, or ask the worker running it to stop"""
+        job = await JobService.get_job(db, job_id, user)
+        if job.status in FINISHED_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Job already {job.status.value}")
+        # Conditional updates, so a worker claiming the job meanwhile is not overridden
+        result = await db.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id, GenerationJob.status == JobStatus.QUEUED)
+            .values(status=JobStatus.CANCELLED, finished_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == JobStatus.RUNNING)
+                .values(cancel_requested=True)
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+        return await JobService._load(db, job_id)
+
+class GenerationWorker:
+    """Pool of in-process workers executing generation jobs from the database
+
+    Jobs are claimed with a conditional UPDATE, so any number of workers in
+    any number of processes can share one queue without a broker. A running
+    job heartbeats every ``poll_interval``; jobs whose worker stopped
+    heartbeating for ``lease_seconds`` are put back on the queue. Every write
+    to a job matches on this worker's lease, so a worker that lost its lease
+    stops its generation and leaves the job to its new owner. Failed
+    attempts are retried with exponential backoff up to the job's
+    ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        generator: Optional[AICodeGenerator] = None,
+        concurrency: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        retry_backoff: float = JOB_RETRY_BACKOFF,
+        lease_seconds: float = JOB_LEASE_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.generator = generator
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._next_recovery = 0.0
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        logger.info("Started %d generation workers as %s", self.concurrency, self.worker_id)
+
+    async def stop(self):
+        """Cancel the workers; their running jobs go back on the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            try:
+                if not await self.run_once():
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Generation worker error: %s", e)
+                await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self) -> bool:
+        """Claim and execute one job, returning False when the queue is empty"""
+        await self._recover_expired()
+        job_id = await self._claim()
+        if job_id is None:
+            return False
+        await self._execute(job_id)
+        return True
+
+    async def _write(self, *statements, lease: Optional[GenerationJob] = None) -> List[int]:
+        """Execute statements in one transaction, returning their rowcounts
+
+        With ``lease``, the statements only commit while this worker still
+        holds that job, and LeaseLost is raised otherwise.
+
+        Shielded: cancelling the caller mid-statement would otherwise leave
+        the connection holding its write lock until garbage collection.
+        """
+        async def write() -> List[int]:
+            async with self.session_factory() as db:
+                if lease is not None:
+                    await self._hold(db, lease)
+                results = [
+                    await db.execute(statement.execution_options(synchronize_session=False))
+                    for statement in statements
+                ]
+                await db.commit()
+                return [result.rowcount for result in results]
+
+        return await asyncio.shield(write())
+
+    def _holding(self, job: GenerationJob) -> tuple:
+        # attempts tells a later claim of the same job by this worker apart
+        return (GenerationJob.id == job.id, GenerationJob.worker_id == self.worker_id,
+                GenerationJob.status == JobStatus.RUNNING, GenerationJob.attempts == job.attempts)
+
+    async def _hold(self, db: AsyncSession, job: GenerationJob):
+        """Renew the lease inside ``db``'s transaction, which keeps recovery off the job until it ends"""
+        result = await db.execute(
+            update(GenerationJob).where(*self._holding(job))
+            .values(heartbeat_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            raise LeaseLost(job.id)
+
+    async def _update(self, job: GenerationJob, **values) -> bool:
+        """Update the job while this worker holds it, returning False once the lease is lost"""
+        updated, = await self._write(update(GenerationJob).where(*self._holding(job)).values(**values))
+        return bool(updated)
+
+    async def _claim(self) -> Optional[int]:
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            candidates = (await db.execute(
+                select(GenerationJob.id)
+                .where(GenerationJob.status == JobStatus.QUEUED, GenerationJob.run_after <= now)
+                .order_by(GenerationJob.priority.desc(), GenerationJob.id)
+                .limit(self.concurrency + 1)
+            )).scalars().all()
+        for job_id in candidates:
+            # Only one worker's UPDATE matches while the job is still queued
+            claimed, = await self._write(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == JobStatus.QUEUED)
+                .values(
+                    status=JobStatus.RUNNING,
+                    attempts=GenerationJob.attempts + 1,
+                    worker_id=self.worker_id,
+                    started_at=now,
+                    heartbeat_at=now
+                )
+            )
+            if claimed:
+                return job_id
+        return None
+
+    async def _recover_expired(self):
+        """Requeue, cancel or fail jobs whose worker stopped heartbeating"""
+        loop_time = asyncio.get_running_loop().time()
+        if loop_time < self._next_recovery:
+            return
+        self._next_recovery = loop_time + self.lease_seconds / 2
+        expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        stale = (GenerationJob.status == JobStatus.RUNNING, GenerationJob.heartbeat_at < expired)
+        requeued, cancelled, failed = await self._write(
+            update(GenerationJob)
+            .where(*stale, GenerationJob.attempts < GenerationJob.max_attempts,
+                   GenerationJob.cancel_requested.is_(False))
+            .values(status=JobStatus.QUEUED, worker_id=None, run_after=datetime.utcnow()),
+            update(GenerationJob)
+            .where(*stale, GenerationJob.cancel_requested.is_(True))
+            .values(status=JobStatus.CANCELLED, worker_id=None, error="Cancelled",
+                    finished_at=datetime.utcnow()),
+            update(GenerationJob)
+            .where(*stale)
+            .values(status=JobStatus.FAILED, worker_id=None, error="Worker stopped responding",
+                    finished_at=datetime.utcnow())
+        )
+        if requeued or cancelled or failed:
+            logger.warning("Recovered expired generation jobs: %d requeued, %d cancelled, %d failed",
+                           requeued, cancelled, failed)
+
+    async def _execute(self, job_id: int):
+        async with self.session_factory() as db:
+            job = await db.get(GenerationJob, job_id)
+            db.expunge(job)
+
+        generation = asyncio.create_task(self._generate(job))
+        watcher = asyncio.create_task(self._watch(job, generation))
+        try:
+            structure, files, model = await generation
+        except LeaseLost:
+            logger.warning("Generation job %d was taken over by another worker", job_id)
+        except asyncio.CancelledError:
+            stopped = watcher.result() if watcher.done() and not watcher.cancelled() else None
+            if stopped == CANCEL_REQUESTED:
+                await self._finish(job, JobStatus.CANCELLED, error="Cancelled")
+                return
+            if stopped == LEASE_LOST:
+                logger.warning("Generation job %d was taken over by another worker", job_id)
+                return
+            # The worker itself is stopping: hand the job to another worker
+            generation.cancel()
+            await self._update(job, status=JobStatus.QUEUED, worker_id=None,
+                               attempts=GenerationJob.attempts - 1)
+            raise
+        except Exception as e:
+            await self._fail(job, e)
+        else:
+            # The generation is complete, so a cancel arriving from here on is too late
+            try:
+                project_id = await self._persist(job, structure, files, model)
+            except LeaseLost:
+                logger.warning("Generation job %d was taken over by another worker", job_id)
+            except Exception as e:
+                await self._fail(job, e)
+            else:
+                logger.info("Generation job %d succeeded with project %d", job_id, project_id)
+        finally:
+            await watcher
+
+    async def _watch(self, job: GenerationJob, generation: asyncio.Task) -> Optional[str]:
+        """Heartbeat the job and stop its generation on cancellation or a lost lease
+
+        Returns why the generation was stopped, or None as soon as it finishes
+        rather than being cancelled, which could abandon a heartbeat
+        transaction midway.
+        """
+        while True:
+            done, _ = await asyncio.wait({generation}, timeout=self.poll_interval)
+            if done:
+                return None
+            if not await self._update(job, heartbeat_at=datetime.utcnow()):
+                generation.cancel()
+                return LEASE_LOST
+            async with self.session_factory() as db:
+                cancel_requested = await db.scalar(
+                    select(GenerationJob.cancel_requested).where(GenerationJob.id == job.id)
+                )
+            if cancel_requested:
+                generation.cancel()
+                return CANCEL_REQUESTED
+
+    async def _generate(self, job: GenerationJob) -> Tuple[Dict, Dict[str, str], str]:
+        """Generate the job's files, returning the structure, the files and the model used"""
+        generator = self.generator or get_code_generator()
+        structure = job.structure
+        if structure is None:
+            structure = await generator.analyze_requirements(job.prompt, job.model)
+            if not await self._update(job, structure=structure):
+                raise LeaseLost(job.id)
+
+        # Progress starts over on every attempt
+        file_paths = generator._get_file_paths(structure)
+        statements = [delete(GenerationJobFile).where(GenerationJobFile.job_id == job.id)]
+        if file_paths:
+            statements.append(insert(GenerationJobFile).values([
+                {"job_id": job.id, "file_path": path, "status": FileStatus.PENDING} for path in file_paths
+            ]))
+        await self._write(*statements, lease=job)
+
+        async def record(file_path: str, error: Optional[Exception]):
+            # Skipped once the lease is lost; the heartbeat then stops the generation
+            await self._write(
+                update(GenerationJobFile)
+                .where(GenerationJobFile.job_id == job.id, GenerationJobFile.file_path == file_path,
+                       select(GenerationJob.id).where(*self._holding(job)).exists())
+                .values(
+                    status=FileStatus.FAILED if error else FileStatus.DONE,
+                    error=(str(error) or type(error).__name__) if error else None,
+                    updated_at=datetime.utcnow()
+                )
+            )
+
+        if job.project_id is None:
+            result = await generator.generate_files(structure, model=job.model, on_file=record)
+            if not result.files:
+                raise RuntimeError(f"All {len(result.errors)} files failed")
+        else:
+            # Incremental: only files depending on changed structure sections are regenerated
+            async with self.session_factory() as db:
+                previous, existing = await db.run_sync(_project_sources, job.project_id)
+            result = await generator.regenerate_files(previous, structure, existing, model=job.model, on_file=record)
+            regenerated = len(file_paths) - len(result.reused)
+            if regenerated and len(result.errors) == regenerated:
+                raise RuntimeError(f"All {regenerated} regenerated files failed")
+
+        return structure, result.files, job.model or generator.default_model
+
+    async def _persist(self, job: GenerationJob, structure: Dict, files: Dict[str, str], model: str) -> int:
+        """Save the generated project and mark the job succeeded in one transaction
+
+        The transaction starts by renewing the lease, so a worker that lost
+        the job never saves a second copy, and a worker stopping after the
+        commit leaves no running job behind for recovery to generate again.
+        Shielded like ``_write``: once started, the commit is not abandoned.
+        """
+        async def persist() -> int:
+            async with self.session_factory() as db:
+                await self._hold(db, job)
+                if job.project_id is not None:
+                    await db.run_sync(_update_generated_project, job.project_id, structure, files, model,
+                                      commit=False)
+                    project_id = job.project_id
+                else:
+                    project = await db.run_sync(
+                        _create_project, job.prompt, job.project_type, structure,
+                        files, job.owner_id, model, commit=False
+                    )
+                    project_id = project.id
+                await db.execute(
+                    update(GenerationJob).where(*self._holding(job))
+                    .values(status=JobStatus.SUCCEEDED, project_id=project_id, worker_id=None,
+                            finished_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                return project_id
+
+        return await asyncio.shield(persist())
+
+    async def _finish(self, job: GenerationJob, status: JobStatus, **values):
+        if await self._update(job, status=status, worker_id=None, finished_at=datetime.utcnow(), **values):
+            logger.info("Generation job %d %s", job.id, status.value)
+        else:
+            logger.warning("Generation job %d was taken over by another worker before it %s",
+                           job.id, status.value)
+
+    async def _fail(self, job: GenerationJob, error: Exception):
+        attempts = job.attempts
+        message = str(error) or type(error).__name__
+        if attempts < job.max_attempts:
+            delay = self.retry_backoff * 2 ** (attempts - 1)
+            if not await self._update(
+                job, status=JobStatus.QUEUED, worker_id=None, error=message,
+                run_after=datetime.utcnow() + timedelta(seconds=delay)
+            ):
+                logger.warning("Generation job %d was taken over by another worker", job.id)
+                return
+            logger.warning("Generation job %d attempt %d failed, retrying in %.0fs: %s",
+                           job.id, attempts, delay, message)
+        else:
+            await self._finish(job, JobStatus.FAILED, error=message)
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class _MemoryTier:
+    """LRU of cached responses bounded by the total size of keys and values"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, size = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, expires_at: float):
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.size -= size
+
+class _SQLiteTier:
+    """Persistent tier shared by every process pointing at the same file"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+    def prune(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+class LLMResponseCache:
+    """Content-addressed cache of chat completion responses.
+
+    Entries are keyed on a SHA-256 of the model, messages and sampling
+    parameters. Lookups go to the in-process LRU first and then to the
+    optional SQLite tier, whose hits are promoted into memory.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 86400,
+        path: Optional[str] = None,
+        max_temperature: float = 0,
+        enabled: bool = True
+    ):
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.enabled = enabled
+        self.memory = _MemoryTier(max_bytes)
+        self.disk = _SQLiteTier(path) if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        return cls(
+            max_bytes=settings.LLM_CACHE_MAX_BYTES,
+            ttl=settings.LLM_CACHE_TTL,
+            path=settings.LLM_CACHE_PATH or None,
+            max_temperature=settings.LLM_CACHE_MAX_TEMPERATURE,
+            enabled=settings.LLM_CACHE_ENABLED
+        )
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, temperature: float) -> bool:
+        return self.enabled and temperature <= self.max_temperature
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.disk:
+            try:
+                row = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                # A locked or broken cache file must not fail the generation
+                logger.warning("Failed to read LLM cache entry: %s", e)
+                row = None
+            if row is not None:
+                value, expires_at = row
+                self.memory.set(key, value, expires_at)
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self.memory.set(key, value, expires_at)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning("Failed to persist LLM cache entry: %s", e)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk:
+            self.disk.clear()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+            "bytes": self.memory.size,
+            "evictions": self.memory.evictions,
+        }
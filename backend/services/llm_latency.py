@@ -0,0 +1,154 @@
+from typing import Dict, Iterable, List, Optional
+import bisect
+from config import settings
+
+# Upper bounds, in seconds, of the completion latency histogram buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+class LatencyHistogram:
+    """Completion latencies of one provider, biased towards recent calls
+
+    Once ``window`` samples have accumulated every bucket is halved, so the
+    histogram follows a provider that speeds up or slows down within a few
+    hundred calls instead of averaging over the whole process lifetime.
+
+    Calls cancelled before they finished, such as hedged requests that lost
+    the race, are censored samples: they only tell that the latency was at
+    least the time they ran. They are counted from the bucket above that
+    time, since leaving them out would keep exactly the slowest calls out of
+    the histogram.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.buckets: List[float] = [0.0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0.0
+        self.sum = 0.0
+        self.errors = 0
+        self.censored = 0
+
+    def observe(self, seconds: float, censored: bool = False):
+        if censored:
+            self.censored += 1
+            index = bisect.bisect_right(LATENCY_BUCKETS, seconds)
+        else:
+            index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += seconds
+        if self.count >= self.window:
+            self.buckets = [n / 2 for n in self.buckets]
+            self.count /= 2
+            self.sum /= 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate by linear interpolation inside the bucket holding the quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0.0
+        for i, n in enumerate(self.buckets):
+            if n and cumulative + n >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1] * 2
+                return lower + (upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return LATENCY_BUCKETS[-1]
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "errors": self.errors,
+            "censored": self.censored,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.buckets)),
+        }
+
+class HedgePolicy:
+    """When and where to send a backup request for a slow completion
+
+    The hedge fires after the primary provider's ``quantile`` latency, so
+    only the slowest calls are duplicated; until ``min_samples`` calls have
+    been observed ``default_delay`` is used instead. ``models`` maps each
+    provider taking part in hedging to the model requested from it as the
+    backup, e.g. ``{"openai": "gpt-4-turbo-preview", "deepseek": "deepseek-chat"}``.
+    """
+
+    def __init__(
+        self,
+        models: Dict[str, str],
+        enabled: bool = False,
+        quantile: float = 0.95,
+        default_delay: float = 10.0,
+        min_delay: float = 0.5,
+        max_delay: float = 60.0,
+        min_samples: int = 20,
+        window: int = 1000
+    ):
+        self.models = models
+        self.enabled = enabled
+        self.quantile = quantile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.hedged = 0
+        self.backup_wins = 0
+        self.primary_wins = 0
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        models = dict(
+            entry.split("=", 1) for entry in settings.LLM_HEDGE_MODELS.split(",") if "=" in entry
+        )
+        return cls(
+            models={provider.strip(): model.strip() for provider, model in models.items()},
+            enabled=settings.LLM_HEDGE_ENABLED,
+            quantile=settings.LLM_HEDGE_QUANTILE,
+            default_delay=settings.LLM_HEDGE_DEFAULT_DELAY,
+            min_delay=settings.LLM_HEDGE_MIN_DELAY,
+            max_delay=settings.LLM_HEDGE_MAX_DELAY,
+            min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+        )
+
+    def histogram(self, provider: str) -> LatencyHistogram:
+        if provider not in self.histograms:
+            self.histograms[provider] = LatencyHistogram(self.window)
+        return self.histograms[provider]
+
+    def observe(self, provider: str, seconds: float, ok: bool = True, censored: bool = False):
+        """Record a call that took ``seconds``, or was cancelled after ``seconds`` when ``censored``"""
+        histogram = self.histogram(provider)
+        if censored:
+            histogram.observe(seconds, censored=True)
+        elif ok:
+            histogram.observe(seconds)
+        else:
+            histogram.errors += 1
+
+    def backup_for(self, provider: str, configured: Iterable[str]) -> Optional[str]:
+        """Provider to hedge ``provider`` with, or None when it does not take part in hedging"""
+        if not self.enabled or provider not in self.models:
+            return None
+        configured = set(configured)
+        return next((other for other in self.models if other != provider and other in configured), None)
+
+    def delay(self, provider: str) -> float:
+        histogram = self.histogram(provider)
+        if histogram.count < self.min_samples:
+            return self.default_delay
+        return min(max(histogram.quantile(self.quantile), self.min_delay), self.max_delay)
+
+    @property
+    def stats(self) -> Dict[str, object]:
+        return {
+            "hedged": self.hedged,
+            "primary_wins": self.primary_wins,
+            "backup_wins": self.backup_wins,
+            "delays": {provider: self.delay(provider) for provider in self.histograms},
+            "latency": {provider: h.snapshot() for provider, h in self.histograms.items()},
+        }
@@ -0,0 +1,236 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import random
+
+import httpx
+from openai import AsyncOpenAI
+
+from utils.metrics import metrics
+from config import settings
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# As reported by the API; streamed and fake completions count one token per chunk or word
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens sent and received", ("provider", "model", "kind"))
+
+# Models labelled by name in metrics. The model comes from the request body,
+# so any other name is labelled "other" rather than adding a series per string
+METRIC_MODELS = frozenset(
+    {"gpt-4-turbo-preview", "deepseek-coder-33b-instruct", settings.DEFAULT_LLM_MODEL}
+    | {entry.split("=", 1)[1].strip() for entry in settings.LLM_HEDGE_MODELS.split(",") if "=" in entry}
+)
+
+def model_label(model: Optional[str]) -> str:
+    return model if model in METRIC_MODELS else "other"
+
+class LLMProvider(ABC):
+    """Chat completion backend shared by every request routed to it"""
+
+    name = "base"
+    # Whether requests can be sent at all, e.g. an API key is set
+    configured = True
+
+    @abstractmethod
+    async def complete(self, model: str, messages: List[Dict[str, str]],
+                       temperature: float, max_tokens: int) -> str:
+        """The full completion text"""
+
+    @abstractmethod
+    def stream(self, model: str, messages: List[Dict[str, str]],
+               temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        """Completion text chunks as they arrive, typically an async generator"""
+
+    async def aclose(self):
+        pass
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Provider speaking the OpenAI chat API over one pooled keep-alive HTTP client"""
+
+    def __init__(
+        self,
+        name: str,
+        api_key: Optional[str],
+        base_url: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60,
+        connect_timeout: float = 10,
+        read_timeout: float = 120
+    ):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client: Optional[AsyncOpenAI] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Created on first use so the app can start without every provider configured
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=http_client
+            )
+        return self._client
+
+    async def complete(self, model, messages, temperature, max_tokens) -> str:
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        if response.usage:
+            LLM_TOKENS.inc(self.name, model_label(model), "prompt", amount=response.usage.prompt_tokens)
+            LLM_TOKENS.inc(self.name, model_label(model), "completion", amount=response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    async def stream(self, model, messages, temperature, max_tokens) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in stream:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                LLM_TOKENS.inc(self.name, model_label(model), "completion")
+                yield content
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+class FakeProvider(LLMProvider):
+    """Local provider with simulated latency for offline benchmarks and tests
+
+    Requests asking for JSON get a minimal project structure, everything else
+    gets a code stub of roughly ``max_tokens`` tokens.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        tokens_per_second: float = 200,
+        error_rate: float = 0.0,
+        responder: Optional[Callable[[str, List[Dict[str, str]]], str]] = None
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.responder = responder or self._default_response
+        self.calls = 0
+
+    @staticmethod
+    def _default_response(model: str, messages: List[Dict[str, str]]) -> str:
+        prompt = messages[-1]["content"]
+        if "JSON" in prompt:
+            return json.dumps({"frontend": {"framework": "next.js"}, "backend": {"framework": "fastapi"}})
+        return f"# Generated by {model}\n" + "pass\n" * 64
+
+    def _check_error(self):
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError("Injected fake provider error")
+
+    async def complete(self, model, messages, temperature, max_tokens) -> str:
+        self.calls += 1
+        content = self.responder(model, messages)
+        tokens = len(content.split())
+        await asyncio.sleep(self.latency + tokens / self.tokens_per_second)
+        self._check_error()
+        LLM_TOKENS.inc(self.name, model_label(model), "completion", amount=tokens)
+        return content
+
+    async def stream(self, model, messages, temperature, max_tokens) -> AsyncIterator[str]:
+        self.calls += 1
+        content = self.responder(model, messages)
+        await asyncio.sleep(self.latency)
+        self._check_error()
+        for token in content.splitlines(keepends=True):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            LLM_TOKENS.inc(self.name, model_label(model), "completion")
+            yield token
+
+class ProviderRouter:
+    """Maps model names to providers, mirroring the prefix routing of the generator"""
+
+    def __init__(self, providers: Dict[str, LLMProvider], default: str = "openai"):
+        self.providers = providers
+        self.default = default
+
+    @classmethod
+    def from_env(cls) -> "ProviderRouter":
+        pool = dict(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+            connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+            read_timeout=settings.LLM_READ_TIMEOUT
+        )
+        return cls({
+            'openai': OpenAICompatibleProvider(
+                'openai',
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_API_BASE or None,
+                **pool
+            ),
+            'deepseek': OpenAICompatibleProvider(
+                'deepseek',
+                api_key=settings.DEEPSEEK_API_KEY,
+                base_url=settings.DEEPSEEK_API_BASE,
+                **pool
+            ),
+            'fake': FakeProvider(
+                latency=settings.FAKE_LLM_LATENCY,
+                tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+                error_rate=settings.FAKE_LLM_ERROR_RATE
+            ),
+        })
+
+    def provider_name(self, model: str) -> str:
+        for name in self.providers:
+            if model.startswith(name):
+                return name
+        return self.default
+
+    def get(self, name: str) -> LLMProvider:
+        return self.providers[name]
+
+    def configured(self) -> List[str]:
+        return [name for name, provider in self.providers.items() if provider.configured]
+
+    async def aclose(self):
+        for provider in self.providers.values():
+            try:
+                await provider.aclose()
+            except Exception as e:
+                logger.warning("Failed to close %s provider: %s", provider.name, e)
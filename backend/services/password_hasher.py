@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from typing import Any, Callable, Dict
+import asyncio
+import logging
+import threading
+import time
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasher:
+    """Runs password hashing on a bounded thread pool, off the event loop
+
+    The bcrypt backend releases the GIL while hashing, so worker threads give
+    real parallelism. Requests beyond ``max_workers + max_queue`` outstanding
+    hashes are rejected with 503 instead of queueing without bound, so a login
+    storm cannot stall the rest of the worker. ``max_workers=0`` hashes inline.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = 4, max_queue: int = 64):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        ) if max_workers > 0 else None
+        # Counters change on the event loop and on the executor threads
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    @classmethod
+    def from_env(cls, context: CryptContext) -> "PasswordHasher":
+        return cls(
+            context,
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(self.context.verify, plain_password, hashed_password)
+
+    async def _submit(self, fn: Callable, *args) -> Any:
+        if self._executor is None:
+            return fn(*args)
+        with self._lock:
+            outstanding = self._outstanding
+            full = outstanding >= self.max_workers + self.max_queue
+            if full:
+                self.rejected += 1
+            else:
+                self._outstanding += 1
+        if full:
+            logger.warning("Password hashing queue full (%d outstanding)", outstanding)
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+        future = self._executor.submit(self._run, fn, args, time.perf_counter())
+        # Released when the job finishes or is dropped from the queue, not when the
+        # caller gives up: a cancelled request leaves its hash running on the pool
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        with self._lock:
+            self._outstanding -= 1
+
+    def _run(self, fn: Callable, args: tuple, submitted: float) -> Any:
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self._wait_total += started - submitted
+                self._run_total += finished - started
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            running, outstanding = self._running, self._outstanding
+            completed, rejected = self.completed, self.rejected
+            wait_total, run_total = self._wait_total, self._run_total
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queued": max(outstanding - running, 0),
+            "completed": completed,
+            "rejected": rejected,
+            "wait_seconds_total": wait_total,
+            "run_seconds_total": run_total,
+            "avg_wait_ms": wait_total / (completed or 1) * 1000,
+            "avg_run_ms": run_total / (completed or 1) * 1000,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -1,6 +1,9 @@
 from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
 from models.project import Project
-from schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
+from schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse, ProjectListItem
+from services.db_service import PROJECT_LIST_COLUMNS
+from utils.pagination import keyset_page
 
 class ProjectService:
     @staticmethod
@@ -9,8 +12,10 @@ class ProjectService:
         return ProjectResponse.from_orm(project)
 
     @staticmethod
-    def get_projects(db: Session, skip: int = 0, limit: int = 100):
-        return db.query(Project).offset(skip).limit(limit).all()
+    def get_projects(db: Session, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[ProjectListItem], Optional[str]]:
+        query = db.query(*PROJECT_LIST_COLUMNS)
+        rows, next_cursor = keyset_page(query, Project.created_at, Project.id, limit, cursor)
+        return [ProjectListItem.from_orm(row) for row in rows], next_cursor
 
     @staticmethod
     def create_project(db: Session, project: ProjectCreate) -> ProjectResponse:
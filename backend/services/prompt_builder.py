@@ -0,0 +1,156 @@
+from typing import Any, Dict, Optional
+import json
+import logging
+import re
+from config import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the project structure embedded in each per-file prompt
+PROMPT_TOKEN_BUDGET = settings.LLM_PROMPT_TOKEN_BUDGET
+SIDES = ("frontend", "backend")
+
+# Words, single punctuation marks and line breaks with their indentation:
+# close to BPE counts for JSON and code
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]|\n\s*")
+
+class TokenCounter:
+    """Local tokenizer: tiktoken's cl100k_base when available, a regex estimate otherwise"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logger.warning("tiktoken encoding %s unavailable, estimating token counts: %s", encoding, e)
+
+    def count(self, text: str) -> int:
+        if self._encoding:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(_TOKEN_RE.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self._encoding:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        for i, match in enumerate(_TOKEN_RE.finditer(text)):
+            if i == max_tokens:
+                return text[:match.start()]
+        return text
+
+_counter: Optional[TokenCounter] = None
+
+def get_token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
+
+def file_side(file_path: str) -> Optional[str]:
+    for side in SIDES:
+        if file_path.startswith(side + "/") or f"/{side}/" in file_path:
+            return side
+    return None
+
+def structure_view(structure: Any, side: Optional[str]) -> Any:
+    """Sections of ``structure`` a file on ``side`` depends on: all but the other side's"""
+    if side is None or not isinstance(structure, dict):
+        return structure
+    others = [other for other in SIDES if other != side]
+    return {
+        key: value for key, value in structure.items()
+        if not any(other in str(key).lower() for other in others)
+    }
+
+def _depth(value: Any) -> int:
+    if isinstance(value, dict):
+        return 1 + max(map(_depth, value.values()), default=0)
+    if isinstance(value, list):
+        return 1 + max(map(_depth, value), default=0)
+    return 0
+
+def _prune(value: Any, depth: int) -> Any:
+    """Collapse containers nested deeper than ``depth`` into a short placeholder"""
+    if isinstance(value, dict):
+        if depth <= 0:
+            return f"{{{len(value)} keys omitted}}"
+        return {key: _prune(item, depth - 1) for key, item in value.items()}
+    if isinstance(value, list):
+        if depth <= 0:
+            return f"[{len(value)} items omitted]"
+        return [_prune(item, depth - 1) for item in value]
+    return value
+
+class StructurePrompts:
+    """Project structure text for the per-file prompts of one generation
+
+    Each file only sees the sections relevant to it: frontend files drop
+    the backend section and vice versa, while shared sections (architecture,
+    API, data models) are kept. Each view is serialised once as compact JSON
+    and, when over ``budget`` tokens, pruned depth-first until it fits.
+    ``tokens_saved`` compares against embedding the full indented structure
+    in every prompt.
+    """
+
+    def __init__(self, structure: Dict, budget: int = PROMPT_TOKEN_BUDGET,
+                 counter: Optional[TokenCounter] = None):
+        self.structure = structure
+        self.budget = budget
+        self.counter = counter or get_token_counter()
+        self._views: Dict[Optional[str], str] = {}
+        self._view_tokens: Dict[Optional[str], int] = {}
+        self._full_tokens: Optional[int] = None
+        self.files = 0
+        self.prompt_tokens = 0
+        self.pruned = 0
+
+    def for_file(self, file_path: str) -> str:
+        side = file_side(file_path)
+        if side not in self._views:
+            text = self._fit(structure_view(self.structure, side))
+            self._views[side] = text
+            self._view_tokens[side] = self.counter.count(text)
+        self.files += 1
+        self.prompt_tokens += self._view_tokens[side]
+        return self._views[side]
+
+    def _dumps(self, value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+    def _fit(self, view: Any) -> str:
+        text = self._dumps(view)
+        if self.counter.count(text) <= self.budget:
+            return text
+        self.pruned += 1
+        for depth in range(_depth(view) - 1, 0, -1):
+            text = self._dumps(_prune(view, depth))
+            if self.counter.count(text) <= self.budget:
+                return text
+        # Even the top-level keys alone are over budget
+        return self.counter.truncate(text, self.budget)
+
+    @property
+    def full_tokens(self) -> int:
+        """Tokens of the indented full structure each prompt used to embed"""
+        if self._full_tokens is None:
+            self._full_tokens = self.counter.count(json.dumps(self.structure, indent=2))
+        return self._full_tokens
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.files * self.full_tokens - self.prompt_tokens
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": self.files,
+            "prompt_tokens": self.prompt_tokens,
+            "tokens_saved": self.tokens_saved,
+            "pruned_views": self.pruned,
+        }
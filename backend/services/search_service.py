@@ -0,0 +1,286 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models.blob import FileBlob, decode_content
+from models.project import Project, ProjectFile
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKEND = settings.SEARCH_BACKEND
+SEARCH_INDEX_FILE_CONTENTS = settings.SEARCH_INDEX_FILE_CONTENTS
+SEARCH_MAX_CONTENT_BYTES = settings.SEARCH_MAX_CONTENT_BYTES
+SEARCH_MAX_TERMS = 8
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return _TOKEN.findall(value.lower()) if value else []
+
+def parse_query(query: str) -> List[str]:
+    """Distinct query terms in order; every term is matched as a prefix"""
+    return list(dict.fromkeys(tokenize(query)))[:SEARCH_MAX_TERMS]
+
+class FTS5Backend:
+    """SQLite FTS5 virtual table ranked with BM25, name weighted above description and content"""
+
+    name = "fts5"
+
+    def upsert(self, conn: Connection, project_id: int, document: Dict[str, str]):
+        conn.execute(text("DELETE FROM project_search WHERE rowid = :id"), {"id": project_id})
+        conn.execute(
+            text("INSERT INTO project_search (rowid, name, description, content) "
+                 "VALUES (:id, :name, :description, :content)"),
+            dict(document, id=project_id)
+        )
+
+    def remove(self, conn: Connection, project_id: int):
+        conn.execute(text("DELETE FROM project_search WHERE rowid = :id"), {"id": project_id})
+
+    def search(self, conn: Connection, terms: List[str], limit: int, offset: int) -> List[Tuple[int, float]]:
+        match = " ".join(f'"{term}"*' for term in terms)
+        rows = conn.execute(
+            text("SELECT rowid, bm25(project_search, 3.0, 2.0, 1.0) AS rank FROM project_search "
+                 "WHERE project_search MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"),
+            {"match": match, "limit": limit, "offset": offset}
+        ).fetchall()
+        return [(row[0], -row[1]) for row in rows]
+
+    def clear(self, conn: Connection):
+        conn.execute(text("DELETE FROM project_search"))
+
+class FullTextBackend:
+    """MySQL InnoDB FULLTEXT index queried in boolean mode
+
+    Terms shorter than ``innodb_ft_min_token_size`` (3 by default) and
+    stopwords are not indexed by MySQL and never match.
+    """
+
+    name = "fulltext"
+
+    def upsert(self, conn: Connection, project_id: int, document: Dict[str, str]):
+        conn.execute(
+            text("REPLACE INTO project_search (project_id, name, description, content) "
+                 "VALUES (:id, :name, :description, :content)"),
+            dict(document, id=project_id)
+        )
+
+    def remove(self, conn: Connection, project_id: int):
+        conn.execute(text("DELETE FROM project_search WHERE project_id = :id"), {"id": project_id})
+
+    def search(self, conn: Connection, terms: List[str], limit: int, offset: int) -> List[Tuple[int, float]]:
+        against = " ".join(f"+{term}*" for term in terms)
+        rows = conn.execute(
+            text("SELECT project_id, MATCH (name, description, content) AGAINST (:q IN BOOLEAN MODE) AS score "
+                 "FROM project_search WHERE MATCH (name, description, content) AGAINST (:q IN BOOLEAN MODE) "
+                 "ORDER BY score DESC, project_id DESC LIMIT :limit OFFSET :offset"),
+            {"q": against, "limit": limit, "offset": offset}
+        ).fetchall()
+        return [(row[0], float(row[1])) for row in rows]
+
+    def clear(self, conn: Connection):
+        conn.execute(text("DELETE FROM project_search"))
+
+class InvertedIndexBackend:
+    """Per-process inverted index for databases without a usable full-text index
+
+    Built from the projects table on first search and updated in place
+    afterwards. Each worker holds its own copy, so changes made by other
+    workers are only seen after a rebuild.
+    """
+
+    name = "memory"
+
+    FIELD_WEIGHTS = {"name": 3.0, "description": 2.0, "content": 1.0}
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._documents: Dict[int, Dict[str, float]] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_stale = False
+
+    def upsert(self, conn: Connection, project_id: int, document: Dict[str, str]):
+        weights: Counter = Counter()
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for token in tokenize(document.get(field)):
+                weights[token] += weight
+        with self._lock:
+            self._remove(project_id)
+            for term, weight in weights.items():
+                postings = self._postings.setdefault(term, {})
+                if not postings:
+                    self._vocabulary_stale = True
+                postings[project_id] = 1 + math.log(weight)
+            self._documents[project_id] = dict(weights)
+
+    def remove(self, conn: Connection, project_id: int):
+        with self._lock:
+            self._remove(project_id)
+
+    def _remove(self, project_id: int):
+        for term in self._documents.pop(project_id, ()):
+            postings = self._postings[term]
+            del postings[project_id]
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_stale = True
+
+    def _expand(self, prefix: str) -> Iterable[str]:
+        if self._vocabulary_stale:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_stale = False
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            yield self._vocabulary[i]
+            i += 1
+
+    def search(self, conn: Connection, terms: List[str], limit: int, offset: int) -> List[Tuple[int, float]]:
+        if not self.ready:
+            SearchService.rebuild_index(conn, self)
+        with self._lock:
+            total = len(self._documents)
+            scores: Optional[Dict[int, float]] = None
+            for term in terms:
+                # TF-IDF of the best matching expansion, so a short prefix is not over-rewarded
+                term_scores: Dict[int, float] = {}
+                for expansion in self._expand(term):
+                    postings = self._postings[expansion]
+                    idf = math.log(1 + total / len(postings))
+                    for project_id, tf in postings.items():
+                        term_scores[project_id] = max(term_scores.get(project_id, 0.0), tf * idf)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+        ranked = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return ranked[offset:]
+
+    def clear(self, conn: Connection):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._vocabulary = []
+            self._vocabulary_stale = False
+
+# Engine URL -> backend, resolved once per database
+_backends: Dict[str, object] = {}
+_backends_lock = threading.Lock()
+
+class SearchService:
+    @staticmethod
+    def backend(conn: Connection):
+        # Sync and async engines of the same database share one backend
+        url = conn.engine.url
+        key = str(url.set(drivername=url.get_backend_name()))
+        backend = _backends.get(key)
+        if backend is None:
+            # Inspect outside the lock: under run_sync the inspection yields to the
+            # event loop, and a request waiting on a thread lock would stall it
+            selected = SearchService._select_backend(conn)
+            with _backends_lock:
+                backend = _backends.setdefault(key, selected)
+            if backend is selected:
+                logger.info("Project search uses the %s backend", backend.name)
+        return backend
+
+    @staticmethod
+    def _select_backend(conn: Connection):
+        dialect = conn.dialect.name
+        if SEARCH_BACKEND == 'auto' and dialect in ("sqlite", "mysql") and inspect(conn).has_table("project_search"):
+            return FTS5Backend() if dialect == "sqlite" else FullTextBackend()
+        return InvertedIndexBackend()
+
+    @staticmethod
+    def _file_contents(conn: Connection, project_id: int) -> str:
+        rows = conn.execute(
+            select(FileBlob.data, FileBlob.compression)
+            .join(ProjectFile, ProjectFile.blob_hash == FileBlob.hash)
+            .where(ProjectFile.project_id == project_id)
+            .order_by(ProjectFile.file_path)
+        ).fetchall()
+        parts, size = [], 0
+        for data, compression in rows:
+            content = decode_content(data, compression)
+            size += len(content)
+            if size > SEARCH_MAX_CONTENT_BYTES:
+                break
+            parts.append(content)
+        return "\n".join(parts)
+
+    @staticmethod
+    def index_project(conn: Connection, project_id: int,
+                      name: Optional[str] = None, description: Optional[str] = None, load: bool = True):
+        """(Re)index one project inside the caller's transaction
+
+        With ``load`` the name and description are read back from the
+        projects table instead of being taken from the arguments.
+        """
+        if load:
+            row = conn.execute(
+                select(Project.name, Project.description).where(Project.id == project_id)
+            ).first()
+            if row is None:
+                return
+            name, description = row
+        content = SearchService._file_contents(conn, project_id) if SEARCH_INDEX_FILE_CONTENTS else ""
+        SearchService.backend(conn).upsert(
+            conn, project_id, {"name": name or "", "description": description or "", "content": content}
+        )
+
+    @staticmethod
+    def remove_project(conn: Connection, project_id: int):
+        SearchService.backend(conn).remove(conn, project_id)
+
+    @staticmethod
+    def rebuild_index(conn: Connection, backend=None) -> int:
+        """Reindex every project from scratch"""
+        backend = backend or SearchService.backend(conn)
+        backend.clear(conn)
+        count = 0
+        for project_id, name, description in conn.execute(
+            select(Project.id, Project.name, Project.description)
+        ):
+            content = SearchService._file_contents(conn, project_id) if SEARCH_INDEX_FILE_CONTENTS else ""
+            backend.upsert(conn, project_id, {"name": name or "", "description": description or "", "content": content})
+            count += 1
+        if isinstance(backend, InvertedIndexBackend):
+            backend.ready = True
+        return count
+
+    @staticmethod
+    def search(db: Session, query: str, limit: int = 10, offset: int = 0) -> List[Tuple[int, float]]:
+        """Ids and scores of the best matching projects, best first"""
+        terms = parse_query(query)
+        if not terms:
+            return []
+        conn = db.connection()
+        return SearchService.backend(conn).search(conn, terms, limit, offset)
+
+# Keep the index in step with the projects table, inside the flushing transaction
+@event.listens_for(Project, "after_insert")
+def _index_inserted_project(mapper, connection, target):
+    SearchService.index_project(connection, target.id, target.name, target.description, load=False)
+
+@event.listens_for(Project, "after_update")
+def _index_updated_project(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.name.history.has_changes() or state.attrs.description.history.has_changes():
+        SearchService.index_project(connection, target.id, target.name, target.description, load=False)
+
+@event.listens_for(Project, "after_delete")
+def _unindex_deleted_project(mapper, connection, target):
+    SearchService.remove_project(connection, target.id)
@@ -1,9 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from models.project_share import ProjectShare, SharePermission
 from models.user import User
 from models.project import Project
+from services.db_service import DatabaseService, PROJECT_LIST_COLUMNS
 from fastapi import HTTPException
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class ShareService:
     @staticmethod
@@ -37,6 +38,7 @@ class ShareService:
         if existing_share:
             existing_share.permission = permission
             db.commit()
+            DatabaseService.invalidate_access(project_id, user_id)
             return existing_share
             
         # Create new share
@@ -47,6 +49,7 @@ class ShareService:
         )
         db.add(share)
         db.commit()
+        DatabaseService.invalidate_access(project_id, user_id)
         db.refresh(share)
         return share
     
@@ -72,6 +75,7 @@ class ShareService:
             
         db.delete(share)
         db.commit()
+        DatabaseService.invalidate_access(project_id, user_id)
         return True
     
     @staticmethod
@@ -87,7 +91,9 @@ class ShareService:
         if project.owner_id != current_user.id and current_user.role != "admin":
             raise HTTPException(status_code=403, detail="No permission to view share information")
             
-        return db.query(ProjectShare).filter(
+        return db.query(ProjectShare).options(
+            joinedload(ProjectShare.user)
+        ).filter(
             ProjectShare.project_id == project_id
         ).all()
     
@@ -96,7 +102,26 @@ class ShareService:
         db: Session,
         user_id: int
     ) -> List[Project]:
-        shares = db.query(ProjectShare).filter(
+        # Join through the shares instead of lazy loading one project per share
+        return db.query(Project).join(
+            ProjectShare, ProjectShare.project_id == Project.id
+        ).filter(
             ProjectShare.user_id == user_id
-        ).all()
-        return [share.project for share in shares] 
\ No newline at end of file
+        ).order_by(ProjectShare.created_at.desc()).all()
+    
+    @staticmethod
+    async def list_shared_projects(
+        db: Session,
+        user_id: int
+    ) -> List[Dict]:
+        """Listing rows of the projects shared with a user, with the granted permission"""
+        rows = db.query(
+            *PROJECT_LIST_COLUMNS,
+            ProjectShare.permission,
+            ProjectShare.created_at.label("shared_at")
+        ).join(
+            ProjectShare, ProjectShare.project_id == Project.id
+        ).filter(
+            ProjectShare.user_id == user_id
+        ).order_by(ProjectShare.created_at.desc()).all()
+        return [dict(row._mapping) for row in rows]
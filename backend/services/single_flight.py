@@ -0,0 +1,74 @@
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+
+    The first caller for a key starts the call; callers arriving while it
+    is in flight wait for the same result or exception. The key is dropped
+    as soon as the call finishes, so nothing is cached beyond its lifetime.
+    The call runs as its own task, so a caller that is cancelled, the one
+    that started it included, only stops waiting. Once no caller is left
+    the call is cancelled and its key dropped straight away, so a caller
+    arriving while it winds down starts a fresh call instead of sharing
+    the cancellation.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.originated = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.originated += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        self.max_waiters = max(self.max_waiters, flight.waiters)
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                self._drop(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _drop(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _forget(self, key: str, flight: _Flight):
+        self._drop(key, flight)
+        # Retrieve the exception so a call nobody awaits any more is not reported as unhandled
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        calls = self.originated + self.coalesced
+        return {
+            "originated": self.originated,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / calls if calls else 0.0,
+            "in_flight": self.in_flight,
+            "max_waiters": self.max_waiters,
+        }
@@ -0,0 +1,172 @@
+from datetime import datetime
+from typing import Dict, Optional, Union
+import asyncio
+import logging
+import time
+
+from sqlalchemy import event, func, inspect, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.project import Project, ProjectStat
+from utils.cache import TTLCache
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_TTL = settings.STATS_CACHE_TTL
+STATS_RECONCILE_INTERVAL = settings.STATS_RECONCILE_INTERVAL
+STATS_RECENT_LIMIT = 5
+
+_stats_cache = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL, name="project_stats")
+
+def _type_key(project_type: Optional[str]) -> str:
+    return project_type or ""
+
+def _bump(conn: Connection, project_type: Optional[str], delta: int):
+    """Add ``delta`` to one counter row, creating it on first use"""
+    table = ProjectStat.__table__
+    values = {"project_type": _type_key(project_type), "count": delta, "updated_at": datetime.utcnow()}
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(count=table.c.count + delta, updated_at=stmt.inserted.updated_at)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.project_type],
+            set_={"count": table.c.count + delta, "updated_at": stmt.excluded.updated_at}
+        )
+    else:
+        result = conn.execute(
+            update(table)
+            .where(table.c.project_type == values["project_type"])
+            .values(count=table.c.count + delta, updated_at=values["updated_at"])
+        )
+        if result.rowcount:
+            return
+        stmt = table.insert().values(**values)
+    conn.execute(stmt)
+
+class StatsService:
+    """Project statistics read from counters instead of scanning ``projects``
+
+    Counters move with every ORM insert, delete and project_type change
+    inside the same transaction. Bulk statements bypass the mapper events,
+    so ``reconcile`` periodically recounts from the projects table. Reads
+    are served from a cache at most ``STATS_CACHE_TTL`` seconds old.
+    """
+
+    @staticmethod
+    async def get_stats(db: Union[Session, AsyncSession], max_age: Optional[float] = None) -> Dict:
+        """Current stats, no older than ``max_age`` seconds (default ``STATS_CACHE_TTL``)"""
+        cached = _stats_cache.get("stats")
+        if cached is not None and (max_age is None or time.time() - cached["as_of"] <= max_age):
+            return cached
+        if isinstance(db, AsyncSession):
+            stats = await db.run_sync(StatsService.compute)
+        else:
+            stats = StatsService.compute(db)
+        _stats_cache.set("stats", stats)
+        return stats
+
+    @staticmethod
+    def compute(db: Session) -> Dict:
+        # One row per project type plus a LIMIT on the (created_at, id) index
+        counters = db.query(ProjectStat).all()
+        recent_projects = db.query(Project.id, Project.description, Project.created_at).order_by(
+            Project.created_at.desc(), Project.id.desc()
+        ).limit(STATS_RECENT_LIMIT).all()
+        by_type = {c.project_type or None: c.count for c in counters if c.count}
+        reconciled = [c.reconciled_at for c in counters if c.reconciled_at]
+        return {
+            "total_projects": sum(by_type.values()),
+            "projects_by_type": by_type,
+            "recent_projects": [
+                {
+                    "id": p.id,
+                    "description": p.description,
+                    "created_at": p.created_at
+                } for p in recent_projects
+            ],
+            "as_of": time.time(),
+            "reconciled_at": min(reconciled) if reconciled else None
+        }
+
+    @staticmethod
+    def reconcile(db: Session) -> Dict[str, int]:
+        """Recount projects per type and overwrite the counters, returning the corrections"""
+        try:
+            # Lock the counters first so increments committed meanwhile are not overwritten
+            counters = {
+                c.project_type: c
+                for c in db.query(ProjectStat).with_for_update().all()
+            }
+            actual = {
+                _type_key(project_type): count
+                for project_type, count in db.query(
+                    Project.project_type, func.count(Project.id)
+                ).group_by(Project.project_type).all()
+            }
+            now = datetime.utcnow()
+            corrections = {}
+            for project_type in set(counters) | set(actual):
+                count = actual.get(project_type, 0)
+                counter = counters.get(project_type)
+                if counter is None:
+                    counter = ProjectStat(project_type=project_type, count=0)
+                    db.add(counter)
+                if counter.count != count:
+                    corrections[project_type] = count - counter.count
+                counter.count = count
+                counter.reconciled_at = now
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if corrections:
+            logger.warning("Project stats drifted, corrected by %s", corrections)
+        StatsService.invalidate()
+        return corrections
+
+    @staticmethod
+    def invalidate():
+        _stats_cache.clear()
+
+    @staticmethod
+    async def run_reconciler(session_factory, interval: float = STATS_RECONCILE_INTERVAL):
+        """Reconcile every ``interval`` seconds, immediately if the counters were never filled"""
+        def reconcile_once(force: bool):
+            db = session_factory()
+            try:
+                if force or not db.query(ProjectStat).first():
+                    StatsService.reconcile(db)
+            finally:
+                db.close()
+
+        force = False
+        while True:
+            try:
+                await asyncio.to_thread(reconcile_once, force)
+            except Exception as e:
+                logger.error("Project stats reconciliation failed: %s", e)
+            force = True
+            await asyncio.sleep(interval)
+
+@event.listens_for(Project, "after_insert")
+def _count_inserted_project(mapper, connection, target):
+    _bump(connection, target.project_type, 1)
+
+@event.listens_for(Project, "after_delete")
+def _count_deleted_project(mapper, connection, target):
+    _bump(connection, target.project_type, -1)
+
+@event.listens_for(Project, "after_update")
+def _count_retyped_project(mapper, connection, target):
+    history = inspect(target).attrs.project_type.history
+    if history.has_changes():
+        for old_type in history.deleted:
+            _bump(connection, old_type, -1)
+        _bump(connection, target.project_type, 1)
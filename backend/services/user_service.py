@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User, UserRole
 from .auth_service import AuthService
 from fastapi import HTTPException
@@ -7,21 +8,21 @@ from typing import Optional
 class UserService:
     @staticmethod
     async def create_user(
-        db: Session,
+        db: AsyncSession,
         email: str,
         username: str,
         password: str,
         role: UserRole = UserRole.USER
     ) -> User:
         # Check if email already exists
-        if db.query(User).filter(User.email == email).first():
+        if await db.scalar(select(User.id).where(User.email == email)):
             raise HTTPException(status_code=400, detail="Email already registered")
             
         # Check if username already exists
-        if db.query(User).filter(User.username == username).first():
+        if await db.scalar(select(User.id).where(User.username == username)):
             raise HTTPException(status_code=400, detail="Username already taken")
             
-        hashed_password = AuthService.get_password_hash(password)
+        hashed_password = await AuthService.get_password_hash_async(password)
         user = User(
             email=email,
             username=username,
@@ -30,19 +31,19 @@ class UserService:
         )
         
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         return user
     
     @staticmethod
     async def authenticate_user(
-        db: Session,
+        db: AsyncSession,
         email: str,
         password: str
     ) -> Optional[User]:
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.execute(select(User).where(User.email == email))).scalars().first()
         if not user:
             return None
-        if not AuthService.verify_password(password, user.hashed_password):
+        if not await AuthService.verify_password_async(password, user.hashed_password):
             return None
         return user 
\ No newline at end of file
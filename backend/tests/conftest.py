@@ -1,16 +1,23 @@
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from models.database import Base
+from sqlalchemy.pool import NullPool
+from models.database import Base, create_async_db_engine, create_db_engine
 from main import app, get_db
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# No pooling: each test drives its async sessions from a fresh event loop
+async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 @pytest.fixture
 def test_db():
@@ -20,13 +27,59 @@ def test_db():
 
 @pytest.fixture
 def client(test_db):
-    def override_get_db():
-        try:
-            db = TestingSessionLocal()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
             yield db
-        finally:
-            db.close()
 
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
-    app.dependency_overrides.clear() 
\ No newline at end of file
+    app.dependency_overrides.clear() 
+
+@pytest.fixture
+def async_session_factory(test_db):
+    return TestingAsyncSessionLocal
+
+@pytest.fixture
+def db_session(test_db):
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+class QueryCounter:
+    """Records every SQL statement sent through ``engine`` while active"""
+
+    def __init__(self, bind):
+        self.bind = bind
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.bind, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.bind, "before_cursor_execute", self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+@pytest.fixture
+def assert_max_queries():
+    """Fail when the block issues more than ``limit`` statements, e.g. an N+1 lazy load
+
+        with assert_max_queries(2):
+            ...
+    """
+    @contextmanager
+    def check(limit: int):
+        with QueryCounter(engine) as counter:
+            yield counter
+        assert counter.count <= limit, (
+            f"Expected at most {limit} queries, got {counter.count}:\n" + "\n".join(counter.statements)
+        )
+    return check
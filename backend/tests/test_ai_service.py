@@ -0,0 +1,476 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+
+from config import settings
+from services.ai_service import AICodeGenerator
+from services.llm_cache import LLMResponseCache
+from services.llm_latency import HedgePolicy, LatencyHistogram
+from services.llm_providers import FakeProvider, LLMProvider
+from services.prompt_builder import StructurePrompts
+from services.single_flight import SingleFlight
+
+FILE_LATENCY = 0.2
+
+
+class SlowProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, fail_paths=()):
+        self.fail_paths = fail_paths
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, model, messages, temperature, max_tokens):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(FILE_LATENCY)
+            prompt = messages[-1]["content"]
+            if any(path in prompt for path in self.fail_paths):
+                raise RuntimeError("upstream error")
+            return f"# generated by {model}"
+        finally:
+            self.in_flight -= 1
+
+    async def stream(self, model, messages, temperature, max_tokens):
+        for token in ("# generated", " code"):
+            await asyncio.sleep(FILE_LATENCY / 2)
+            yield token
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(settings, "DEFAULT_LLM_MODEL", "gpt-4-turbo-preview")
+    monkeypatch.setattr(settings, "OPENAI_MAX_CONCURRENCY", 8)
+    return AICodeGenerator()
+
+
+def use_provider(generator, provider):
+    generator.providers.providers["openai"] = provider
+
+
+def test_generate_code_concurrent(generator):
+    """Test that per-file completions run in parallel"""
+    provider = SlowProvider()
+    use_provider(generator, provider)
+    structure = {"frontend": {}, "backend": {}}
+
+    start = time.perf_counter()
+    files = asyncio.run(generator.generate_code(structure))
+    elapsed = time.perf_counter() - start
+
+    assert len(files) == 8
+    assert provider.max_in_flight == 8
+    assert elapsed < FILE_LATENCY * 3
+
+
+def test_generate_code_respects_concurrency_limit(generator):
+    """Test that in-flight completions never exceed the provider limit"""
+    generator.max_concurrency["openai"] = 2
+    provider = SlowProvider()
+    use_provider(generator, provider)
+
+    files = asyncio.run(generator.generate_code({"frontend": {}, "backend": {}}))
+
+    assert len(files) == 8
+    assert provider.max_in_flight == 2
+
+
+def test_generate_files_reports_partial_results(generator):
+    """Test that failed and timed out files are reported without losing the rest"""
+    generator.file_timeout = FILE_LATENCY / 2
+    use_provider(generator, SlowProvider())
+
+    result = asyncio.run(generator.generate_files({"frontend": {}}))
+
+    assert result.files == {}
+    assert len(result.errors) == 4
+    assert all("Timed out" in error for error in result.errors.values())
+
+    generator.file_timeout = 10
+    use_provider(generator, SlowProvider(fail_paths=["backend/main.py"]))
+
+    result = asyncio.run(generator.generate_files({"frontend": {}, "backend": {}}))
+
+    assert result.is_partial
+    assert list(result.errors) == ["backend/main.py"]
+    assert len(result.files) == 7
+
+
+def test_stream_code_relays_tokens_per_file(generator):
+    """Test that streamed tokens arrive before the files complete"""
+    use_provider(generator, SlowProvider())
+
+    async def collect():
+        start = time.perf_counter()
+        events = []
+        first_delta = None
+        async for event in generator.stream_code({"frontend": {}}):
+            if event["event"] == "delta" and first_delta is None:
+                first_delta = time.perf_counter() - start
+            events.append(event)
+        return events, first_delta
+
+    events, first_delta = asyncio.run(collect())
+
+    assert first_delta < FILE_LATENCY
+    done = dict(events[-1])
+    assert done.pop("prompt_tokens") > 0 and done.pop("tokens_saved") > 0
+    assert done == {"event": "done", "files": 4, "errors": 0}
+    contents = {}
+    for event in events:
+        if event["event"] == "delta":
+            contents[event["path"]] = contents.get(event["path"], "") + event["content"]
+    assert contents["frontend/src/utils/api.ts"] == "# generated code"
+    assert sum(event["event"] == "file_end" for event in events) == 4
+
+
+def test_stream_code_times_out_the_provider_not_the_queue(generator):
+    """Test that files waiting for the semaphore or a slow client do not time out, but a slow provider does"""
+    use_provider(generator, SlowProvider())
+    generator.max_concurrency["openai"] = 1
+    generator.stream_buffer = 1
+    generator.file_timeout = FILE_LATENCY * 1.5
+
+    async def collect(delay):
+        events = []
+        async for event in generator.stream_code({"frontend": {}}):
+            await asyncio.sleep(delay)
+            events.append(event)
+        return events
+
+    async def scenario():
+        # Four files run one at a time behind a slow client, well past file_timeout in total
+        patient = await collect(FILE_LATENCY / 4)
+        generator.file_timeout = FILE_LATENCY / 4
+        return patient, await collect(0)
+
+    patient, hasty = asyncio.run(scenario())
+    assert patient[-1]["errors"] == 0
+    assert [e["detail"] for e in hasty if e["event"] == "error"] == [f"Timed out after {FILE_LATENCY / 4}s"] * 4
+
+
+def test_repeated_requests_served_from_cache(generator):
+    """Test that identical low-temperature requests skip the upstream call once opted in"""
+    provider = SlowProvider()
+    use_provider(generator, provider)
+    generator.cache.max_temperature = 0.3
+
+    first = asyncio.run(generator.optimize_code("print(1)", "python"))
+    second = asyncio.run(generator.optimize_code("print(1)", "python"))
+    asyncio.run(generator.optimize_code("print(2)", "python"))
+
+    assert first == second
+    assert provider.calls == 2
+    assert generator.cache.stats["hits"] == 1
+    assert generator.cache.stats["misses"] == 2
+
+
+def test_identical_in_flight_requests_share_one_call(generator):
+    """Test that concurrent identical completions are coalesced, cacheable or not"""
+    provider = SlowProvider()
+    use_provider(generator, provider)
+    messages = [{"role": "user", "content": "todo app"}]
+
+    async def burst():
+        return await asyncio.gather(
+            *[generator._complete("gpt-4-turbo-preview", messages, 1.0, 100) for _ in range(5)],
+            generator._complete("gpt-4-turbo-preview", messages, 1.0, 200)
+        )
+
+    results = asyncio.run(burst())
+
+    assert len(set(results)) == 1
+    assert provider.calls == 2
+    assert generator.single_flight.stats == {
+        "originated": 2, "coalesced": 4, "coalesced_ratio": 4 / 6, "in_flight": 0, "max_waiters": 5
+    }
+    assert generator.cache.stats["misses"] == 0
+
+
+def test_single_flight_shares_errors_and_survives_waiter_cancellation():
+    """Test that a failure reaches every waiter and only the last waiter leaving cancels the call"""
+    flight = SingleFlight()
+    started = []
+
+    async def failing():
+        await asyncio.sleep(FILE_LATENCY)
+        raise RuntimeError("upstream error")
+
+    async def slow():
+        started.append(1)
+        await asyncio.sleep(FILE_LATENCY)
+        return "done"
+
+    async def scenario():
+        outcomes = await asyncio.gather(*[flight.do("a", failing) for _ in range(3)], return_exceptions=True)
+        assert [str(o) for o in outcomes] == ["upstream error"] * 3
+
+        first = asyncio.create_task(flight.do("b", slow))
+        second = asyncio.create_task(flight.do("b", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+
+        lonely = asyncio.create_task(flight.do("c", slow))
+        await asyncio.sleep(0)
+        inner = flight._flights["c"].task
+        lonely.cancel()
+        await asyncio.gather(lonely, return_exceptions=True)
+        await asyncio.sleep(0)
+        return inner
+
+    inner = asyncio.run(scenario())
+    assert inner.cancelled()
+    assert started == [1, 1]
+    assert flight.in_flight == 0
+    assert (flight.originated, flight.coalesced) == (3, 3)
+
+
+def test_single_flight_outlives_its_cancelled_leader():
+    """Test that followers still get the result when the caller that started the call is cancelled"""
+    flight = SingleFlight()
+    started = []
+
+    async def slow():
+        started.append(1)
+        await asyncio.sleep(FILE_LATENCY)
+        return len(started)
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do("a", slow))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.do("a", slow)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        assert await asyncio.gather(*followers) == [1, 1, 1]
+
+        # Nobody is left waiting: a caller arriving while the call winds down starts afresh
+        lonely = asyncio.create_task(flight.do("b", slow))
+        await asyncio.sleep(0)
+        lonely.cancel()
+        late = asyncio.create_task(flight.do("b", slow))
+        await asyncio.gather(lonely, return_exceptions=True)
+        return await late
+
+    assert asyncio.run(scenario()) == 3
+    assert started == [1, 1, 1]
+    assert flight.in_flight == 0
+
+
+def test_structure_prompts_keep_relevant_sections_within_budget():
+    """Test that per-file prompts drop the other side's section, use compact JSON and fit the budget"""
+    structure = {
+        "architecture": "spa + rest api",
+        "frontend": {"pages": [{"name": f"page{i}", "components": ["Header", "List"]} for i in range(40)]},
+        "backend": {"models": [{"name": f"Model{i}", "fields": ["id", "name"]} for i in range(40)]},
+    }
+    prompts = StructurePrompts(structure, budget=100000)
+
+    frontend = json.loads(prompts.for_file("frontend/src/pages/index.tsx"))
+    backend_text = prompts.for_file("backend/main.py")
+    assert set(frontend) == {"architecture", "frontend"}
+    assert set(json.loads(backend_text)) == {"architecture", "backend"}
+    assert ": " not in backend_text and "\n" not in backend_text
+    assert prompts.stats["files"] == 2
+    assert prompts.tokens_saved > prompts.prompt_tokens
+
+    tight = StructurePrompts(structure, budget=60)
+    text = tight.for_file("backend/main.py")
+    assert tight.counter.count(text) <= 60
+    assert json.loads(text)["architecture"] == "spa + rest api"
+    assert tight.stats["pruned_views"] == 1
+    assert tight.counter.count(StructurePrompts(structure, budget=5).for_file("backend/main.py")) <= 5
+
+
+def test_plan_regeneration_follows_prompt_sections(generator):
+    """Test that only files whose prompt sections changed are regenerated"""
+    previous = {"architecture": "spa", "frontend": {"framework": "next.js"}, "backend": {"db": "sqlite"}}
+    frontend = [path for path in generator._get_file_paths(previous) if path.startswith("frontend/")]
+    backend = [path for path in generator._get_file_paths(previous) if path.startswith("backend/")]
+    stored = frontend + backend
+
+    assert generator.plan_regeneration(previous, previous, stored) == ([], stored)
+    assert generator.plan_regeneration(previous, dict(previous, backend={"db": "mysql"}), stored) == (backend, frontend)
+    # Shared sections reach every prompt
+    assert generator.plan_regeneration(previous, dict(previous, architecture="ssr"), stored) == (stored, [])
+    assert generator.plan_regeneration(previous, previous, frontend) == (backend, frontend)
+    assert generator.plan_regeneration(None, previous, stored) == (stored, [])
+
+
+def test_generate_files_reports_prompt_tokens(generator):
+    """Test that a generation reports the structure tokens it sent and saved"""
+    provider = SlowProvider()
+    use_provider(generator, provider)
+
+    result = asyncio.run(generator.generate_files({"frontend": {"pages": ["index"]}, "backend": {}}))
+
+    assert result.prompt_stats["files"] == 8
+    assert result.prompt_stats["tokens_saved"] > 0
+
+
+def test_cache_tiers(tmp_path):
+    """Test byte-bounded eviction, expiry and the persistent tier"""
+    path = str(tmp_path / "llm_cache.db")
+    cache = LLMResponseCache(max_bytes=200, ttl=60, path=path)
+    messages = [{"role": "user", "content": "hi"}]
+    key = LLMResponseCache.make_key("gpt-4", messages, 0.3, 100)
+
+    assert key == LLMResponseCache.make_key("gpt-4", messages, 0.3, 100)
+    assert key != LLMResponseCache.make_key("gpt-4", messages, 0.3, 200)
+    assert not cache.is_cacheable(0.3)
+    assert cache.is_cacheable(0)
+
+    asyncio.run(cache.set(key, "a" * 100))
+    asyncio.run(cache.set("other", "b" * 100))
+    assert cache.memory.evictions == 1
+    assert cache.memory.size <= 200
+
+    restarted = LLMResponseCache(max_bytes=200, ttl=60, path=path)
+    assert asyncio.run(restarted.get(key)) == "a" * 100
+    assert restarted.stats["disk_hits"] == 1
+
+    def locked(key):
+        raise sqlite3.OperationalError("database is locked")
+
+    restarted.memory.clear()
+    restarted.disk.get = locked
+    assert asyncio.run(restarted.get(key)) is None
+    assert restarted.stats["misses"] == 1
+
+    expired = LLMResponseCache(ttl=-1)
+    asyncio.run(expired.set(key, "value"))
+    assert asyncio.run(expired.get(key)) is None
+
+
+def test_fake_provider_routing(generator):
+    """Test that fake-prefixed models run offline through the fake provider"""
+    fake = FakeProvider(latency=0, tokens_per_second=10000)
+    generator.providers.providers["fake"] = fake
+
+    structure = asyncio.run(generator.analyze_requirements("todo app", model="fake-model"))
+
+    assert set(structure) == {"frontend", "backend"}
+    assert fake.calls == 1
+    assert generator.providers.provider_name("deepseek-coder-33b-instruct") == "deepseek"
+    assert generator.providers.provider_name("gpt-4-turbo-preview") == "openai"
+
+
+def hedged_generator(generator, primary, backup, **policy):
+    generator.providers.providers.update(openai=primary, deepseek=backup)
+    generator.hedging = HedgePolicy(
+        {"openai": "gpt-4-turbo-preview", "deepseek": "deepseek-chat"}, enabled=True, **policy
+    )
+    return generator
+
+
+def test_incomplete_provider_fails_on_instantiation():
+    """Test that a provider missing part of the interface cannot be constructed"""
+    class CompleteOnly(LLMProvider):
+        async def complete(self, model, messages, temperature, max_tokens):
+            return ""
+
+    with pytest.raises(TypeError):
+        CompleteOnly()
+
+
+def test_hedged_request_takes_first_valid_response(generator):
+    """Test that a slow or invalid primary response is raced by the other provider"""
+    structure = json.dumps({"backend": {"framework": "fastapi"}})
+    slow = FakeProvider(latency=5, responder=lambda model, messages: structure)
+    fast = FakeProvider(latency=0.05, responder=lambda model, messages: structure)
+    hedged_generator(generator, slow, fast, default_delay=0.1)
+
+    start = time.perf_counter()
+    assert asyncio.run(generator.analyze_requirements("todo app")) == json.loads(structure)
+    assert time.perf_counter() - start < 1
+    assert generator.hedging.stats["backup_wins"] == 1
+    # The cancelled primary is recorded as running for at least the hedge delay
+    primary = generator.hedging.histogram("openai")
+    assert (primary.count, primary.censored) == (1, 1)
+    assert primary.quantile(0.5) >= 0.1
+
+    # Invalid JSON from the primary starts the backup without waiting for the delay
+    invalid = FakeProvider(latency=0, responder=lambda model, messages: "not json")
+    hedged_generator(generator, invalid, fast, default_delay=5)
+    start = time.perf_counter()
+    assert asyncio.run(generator.analyze_requirements("chat app")) == json.loads(structure)
+    assert time.perf_counter() - start < 1
+    assert generator.hedging.histogram("openai").errors == 1
+    assert (invalid.calls, generator.hedging.backup_wins) == (1, 1)
+
+    # A quick primary never fires the backup
+    quick = FakeProvider(latency=0, responder=lambda model, messages: structure)
+    hedged_generator(generator, quick, fast, default_delay=5)
+    fast.calls = 0
+    asyncio.run(generator.analyze_requirements("blog"))
+    assert (fast.calls, generator.hedging.hedged) == (0, 0)
+
+
+def test_timed_out_request_is_recorded_as_censored(generator):
+    """Test that a timed out call counts as lasting at least its timeout, not as an error"""
+    slow = FakeProvider(latency=5, responder=lambda model, messages: "{}")
+    hedged_generator(generator, slow, slow)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(generator._attempt(
+            "openai", "gpt-4-turbo-preview", [], temperature=0, max_tokens=10, timeout=0.1, validate=None
+        ))
+    histogram = generator.hedging.histogram("openai")
+    assert (histogram.count, histogram.censored, histogram.errors) == (1, 1, 0)
+    assert histogram.quantile(0.5) >= 0.1
+
+
+def test_hedge_delay_follows_provider_latency():
+    """Test that the hedge delay tracks the recent latency quantile within its bounds"""
+    policy = HedgePolicy({"openai": "gpt-4", "deepseek": "deepseek-chat"}, enabled=True,
+                         default_delay=10, min_delay=0.5, max_delay=20, min_samples=20, window=100)
+    assert policy.delay("openai") == 10
+    for _ in range(95):
+        policy.observe("openai", 1.5)
+    for _ in range(4):
+        policy.observe("openai", 6)
+    assert 1 < policy.delay("openai") <= 2
+
+    # Once the provider slows down the halved old samples stop dominating
+    for _ in range(200):
+        policy.observe("openai", 6)
+    assert 4 < policy.delay("openai") <= 8
+    assert policy.backup_for("openai", ["openai", "deepseek"]) == "deepseek"
+    assert policy.backup_for("openai", ["openai"]) is None
+    assert policy.backup_for("fake", ["openai", "deepseek", "fake"]) is None
+
+
+def test_hedge_delay_is_stable_when_slow_calls_lose_the_race():
+    """Test that cancelled slow calls keep the delay near the true quantile of a bimodal provider"""
+    policy = HedgePolicy({"openai": "gpt-4", "deepseek": "deepseek-chat"}, enabled=True,
+                         quantile=0.95, default_delay=2, min_delay=0.25, max_delay=20,
+                         min_samples=20, window=200)
+    backup_latency = 0.1
+    delays = []
+    for i in range(1000):
+        # One call in ten takes 3s, the rest 0.1s
+        latency = 3.0 if i % 10 == 0 else 0.1
+        delay = policy.delay("openai")
+        delays.append(delay)
+        if latency <= delay + backup_latency:
+            policy.observe("openai", latency)
+        else:
+            # The backup won; the primary was cancelled while still running
+            policy.observe("openai", delay + backup_latency, censored=True)
+    # Left out, the slow calls would pull the delay down to min_delay
+    assert all(2 <= delay <= 4 for delay in delays[-500:])
+
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.95) is None
+    histogram.observe(500)
+    assert histogram.quantile(0.5) > 120
@@ -1,11 +1,61 @@
-def test_generate_project():
-    """Test project generation"""
+from services.auth_service import AuthService
+
+
+def test_generate_project(client):
+    """Test that generation is queued as a job that can be polled and cancelled"""
+    user = client.post("/api/auth/register", json={
+        "email": "jobs@example.com", "username": "jobs", "password": "secret"}).json()
+    token = client.post("/api/auth/token", json={
+        "username": "jobs@example.com", "password": "secret"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
     response = client.post(
         "/api/generate",
         json={
-            "description": "Create a todo app",
-            "project_type": "web"
-        }
+            "prompt": "Create a todo app",
+            "project_type": "web",
+            "priority": 3
+        },
+        headers=headers
     )
+    assert response.status_code == 202
+    job = response.json()
+    assert (job["status"], job["priority"], job["project_id"]) == ("queued", 3, None)
+
+    assert client.get(f"/api/generate/jobs/{job['id']}", headers=headers).json()["status"] == "queued"
+    assert client.delete(f"/api/generate/jobs/{job['id']}", headers=headers).json()["status"] == "cancelled"
+    assert client.delete(f"/api/generate/jobs/{job['id']}", headers=headers).status_code == 409
+    assert client.get("/api/generate/jobs/999", headers=headers).status_code == 404
+
+    project = client.post("/api/projects", json={"name": "todo", "description": "todo list"}, headers=headers).json()
+    response = client.post(f"/api/projects/{project['id']}/regenerate",
+                           json={"project_structure": {"backend": {}}}, headers=headers)
+    assert response.status_code == 202
+    assert (response.json()["status"], response.json()["project_id"]) == ("queued", project["id"])
+    assert client.post("/api/projects/999/regenerate",
+                       json={"project_structure": {}}, headers=headers).status_code == 404
+    AuthService.invalidate_user(user["id"])
+
+
+def test_project_endpoints_on_async_session(client):
+    """Test the register, login and project routes end to end over AsyncSession"""
+    response = client.post("/api/auth/register", json={
+        "email": "async@example.com", "username": "async", "password": "secret"})
     assert response.status_code == 200
-    assert response.json()["message"] == "Project generated successfully"
+    token = client.post("/api/auth/token", json={
+        "username": "async@example.com", "password": "secret"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    created = [
+        client.post("/api/projects", json={"name": f"todo {i}", "description": "todo list"},
+                    headers=headers).json()
+        for i in range(3)
+    ]
+    assert client.get(f"/api/projects/{created[0]['id']}", headers=headers).json()["name"] == "todo 0"
+
+    first_page = client.get("/api/projects?limit=2")
+    second_page = client.get(f"/api/projects?limit=2&cursor={first_page.headers['x-next-cursor']}")
+    assert [p["id"] for p in first_page.json() + second_page.json()] == [p["id"] for p in reversed(created)]
+    assert len(client.get("/api/projects/search?q=tod").json()) == 3
+    assert client.get("/api/projects/stats?max_age=0", headers=headers).json()["total_projects"] == 3
+    AuthService.invalidate_user(response.json()["id"])
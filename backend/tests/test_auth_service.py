@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from models.user import User, UserRole
+from services.auth_service import AuthService
+from services.password_hasher import PasswordHasher
+
+
+@pytest.fixture
+def user(db_session):
+    user = User(email="user@example.com", username="user", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    user_id = user.id
+    yield user
+    AuthService.invalidate_user(user_id)
+
+
+def test_get_current_user_is_cached(db_session, user, async_session_factory):
+    """Test that repeat calls with a verified token skip the user lookup"""
+    token = AuthService.create_access_token({"sub": str(user.id)})
+
+    async def scenario():
+        async with async_session_factory() as db:
+            user_id = (await AuthService.get_current_user(token, db)).id
+
+        # Bypass the ORM so no invalidation hook fires
+        db_session.execute(User.__table__.update().values(username="renamed"))
+        db_session.commit()
+        async with async_session_factory() as db:
+            cached = await AuthService.get_current_user(token, db)
+            return user_id, cached
+
+    user_id, cached = asyncio.run(scenario())
+
+    assert cached.id == user_id
+    assert cached.username == "user"
+
+
+def test_deactivation_invalidates_cached_token(db_session, user, async_session_factory):
+    """Test that deactivating a user or changing their role evicts their tokens"""
+    token = AuthService.create_access_token({"sub": str(user.id)})
+
+    async def current_user():
+        async with async_session_factory() as db:
+            return await AuthService.get_current_user(token, db)
+
+    asyncio.run(current_user())
+
+    user.role = UserRole.ADMIN
+    db_session.commit()
+    assert asyncio.run(current_user()).role == UserRole.ADMIN
+
+    user.is_active = False
+    db_session.commit()
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(current_user())
+    assert exc_info.value.status_code == 401
+
+
+class SlowContext:
+    def hash(self, password):
+        time.sleep(0.2)
+        return "hashed:" + password
+
+    def verify(self, password, hashed):
+        time.sleep(0.2)
+        return hashed == "hashed:" + password
+
+
+def test_password_hasher_keeps_event_loop_responsive():
+    """Test that hashing runs off the loop and excess requests are rejected"""
+    hasher = PasswordHasher(SlowContext(), max_workers=2, max_queue=1)
+
+    async def scenario():
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(hasher.hash(f"pw{i}")) for i in range(4)]
+        await asyncio.sleep(0.01)
+        loop_lag = time.perf_counter() - start
+        return loop_lag, await asyncio.gather(*tasks, return_exceptions=True)
+
+    loop_lag, results = asyncio.run(scenario())
+
+    assert loop_lag < 0.1
+    assert results[:3] == ["hashed:pw0", "hashed:pw1", "hashed:pw2"]
+    assert isinstance(results[3], HTTPException) and results[3].status_code == 503
+    assert hasher.stats["completed"] == 3
+    assert hasher.stats["rejected"] == 1
+    hasher.shutdown()
+
+
+def test_cancelled_hash_keeps_its_slot_until_it_finishes():
+    """Test that a client disconnect does not free capacity still used by its hash"""
+    hasher = PasswordHasher(SlowContext(), max_workers=1, max_queue=0)
+
+    async def scenario():
+        task = asyncio.create_task(hasher.hash("pw0"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        with pytest.raises(HTTPException):
+            await hasher.hash("pw1")
+        await asyncio.sleep(0.3)
+        return await hasher.hash("pw2")
+
+    assert asyncio.run(scenario()) == "hashed:pw2"
+    assert hasher.stats["rejected"] == 1
+    hasher.shutdown()
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+from config import Settings
+
+ENV_EXAMPLE = Path(__file__).resolve().parent.parent / ".env.example"
+
+
+def test_env_example_loads():
+    """Test that copying the example to .env loads, one key per line"""
+    settings = Settings(_env_file=ENV_EXAMPLE)
+    assert settings.DEBUG is True
+    assert settings.OPENAI_MAX_CONCURRENCY == 4
+    assert settings.DEEPSEEK_MAX_CONCURRENCY == 4
+    assert settings.LLM_FILE_TIMEOUT == 120
+
+
+def test_env_example_keys_are_declared_settings():
+    """Test that every documented key is a typed Settings field rather than silently ignored"""
+    assert set(dotenv_values(ENV_EXAMPLE)) - set(Settings.__fields__) == set()
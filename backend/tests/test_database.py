@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from models.database import _check_pool_budget, create_db_engine, pool_stats
+from utils.db_pool import MeteredQueuePool, recommended_pool_size
+
+
+def test_metered_pool_counts_checkouts_overflow_and_timeouts(tmp_path):
+    """Test that pool metrics record checkouts, overflow use and exhaustion"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=MeteredQueuePool,
+        pool_size=1, max_overflow=1, pool_timeout=0.05
+    )
+    engine.pool.metrics.listen(engine)
+    first, second = engine.connect(), engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    first.close()
+    second.close()
+    engine.dispose()
+    engine.connect().close()
+
+    stats = pool_stats(engine)
+    assert stats["checkouts"] == 3
+    assert stats["overflow_checkouts"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["connects"] == 3
+    assert stats["max_wait_seconds"] >= 0.05
+    assert sum(stats["wait_buckets"].values()) == 3
+
+
+def test_engine_factory_and_pool_budget():
+    """Test that SQLite engines skip pool sizing and the per-worker budget leaves headroom"""
+    engine = create_db_engine("sqlite://")
+    assert not isinstance(engine.pool, MeteredQueuePool)
+    assert recommended_pool_size(workers=4, max_connections=151) == 30
+    assert recommended_pool_size(workers=500, max_connections=151) == 1
+
+
+def test_pool_budget_counts_every_pool_of_a_worker(caplog):
+    """Test that the sync and async pools of a worker are checked against one budget"""
+    sync = create_engine("sqlite://", poolclass=QueuePool, pool_size=20, max_overflow=10)
+    async_ = create_async_engine("sqlite+aiosqlite://", poolclass=AsyncAdaptedQueuePool,
+                                 pool_size=20, max_overflow=10)
+    # 4 workers get 30 connections each out of 151; one 30-connection pool fits, two do not
+    assert _check_pool_budget(sync, workers=4) == 30
+    assert not caplog.records
+    assert _check_pool_budget(sync, async_, workers=4) == 60
+    assert "may exceed DB_MAX_CONNECTIONS" in caplog.text
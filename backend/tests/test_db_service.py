@@ -0,0 +1,308 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+
+from models.blob import BlobDiff, FileBlob
+from models.collaboration import VersionFile
+from models.project import Project, ProjectFile
+from models.project_share import SharePermission
+from models.user import User, UserRole
+from services import search_service
+from services.async_db_service import AsyncDatabaseService
+from services.collaboration_service import CollaborationService
+from services.db_service import DatabaseService
+from services.search_service import InvertedIndexBackend
+from services.share_service import ShareService
+from services.stats_service import StatsService
+from utils.pagination import apply_keyset
+
+
+def create_owner(db):
+    owner = User(email="owner@example.com", username="owner", hashed_password="x")
+    db.add(owner)
+    db.commit()
+    return owner
+
+
+def test_create_project_bulk_inserts_files(db_session):
+    """Test that generated files are stored with the project"""
+    owner = create_owner(db_session)
+    files = {"frontend/src/pages/index.tsx": "page", "backend/main.py": "app"}
+
+    project = asyncio.run(DatabaseService.create_project(
+        db_session, "todo app", "web", {}, files, owner.id))
+
+    stored = {f.file_path: (f.content, f.file_type) for f in project.files}
+    assert stored == {
+        "frontend/src/pages/index.tsx": ("page", "frontend"),
+        "backend/main.py": ("app", "backend"),
+    }
+
+
+def test_save_project_files_only_rewrites_changes(db_session):
+    """Test that saving files inserts, updates and deletes only what changed"""
+    owner = create_owner(db_session)
+    project = asyncio.run(DatabaseService.create_project(
+        db_session, "todo app", "web", {}, {"a.py": "a", "b.py": "b", "c.py": "c"}, owner.id))
+    unchanged_id = db_session.query(ProjectFile.id).filter(ProjectFile.file_path == "a.py").scalar()
+
+    summary = asyncio.run(DatabaseService.save_project_files(
+        db_session, project.id, {"a.py": "a", "b.py": "b2", "d.py": "d"}))
+
+    assert summary == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    db_session.expire_all()
+    stored = db_session.query(ProjectFile).filter(ProjectFile.project_id == project.id).all()
+    assert {f.file_path: f.content for f in stored} == {"a.py": "a", "b.py": "b2", "d.py": "d"}
+    assert unchanged_id in {f.id for f in stored}
+
+
+def test_identical_content_is_stored_once(db_session):
+    """Test that projects and versions share blobs for identical file content"""
+    owner = create_owner(db_session)
+    files = {f"backend/module_{i}.py": "x = 1\n" * 100 for i in range(20)}
+    files["backend/main.py"] = "app = FastAPI()"
+
+    project = asyncio.run(DatabaseService.create_project(
+        db_session, "todo app", "web", {}, files, owner.id))
+    version = asyncio.run(CollaborationService.create_version(
+        db_session, project.id, "1.0.0", "initial", owner.id, files))
+
+    assert db_session.query(FileBlob).count() == 2
+    assert db_session.query(VersionFile).filter(VersionFile.version_id == version.id).count() == 21
+    assert {f.file_path: f.content for f in version.files} == files
+
+
+def test_delta_versions_and_diffs(db_session):
+    """Test that delta versions store only changes and diffs come from them"""
+    owner = create_owner(db_session)
+    base = {f"backend/module_{i}.py": f"value = {i}\n" for i in range(50)}
+    project = asyncio.run(DatabaseService.create_project(
+        db_session, "todo app", "web", {}, base, owner.id))
+
+    v1 = asyncio.run(CollaborationService.create_version(
+        db_session, project.id, "1.0.0", "initial", owner.id, base))
+    changed = dict(base)
+    changed["backend/module_3.py"] = "value = 300\n"
+    changed["backend/new.py"] = "new = True\n"
+    del changed["backend/module_7.py"]
+    v2 = asyncio.run(CollaborationService.create_version(
+        db_session, project.id, "1.1.0", "tweak", owner.id, changed))
+
+    assert not v1.is_delta
+    assert v2.is_delta and v2.parent_id == v1.id
+    assert db_session.query(VersionFile).filter(VersionFile.version_id == v2.id).count() == 3
+
+    files = asyncio.run(CollaborationService.get_version_files(db_session, v2.id))
+    assert {f.file_path: f.content for f in files} == changed
+
+    # Reading diffs caches them without committing the caller's unflushed changes
+    project.description = "renamed"
+    changes = asyncio.run(CollaborationService.get_version_changes(db_session, v2.id))
+    db_session.rollback()
+    assert project.description == "todo app"
+    assert db_session.query(BlobDiff).count() == 1
+    assert [(c["file_path"], c["change_type"]) for c in changes] == [
+        ("backend/module_3.py", "modified"),
+        ("backend/module_7.py", "deleted"),
+        ("backend/new.py", "added"),
+    ]
+    assert "-value = 3" in changes[0]["diff"] and "+value = 300" in changes[0]["diff"]
+
+    assert asyncio.run(CollaborationService.diff_versions(db_session, v1.id, v2.id)) == changes
+
+
+def test_project_versions_include_full_file_sets(db_session):
+    """Test that listing versions with files resolves deltas and tombstones"""
+    owner = create_owner(db_session)
+    base = {"a.py": "a", "b.py": "b", "c.py": "c"}
+    project = asyncio.run(DatabaseService.create_project(
+        db_session, "todo app", "web", {}, base, owner.id))
+    asyncio.run(CollaborationService.create_version(
+        db_session, project.id, "1.0.0", "initial", owner.id, base))
+    changed = {"a.py": "a2", "b.py": "b"}
+    v2 = asyncio.run(CollaborationService.create_version(
+        db_session, project.id, "1.1.0", "drop c", owner.id, changed))
+    assert v2.is_delta
+
+    tombstone = db_session.query(VersionFile).filter(
+        VersionFile.version_id == v2.id, VersionFile.is_deleted).one()
+    assert tombstone.content is None
+
+    project_id = project.id
+    db_session.expunge_all()
+    versions = asyncio.run(CollaborationService.get_project_versions(
+        db_session, project_id, include_files=True))
+    assert [{f.file_path: f.content for f in v.files} for v in versions] == [changed, base]
+    assert not db_session.dirty
+
+
+def test_project_access_resolution_and_invalidation(db_session):
+    """Test permission levels, cache invalidation on share changes and batch filtering"""
+    owner = create_owner(db_session)
+    other = User(email="other@example.com", username="other", hashed_password="x")
+    admin = User(email="admin@example.com", username="admin", hashed_password="x", role=UserRole.ADMIN)
+    db_session.add_all([other, admin])
+    db_session.commit()
+    mine = asyncio.run(DatabaseService.create_project(db_session, "mine", "web", {}, {}, owner.id))
+    theirs = asyncio.run(DatabaseService.create_project(db_session, "theirs", "web", {}, {}, other.id))
+
+    def resolve(project, user):
+        return asyncio.run(DatabaseService.resolve_project_access(db_session, project.id, user))
+
+    assert resolve(mine, owner) == SharePermission.ADMIN
+    assert resolve(mine, admin) == SharePermission.ADMIN
+    assert resolve(mine, other) is None
+
+    asyncio.run(ShareService.share_project(db_session, mine.id, other.id, SharePermission.WRITE, owner))
+    assert resolve(mine, other) == SharePermission.WRITE
+    assert asyncio.run(DatabaseService.get_project(db_session, mine.id, other)).id == mine.id
+
+    ids = [mine.id, theirs.id, 999]
+    assert asyncio.run(DatabaseService.filter_accessible_projects(db_session, ids, owner)) == [mine.id]
+    assert asyncio.run(DatabaseService.filter_accessible_projects(db_session, ids, other)) == [mine.id, theirs.id]
+    assert asyncio.run(DatabaseService.filter_accessible_projects(db_session, ids, admin)) == [mine.id, theirs.id]
+
+    asyncio.run(ShareService.remove_share(db_session, mine.id, other.id, owner))
+    assert resolve(mine, other) is None
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(DatabaseService.get_project(db_session, mine.id, other))
+    assert exc_info.value.status_code == 403
+
+
+def test_list_projects_keyset_pagination(db_session):
+    """Test that cursors walk every project once, newest first, without the structure"""
+    owner = create_owner(db_session)
+    created_at = datetime(2024, 1, 1)
+    for i in range(7):
+        # Pairs share a timestamp so the id has to break ties
+        db_session.add(Project(name=f"p{i}", description="d", project_type="web", structure={"big": i},
+                               owner_id=owner.id, created_at=created_at + timedelta(seconds=i // 2)))
+    db_session.commit()
+
+    seen, cursor, page_cursor = [], None, None
+    while True:
+        items, cursor = asyncio.run(DatabaseService.list_projects(db_session, limit=3, cursor=cursor))
+        assert "structure" not in items[0]
+        seen.extend(item["name"] for item in items)
+        page_cursor = cursor or page_cursor
+        if cursor is None:
+            break
+
+    assert seen == [f"p{i}" for i in reversed(range(7))]
+    # MySQL 5.7 only uses the index for the expanded form, not a row-value comparison
+    seek = str(apply_keyset(select(Project.id), Project.created_at, Project.id, 3, cursor=page_cursor)
+               .compile(dialect=mysql.dialect()))
+    assert "projects.created_at < %s OR projects.created_at = %s AND projects.id < %s" in seek
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(DatabaseService.list_projects(db_session, cursor="not-a-cursor"))
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize("backend", [None, InvertedIndexBackend])
+def test_search_projects_ranks_prefix_matches(db_session, backend, monkeypatch):
+    """Test that search follows creates, updates and deletes and ranks name matches first"""
+    if backend:
+        monkeypatch.setattr(search_service, "_backends",
+                            {"sqlite:///./test.db": backend()})
+    owner = create_owner(db_session)
+    todo = asyncio.run(DatabaseService.create_project(db_session, "a todo list app", "web", {}, {}, owner.id))
+    todo.name = "todo"
+    shop = asyncio.run(DatabaseService.create_project(db_session, "shop with a todo widget", "web", {}, {}, owner.id))
+    asyncio.run(DatabaseService.create_project(db_session, "weather dashboard", "web", {}, {}, owner.id))
+    db_session.commit()
+
+    results = asyncio.run(DatabaseService.search_projects(db_session, "tod"))
+    assert [r["id"] for r in results] == [todo.id, shop.id]
+    assert "structure" not in results[0]
+    assert [r["id"] for r in asyncio.run(DatabaseService.search_projects(db_session, "tod", limit=1, offset=1))] == [shop.id]
+    assert [r["id"] for r in asyncio.run(DatabaseService.search_projects(db_session, "todo wid"))] == [shop.id]
+
+    asyncio.run(DatabaseService.update_project(db_session, shop.id, description="bakery shop"))
+    assert [r["id"] for r in asyncio.run(DatabaseService.search_projects(db_session, "bake"))] == [shop.id]
+    asyncio.run(DatabaseService.delete_project(db_session, todo.id))
+    assert asyncio.run(DatabaseService.search_projects(db_session, "todo")) == []
+
+
+def test_concurrent_async_searches_resolve_backend_once(db_session, async_session_factory, monkeypatch):
+    """Test that async searches racing to pick the search backend do not stall the event loop"""
+    monkeypatch.setattr(search_service, "_backends", {})
+    owner = create_owner(db_session)
+    project = asyncio.run(DatabaseService.create_project(db_session, "todo app", "web", {}, {}, owner.id))
+
+    async def search():
+        async with async_session_factory() as db:
+            return await AsyncDatabaseService.search_projects(db, "todo")
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(*[search() for _ in range(4)]), timeout=10)
+
+    for results in asyncio.run(main()):
+        assert [r["id"] for r in results] == [project.id]
+    assert len(search_service._backends) == 1
+
+def test_project_stats_follow_counters_and_reconcile(db_session):
+    """Test that stats move with creates, type changes and deletes and that reconcile fixes drift"""
+    owner = create_owner(db_session)
+    web = asyncio.run(DatabaseService.create_project(db_session, "site", "web", {}, {}, owner.id))
+    asyncio.run(DatabaseService.create_project(db_session, "app", "mobile", {}, {}, owner.id))
+    asyncio.run(DatabaseService.update_project(db_session, web.id, project_type="mobile"))
+
+    stats = asyncio.run(DatabaseService.get_project_stats(db_session, max_age=0))
+    assert stats["total_projects"] == 2
+    assert stats["projects_by_type"] == {"mobile": 2}
+    assert [p["id"] for p in stats["recent_projects"]][0] == web.id + 1
+
+    # Bulk deletes bypass the mapper events until the next reconciliation
+    db_session.query(Project).filter(Project.id == web.id).delete()
+    db_session.commit()
+    assert asyncio.run(DatabaseService.get_project_stats(db_session))["total_projects"] == 2
+    assert StatsService.reconcile(db_session) == {"mobile": -1}
+    stats = asyncio.run(DatabaseService.get_project_stats(db_session))
+    assert stats["projects_by_type"] == {"mobile": 1}
+    assert stats["reconciled_at"] is not None
+
+
+def test_relationship_reads_do_not_issue_n_plus_one(db_session, assert_max_queries):
+    """Test that shared projects, comment threads and version files load in a fixed number of queries"""
+    owner = create_owner(db_session)
+    readers = [User(email=f"r{i}@example.com", username=f"r{i}", hashed_password="x") for i in range(4)]
+    db_session.add_all(readers)
+    db_session.commit()
+    projects = [
+        asyncio.run(DatabaseService.create_project(db_session, f"p{i}", "web", {}, {}, owner.id))
+        for i in range(4)
+    ]
+    reader_id, project_ids = readers[0].id, [p.id for p in projects]
+    for project in projects:
+        asyncio.run(ShareService.share_project(db_session, project.id, readers[0].id, SharePermission.READ, owner))
+    for reader in readers:
+        comment = asyncio.run(CollaborationService.add_comment(db_session, project_ids[0], reader.id, "hi"))
+        for other in readers[:2]:
+            asyncio.run(CollaborationService.add_reply(db_session, comment.id, other.id, "re"))
+    for i in range(3):
+        asyncio.run(CollaborationService.create_version(
+            db_session, project_ids[0], f"1.0.{i}", "v", owner.id, {"a.py": str(i), "b.py": "b"}, delta=False))
+    db_session.expunge_all()
+
+    with assert_max_queries(1):
+        shared = asyncio.run(ShareService.get_shared_projects(db_session, reader_id))
+        assert sorted(p.id for p in shared) == project_ids
+    with assert_max_queries(2):
+        comments = asyncio.run(CollaborationService.get_project_comments(db_session, project_ids[0]))
+        assert sum(len(c.replies) for c in comments) == 8
+        assert {r.user.username for c in comments for r in c.replies} | {c.user.username for c in comments}
+    with assert_max_queries(2):
+        threads = asyncio.run(CollaborationService.get_comment_threads(db_session, project_ids[0]))
+        assert [len(t["replies"]) for t in threads] == [2, 2, 2, 2]
+    with assert_max_queries(2):
+        versions = asyncio.run(CollaborationService.get_project_versions(
+            db_session, project_ids[0], include_files=True))
+        assert [len(v.files) for v in versions] == [2, 2, 2]
+        assert {f.content for v in versions for f in v.files} == {"0", "1", "2", "b"}
+    with assert_max_queries(1):
+        summaries = asyncio.run(CollaborationService.get_version_summaries(db_session, project_ids[0]))
+        assert [s["file_count"] for s in summaries] == [2, 2, 2]
@@ -0,0 +1,238 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.generation_job import FileStatus, GenerationJob, JobStatus
+from models.project import Project
+from models.user import User
+from config import settings
+from services.ai_service import AICodeGenerator
+from services.job_service import GenerationWorker, JobService
+from services.llm_providers import LLMProvider
+
+STRUCTURE = {"backend": {}}
+
+
+class ScriptedProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, latency=0.0, fail_paths=()):
+        self.latency = latency
+        self.fail_paths = fail_paths
+        self.calls = 0
+
+    async def complete(self, model, messages, temperature, max_tokens):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        if any(path in prompt for path in self.fail_paths):
+            raise RuntimeError("upstream error")
+        return "# generated"
+
+    async def stream(self, model, messages, temperature, max_tokens):
+        yield await self.complete(model, messages, temperature, max_tokens)
+
+
+@pytest.fixture
+def owner(db_session):
+    user = User(email="jobs@example.com", username="jobs", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+def make_worker(monkeypatch, async_session_factory, provider, **kwargs):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(settings, "DEFAULT_LLM_MODEL", "gpt-4-turbo-preview")
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    generator = AICodeGenerator()
+    generator.providers.providers["openai"] = provider
+    kwargs.setdefault("poll_interval", 0.05)
+    kwargs.setdefault("retry_backoff", 0)
+    return GenerationWorker(async_session_factory, generator=generator, **kwargs)
+
+
+def test_jobs_run_by_priority_and_record_file_progress(db_session, owner, async_session_factory, monkeypatch):
+    """Test that higher priority jobs run first and per-file outcomes are stored"""
+    worker = make_worker(monkeypatch, async_session_factory, ScriptedProvider(fail_paths=["backend/main.py"]))
+
+    async def scenario():
+        async with async_session_factory() as db:
+            low = await JobService.enqueue(db, owner.id, "low", project_structure=STRUCTURE)
+            high = await JobService.enqueue(db, owner.id, "high", project_structure=STRUCTURE, priority=5)
+            assert (high.status, high.progress["total"]) == (JobStatus.QUEUED, 0)
+
+        assert await worker.run_once()
+        async with async_session_factory() as db:
+            high, low = await JobService.get_job(db, high.id, owner), await JobService.get_job(db, low.id, owner)
+            assert (high.status, low.status) == (JobStatus.SUCCEEDED, JobStatus.QUEUED)
+        assert await worker.run_once()
+        assert not await worker.run_once()
+        return high
+
+    high = asyncio.run(scenario())
+    assert high.attempts == 1
+    assert high.progress == {"pending": 0, "done": 3, "failed": 1, "total": 4}
+    failed = [f for f in high.files if f.status == FileStatus.FAILED]
+    assert [(f.file_path, f.error) for f in failed] == [("backend/main.py", "upstream error")]
+    project = db_session.query(Project).get(high.project_id)
+    assert project.description == "high"
+    assert len(project.files) == 3
+
+
+def test_failed_attempts_are_retried_until_max_attempts(db_session, owner, async_session_factory, monkeypatch):
+    """Test that a failing job is requeued with backoff and fails after its last attempt"""
+    # Without a structure the job starts with requirements analysis, which needs JSON
+    worker = make_worker(monkeypatch, async_session_factory, ScriptedProvider())
+
+    async def scenario():
+        async with async_session_factory() as db:
+            job = await JobService.enqueue(db, owner.id, "todo app", max_attempts=2)
+        assert await worker.run_once()
+        async with async_session_factory() as db:
+            retrying = await JobService.get_job(db, job.id, owner)
+            assert (retrying.status, retrying.attempts) == (JobStatus.QUEUED, 1)
+            assert "Invalid JSON" in retrying.error
+        assert await worker.run_once()
+        assert not await worker.run_once()
+        async with async_session_factory() as db:
+            return await JobService.get_job(db, job.id, owner)
+
+    job = asyncio.run(scenario())
+    assert (job.status, job.attempts, job.project_id) == (JobStatus.FAILED, 2, None)
+    assert job.finished_at is not None
+
+
+def test_cancel_queued_and_running_jobs(db_session, owner, async_session_factory, monkeypatch):
+    """Test that queued jobs cancel at once and running jobs stop at the next heartbeat"""
+    worker = make_worker(monkeypatch, async_session_factory, ScriptedProvider(latency=5))
+
+    async def scenario():
+        async with async_session_factory() as db:
+            queued = await JobService.enqueue(db, owner.id, "queued", project_structure=STRUCTURE)
+            assert (await JobService.cancel_job(db, queued.id, owner)).status == JobStatus.CANCELLED
+            assert not await worker.run_once()
+
+            running = await JobService.enqueue(db, owner.id, "running", project_structure=STRUCTURE)
+        task = asyncio.create_task(worker.run_once())
+        async with async_session_factory() as db:
+            while (await JobService.get_job(db, running.id, owner)).status != JobStatus.RUNNING:
+                await asyncio.sleep(0.01)
+            assert (await JobService.cancel_job(db, running.id, owner)).cancel_requested
+        await asyncio.wait_for(task, timeout=2)
+        async with async_session_factory() as db:
+            return await JobService.get_job(db, running.id, owner)
+
+    job = asyncio.run(scenario())
+    assert (job.status, job.project_id) == (JobStatus.CANCELLED, None)
+    assert db_session.query(Project).count() == 0
+
+
+def test_jobs_of_a_lost_worker_are_requeued(db_session, owner, async_session_factory, monkeypatch):
+    """Test that a running job without a recent heartbeat goes back on the queue, unless it was cancelled"""
+    worker = make_worker(monkeypatch, async_session_factory, ScriptedProvider(), lease_seconds=60)
+    job, cancelled = [
+        GenerationJob(
+            owner_id=owner.id, prompt=prompt, structure=STRUCTURE, status=JobStatus.RUNNING,
+            attempts=1, worker_id="gone", heartbeat_at=datetime.utcnow() - timedelta(minutes=5),
+            cancel_requested=prompt == "cancelled"
+        )
+        for prompt in ("orphaned", "cancelled")
+    ]
+    db_session.add_all([job, cancelled])
+    db_session.commit()
+
+    assert asyncio.run(worker.run_once())
+    db_session.refresh(job)
+    db_session.refresh(cancelled)
+    assert (job.status, job.attempts) == (JobStatus.SUCCEEDED, 2)
+    assert (cancelled.status, cancelled.worker_id) == (JobStatus.CANCELLED, None)
+
+
+def test_worker_that_lost_its_lease_does_not_persist(db_session, owner, async_session_factory, monkeypatch):
+    """Test that when two workers race on one expired lease, only the new owner saves a project"""
+    # The stalled worker heartbeats too rarely to keep its lease
+    stalled = make_worker(monkeypatch, async_session_factory, ScriptedProvider(latency=2), poll_interval=0.5)
+    recovering = make_worker(monkeypatch, async_session_factory, ScriptedProvider(), lease_seconds=0.2)
+
+    async def scenario():
+        async with async_session_factory() as db:
+            job = await JobService.enqueue(db, owner.id, "contended", project_structure=STRUCTURE)
+        task = asyncio.create_task(stalled.run_once())
+        await asyncio.sleep(0.3)
+        assert await recovering.run_once()
+        # The stalled worker stops at its next heartbeat instead of finishing the generation
+        assert await asyncio.wait_for(task, timeout=1.5)
+        async with async_session_factory() as db:
+            return await JobService.get_job(db, job.id, owner)
+
+    job = asyncio.run(scenario())
+    assert (job.status, job.attempts, job.worker_id) == (JobStatus.SUCCEEDED, 2, None)
+    assert db_session.query(Project).count() == 1
+
+
+def test_worker_dying_after_persist_leaves_one_project(db_session, owner, async_session_factory, monkeypatch):
+    """Test that the project and the job's success commit together, so recovery has nothing to rerun"""
+    class Killed(BaseException):
+        pass
+
+    dying = make_worker(monkeypatch, async_session_factory, ScriptedProvider())
+    recovering = make_worker(monkeypatch, async_session_factory, ScriptedProvider(), lease_seconds=0.1)
+    persist = dying._persist
+
+    async def persist_then_die(*args):
+        await persist(*args)
+        raise Killed()
+
+    dying._persist = persist_then_die
+
+    async def scenario():
+        async with async_session_factory() as db:
+            job = await JobService.enqueue(db, owner.id, "once", project_structure=STRUCTURE)
+        with pytest.raises(Killed):
+            await dying.run_once()
+        await asyncio.sleep(0.2)
+        assert not await recovering.run_once()
+        async with async_session_factory() as db:
+            return await JobService.get_job(db, job.id, owner)
+
+    job = asyncio.run(scenario())
+    assert (job.status, job.attempts, job.worker_id) == (JobStatus.SUCCEEDED, 1, None)
+    assert db_session.query(Project).count() == 1
+    assert job.project_id == db_session.query(Project.id).scalar()
+
+
+def test_regeneration_only_regenerates_affected_files(db_session, owner, async_session_factory, monkeypatch):
+    """Test that a structure change regenerates the files depending on it and reuses the rest"""
+    provider = ScriptedProvider()
+    worker = make_worker(monkeypatch, async_session_factory, provider)
+    structure = {"frontend": {"framework": "next.js"}, "backend": {"framework": "fastapi"}}
+
+    async def scenario():
+        async with async_session_factory() as db:
+            job = await JobService.enqueue(db, owner.id, "todo app", project_structure=structure)
+        assert await worker.run_once()
+        async with async_session_factory() as db:
+            project_id = (await JobService.get_job(db, job.id, owner)).project_id
+            changed = dict(structure, backend={"framework": "flask"})
+            job = await JobService.enqueue_regeneration(db, project_id, changed, owner)
+            assert job.project_id == project_id
+        provider.calls = 0
+        provider.fail_paths = ["backend/main.py"]
+        assert await worker.run_once()
+        async with async_session_factory() as db:
+            return await JobService.get_job(db, job.id, owner)
+
+    job = asyncio.run(scenario())
+    assert job.status == JobStatus.SUCCEEDED
+    # Only the four backend files were sent upstream; the frontend files count as done
+    assert provider.calls == 4
+    assert job.progress == {"pending": 0, "done": 7, "failed": 1, "total": 8}
+    assert db_session.query(Project).count() == 1
+    project = db_session.query(Project).get(job.project_id)
+    db_session.refresh(project)
+    assert project.structure["backend"] == {"framework": "flask"}
+    # The file that failed to regenerate keeps its previous content
+    assert len(project.files) == 8
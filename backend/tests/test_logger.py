@@ -0,0 +1,49 @@
+import json
+import logging
+import queue
+
+from utils.logger import NonBlockingQueueHandler, request_id_var, setup_logger, shutdown_logger
+
+
+def test_queue_pipeline_writes_json_with_request_id(tmp_path):
+    """Test that records reach the file as JSON lines with request IDs, extras and sampled debug"""
+    log_file = tmp_path / "app.log"
+    root = logging.getLogger()
+    level = root.level
+    setup_logger(level="DEBUG", log_format="json", log_file=str(log_file), debug_sample_rate=0)
+    logger = logging.getLogger("tests.logger")
+    token = request_id_var.set("req-1")
+    try:
+        logger.info("Project created: %s by user %s", 7, 3, extra={"project_id": 7})
+        logger.debug("Sampled out")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Failed")
+    finally:
+        request_id_var.reset(token)
+        shutdown_logger()
+        root.setLevel(level)
+
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [entry["message"] for entry in entries] == ["Project created: 7 by user 3", "Failed"]
+    assert {entry["request_id"] for entry in entries} == {"req-1"}
+    assert entries[0]["project_id"] == 7
+    assert "ValueError: boom" in entries[1]["exception"]
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    """Test that the handler counts records it cannot queue"""
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    record = logging.LogRecord("tests", logging.INFO, __file__, 1, "message %s", ("x",), None)
+    handler.handle(record)
+    handler.handle(record)
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().msg == "message x"
+
+
+def test_request_id_header(client):
+    """Test that a valid X-Request-ID is echoed and others are replaced"""
+    assert client.get("/health", headers={"X-Request-ID": "abc-123"}).headers["x-request-id"] == "abc-123"
+    generated = client.get("/health", headers={"X-Request-ID": "bad id <script>"}).headers["x-request-id"]
+    assert len(generated) == 32
@@ -0,0 +1,99 @@
+import json
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware.metrics import MetricsMiddleware
+from middleware.rate_limit import RateLimiter, RateLimitMiddleware, RateLimitRule
+from services.llm_providers import model_label
+from utils.metrics import MetricsRegistry, metrics
+
+
+def test_worker_snapshots_are_merged(tmp_path):
+    """Test that counters and histograms sum across workers and gauges stay per worker"""
+    registry = MetricsRegistry(multiproc_dir=str(tmp_path), flush_interval=5)
+    requests = registry.counter("jobs_total", "Jobs", ("status",))
+    latency = registry.histogram("job_seconds", "Job time", buckets=(1.0, 10.0))
+    requests.inc("ok")
+    latency.observe(0.5)
+    latency.observe(20)
+    registry.register_collector(lambda: [
+        {"name": "queue_depth", "type": "gauge", "help": "Depth", "labels": [], "samples": [[[], 3]]}
+    ])
+
+    other = MetricsRegistry()
+    other.counter("jobs_total", "Jobs", ("status",)).inc("ok", amount=2)
+    other.histogram("job_seconds", "Job time", buckets=(1.0, 10.0)).observe(5)
+    families = other.collect() + [
+        {"name": "queue_depth", "type": "gauge", "help": "Depth", "labels": [], "samples": [[[], 7]]}
+    ]
+    for pid in (1, 2):
+        (tmp_path / f"metrics-{pid}.json").write_text(json.dumps(families))
+    # Worker 2 stopped writing: its counters still count, its gauges are dropped
+    stale = time.time() - 60
+    os.utime(tmp_path / "metrics-2.json", (stale, stale))
+    # Stray files in the shared directory are skipped
+    (tmp_path / "metrics-backup.json").write_text(json.dumps(families))
+    (tmp_path / "metrics-3.json").write_text("{truncated")
+
+    text = registry.render()
+    own = os.getpid()
+    assert 'jobs_total{status="ok"} 5' in text
+    assert 'job_seconds_bucket{le="1.0"} 1' in text
+    assert 'job_seconds_bucket{le="10.0"} 3' in text
+    assert 'job_seconds_bucket{le="+Inf"} 4' in text
+    assert "job_seconds_count 4" in text
+    assert f'queue_depth{{pid="{own}"}} 3' in text
+    assert 'queue_depth{pid="1"} 7' in text
+    assert 'pid="2"' not in text
+
+    registry.flush()
+    assert json.loads((tmp_path / f"metrics-{own}.json").read_text())
+
+
+def test_metrics_endpoint(client):
+    """Test that /metrics reports route latency by template, queries and cache hit ratios"""
+    assert client.get("/api/projects/12345").status_code == 401
+    client.get("/api/projects?limit=5")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/projects/{project_id}",status="401"}' in text
+    assert 'route="/api/projects",status="200"' in text
+    assert 'db_query_duration_seconds_count{engine="async",statement="SELECT"}' in text
+    assert 'cache_hit_ratio{cache="project_access"}' in text
+    assert 'rate_limit_requests_total{rule="default",decision="allowed"}' in text
+    assert "password_hash_queued 0" in text
+
+
+def test_throttled_requests_are_attributed_to_their_route():
+    """Test that 429s from the rate limiter are labelled with the route template"""
+    app = FastAPI()
+
+    @app.get("/api/throttled/{item_id}")
+    async def throttled(item_id: int):
+        return {}
+
+    app.add_middleware(RateLimitMiddleware, limiter=RateLimiter([RateLimitRule("test", rate=0.01, burst=1)]))
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+
+    assert client.get("/api/throttled/1").status_code == 200
+    assert client.get("/api/throttled/2").status_code == 429
+    assert client.get("/api/missing").status_code == 429
+
+    text = metrics.render()
+    assert 'route="/api/throttled/{item_id}",status="200"' in text
+    assert 'route="/api/throttled/{item_id}",status="429"' in text
+    assert 'method="GET",route="unmatched",status="429"' in text
+
+
+def test_request_models_do_not_add_series():
+    """Test that model names outside the configured ones share one label"""
+    assert model_label("gpt-4-turbo-preview") == "gpt-4-turbo-preview"
+    assert model_label("gpt-4-turbo-preview-" + "x" * 40) == "other"
+    assert model_label(None) == "other"
@@ -0,0 +1,154 @@
+import asyncio
+import sqlite3
+
+from middleware.rate_limit import (
+    MemoryBackend,
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitRule,
+    SQLiteBackend,
+)
+from config import settings
+from services.auth_service import AuthService
+
+
+def hit_many(backend, rule, count, now=0.0):
+    return [backend.hit("client", rule, now)[0] for _ in range(count)]
+
+
+def test_token_bucket_allows_burst_then_refills():
+    """Test that the bucket admits a burst and refills at the sustained rate"""
+    rule = RateLimitRule("test", rate=2, burst=3)
+    backend = MemoryBackend()
+
+    assert hit_many(backend, rule, 4) == [True, True, True, False]
+    allowed, retry_after = backend.hit("client", rule, 0.0)
+    assert not allowed and retry_after == 0.5
+    assert backend.hit("client", rule, 0.5)[0]
+
+
+def test_sliding_window_limits_requests_per_window():
+    """Test that the sliding window counter weights the previous window"""
+    rule = RateLimitRule("test", rate=1, burst=4, algorithm="sliding_window")
+    backend = MemoryBackend()
+
+    assert hit_many(backend, rule, 5) == [True, True, True, True, False]
+    # Half-way through the next window half of the previous count still applies
+    assert hit_many(backend, rule, 3, now=6.0) == [True, True, False]
+    assert hit_many(backend, rule, 4, now=20.0) == [True, True, True, True]
+
+
+def test_memory_backend_is_bounded():
+    """Test that idle clients are evicted once the key limit is reached"""
+    rule = RateLimitRule("test", rate=1, burst=1)
+    backend = MemoryBackend(max_keys=100)
+
+    for i in range(1000):
+        backend.hit(f"client-{i}", rule, 0.0)
+
+    assert len(backend) == 100
+    assert backend.evictions == 900
+
+
+def test_sqlite_backend_shares_state(tmp_path):
+    """Test that separate backends on one file share a single budget"""
+    rule = RateLimitRule("test", rate=1, burst=2)
+    path = str(tmp_path / "limits.db")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+
+    assert first.hit("client", rule, 100.0)[0]
+    assert second.hit("client", rule, 100.0)[0]
+    assert not first.hit("client", rule, 100.0)[0]
+
+
+def test_sqlite_backend_does_not_block_the_event_loop(tmp_path):
+    """Test that waiting for another process's write lock leaves the loop free"""
+    rule = RateLimitRule("test", rate=1, burst=2)
+    path = str(tmp_path / "limits.db")
+    limiter = RateLimiter([rule], SQLiteBackend(path))
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def run():
+        check = asyncio.ensure_future(limiter.check("/", "GET", "10.0.0.1"))
+        ticks = 0
+        while ticks < 10:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not check.done()
+        other.execute("COMMIT")
+        return await check
+
+    assert asyncio.run(run()) is None
+
+
+def make_middleware(limiter):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = RateLimitMiddleware(app, limiter)
+
+    def request(path, token, client="10.0.0.1"):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "path": path,
+            "method": "POST",
+            "client": (client, 1234),
+            "headers": [(b"authorization", f"Bearer {token}".encode())],
+        }
+        asyncio.run(middleware(scope, None, send))
+        return messages[0]
+
+    return request
+
+
+def generate_limiter():
+    return RateLimiter([
+        RateLimitRule("default", rate=100, burst=100),
+        RateLimitRule("generate", rate=0.1, burst=1, path="/api/generate", methods=["POST"], per="user"),
+    ])
+
+
+def test_middleware_applies_route_budget_per_user():
+    """Test that /api/generate has its own budget per authenticated user"""
+    request = make_middleware(generate_limiter())
+    alice = AuthService.create_access_token({"sub": "1"})
+    bob = AuthService.create_access_token({"sub": "2"})
+
+    assert request("/api/generate", alice)["status"] == 200
+    rejected = request("/api/generate", alice)
+    assert rejected["status"] == 429
+    assert (b"retry-after", b"10") in rejected["headers"]
+    # A fresh token for the same user shares the budget, even from another IP
+    assert request("/api/generate", AuthService.create_access_token({"sub": "1"}), "10.0.0.2")["status"] == 429
+    assert request("/api/generate", bob)["status"] == 200
+    assert request("/api/projects", alice)["status"] == 200
+
+
+def test_unverified_tokens_fall_back_to_the_client_ip():
+    """Test that rotating junk bearer tokens does not reset the budget"""
+    request = make_middleware(generate_limiter())
+
+    assert request("/api/generate", "junk-1")["status"] == 200
+    assert request("/api/generate", "junk-2")["status"] == 429
+    assert request("/api/generate", "junk-3", "10.0.0.2")["status"] == 200
+
+
+def test_generate_budget_covers_regenerate(monkeypatch):
+    """Test that regenerating a project draws on the same per-user budget"""
+    monkeypatch.setattr(settings, "RATE_LIMIT_GENERATE_PER_MINUTE", 6)
+    monkeypatch.setattr(settings, "RATE_LIMIT_GENERATE_BURST", 1)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", "memory")
+    request = make_middleware(RateLimiter.from_env())
+    alice = AuthService.create_access_token({"sub": "1"})
+
+    assert request("/api/generate", alice)["status"] == 200
+    assert request("/api/projects/7/regenerate", alice)["status"] == 429
+    assert request("/api/generate/stream", alice)["status"] == 429
+    assert request("/api/projects/7", alice)["status"] == 200
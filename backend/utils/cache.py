@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import threading
+import time
+
+from utils.metrics import family, metrics
+
+_MISSING = object()
+
+# Caches exported as cache_hits_total / cache_misses_total, by name
+_named_caches: Dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """Size-bounded LRU mapping whose entries expire after ``ttl`` seconds
+
+    Safe to share between the event loop and threadpool workers. Caches
+    given a ``name`` report their hits and misses on /metrics.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        if name:
+            _named_caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING or entry[1] <= now:
+                if entry is not _MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def invalidate(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which ``predicate(key, value)`` is true"""
+        with self._lock:
+            stale = [key for key, (value, _) in self._entries.items() if predicate(key, value)]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def _cache_metric_families():
+    caches = list(_named_caches.items())
+    return [
+        family("cache_hits_total", "counter", "Cache lookups answered from the cache", ("cache",),
+               [((name,), cache.hits) for name, cache in caches]),
+        family("cache_misses_total", "counter", "Cache lookups that missed", ("cache",),
+               [((name,), cache.misses) for name, cache in caches]),
+        family("cache_entries", "gauge", "Entries currently cached", ("cache",),
+               [((name,), len(cache)) for name, cache in caches]),
+    ]
+
+metrics.register_collector(_cache_metric_families)
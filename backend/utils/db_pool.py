@@ -0,0 +1,177 @@
+from typing import Dict, List
+import bisect
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from utils.metrics import Family, bucket_family, family, metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+class PoolMetrics:
+    """Checkout counters and wait time histogram of one connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.overflow_checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.wait_buckets: List[int] = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def listen(self, engine):
+        """Also count new DBAPI connections and invalidations of ``engine``"""
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def observe_checkout(self, wait: float, overflow: bool):
+        with self._lock:
+            self.checkouts += 1
+            if overflow:
+                self.overflow_checkouts += 1
+            self.wait_seconds_total += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, wait)] += 1
+
+    def observe_timeout(self, wait: float):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    def snapshot(self, pool) -> Dict[str, float]:
+        with self._lock:
+            stats = {
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait_seconds_total": self.wait_seconds_total,
+                "max_wait_seconds": self.max_wait_seconds,
+                "wait_buckets": dict(zip([*map(str, WAIT_BUCKETS), "+Inf"], self.wait_buckets)),
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        return stats
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a free connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.observe_timeout(time.perf_counter() - start)
+            logger.warning(
+                "Database pool exhausted: %d checked out, overflow %d/%d",
+                self.checkedout(), max(self.overflow(), 0), self._max_overflow
+            )
+            raise
+        self.metrics.observe_checkout(time.perf_counter() - start, self.overflow() > 0)
+        return connection
+
+class MeteredAsyncQueuePool(MeteredQueuePool, AsyncAdaptedQueuePool):
+    """MeteredQueuePool for engines created with create_async_engine"""
+
+def recommended_pool_size(workers: int, max_connections: int, headroom: float = 0.8) -> int:
+    """Largest pool_size + max_overflow per worker that keeps every worker within ``max_connections``
+
+    ``headroom`` leaves room for migrations, admin sessions and other clients
+    of the same database server.
+    """
+    return max(int(max_connections * headroom) // max(workers, 1), 1)
+
+QUERY_SECONDS = metrics.histogram(
+    "db_query_duration_seconds", "Statement execution time", ("engine", "statement")
+)
+QUERY_ERRORS = metrics.counter("db_query_errors_total", "Statements that raised", ("engine", "statement"))
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"}
+
+def _statement_kind(statement: str) -> str:
+    kind = statement.lstrip()[:8].split(None, 1)
+    kind = kind[0].upper() if kind else ""
+    return kind if kind in _STATEMENTS else "OTHER"
+
+def instrument_engine(engine, name: str):
+    """Count and time every statement ``engine`` executes, labelled by engine ``name``"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            QUERY_SECONDS.observe(time.perf_counter() - started, name, _statement_kind(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        QUERY_ERRORS.inc(name, _statement_kind(exception_context.statement or ""))
+
+def pool_metric_families(stats: Dict[str, Dict]) -> List[Family]:
+    """Pool saturation families from ``PoolMetrics.snapshot`` of each named engine"""
+    metered = {name: snapshot for name, snapshot in stats.items() if "checkouts" in snapshot}
+    gauges = [
+        ("db_pool_size", "size", "Connections kept open by the pool"),
+        ("db_pool_checked_out", "checked_out", "Connections currently in use"),
+        ("db_pool_overflow", "overflow", "Connections open beyond pool_size"),
+        ("db_pool_max_overflow", "max_overflow", "Overflow connections allowed"),
+    ]
+    counters = [
+        ("db_pool_checkouts_total", "checkouts", "Connections handed out"),
+        ("db_pool_overflow_checkouts_total", "overflow_checkouts", "Checkouts served by overflow connections"),
+        ("db_pool_timeouts_total", "timeouts", "Checkouts that gave up waiting for a connection"),
+        ("db_pool_connects_total", "connects", "New DBAPI connections opened"),
+        ("db_pool_invalidations_total", "invalidations", "Connections invalidated after errors"),
+    ]
+    families = [
+        family(name, kind, help, ("engine",), [
+            ((engine,), snapshot[key]) for engine, snapshot in metered.items() if key in snapshot
+        ])
+        for kind, entries in (("gauge", gauges), ("counter", counters))
+        for name, key, help in entries
+    ]
+    families.append(bucket_family(
+        "db_pool_wait_seconds", "Time checkouts waited for a free connection", ("engine",), WAIT_BUCKETS,
+        [((engine,), list(snapshot["wait_buckets"].values()), snapshot["wait_seconds_total"])
+         for engine, snapshot in metered.items()]
+    ))
+    return families
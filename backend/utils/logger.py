@@ -1,27 +1,157 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from pathlib import Path
+from typing import Optional
+import json
 import logging
+import queue
+import random
 import sys
-from pathlib import Path
+import threading
+
+from utils.metrics import family, metrics
+from config import settings
+
+# Set per request by RequestIdMiddleware, copied into every record logged while handling it
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the request ID of the task that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep a random share of DEBUG records; other levels always pass"""
+
+    def __init__(self, rate: float = settings.LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the request ID and any ``extra=`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
 
-def setup_logger():
-    # Create log directory
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
+class NonBlockingQueueHandler(QueueHandler):
+    """Hand records to the writer thread without formatting or waiting on I/O
 
-    # Configure log format
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    The message is merged with its arguments here, since they may change
+    after the call returns, but formatting and writing happen on the
+    listener thread. When the queue is full the record is dropped and
+    counted rather than blocking the event loop.
+    """
 
-    # File handler
-    file_handler = logging.FileHandler("logs/app.log")
-    file_handler.setFormatter(formatter)
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
 
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks hold frames that keep changing; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def _file_handler(path: str) -> logging.Handler:
+    # Rotate by size, or by time when LOG_ROTATE_WHEN is set (e.g. "midnight", "H")
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if settings.LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(path, when=settings.LOG_ROTATE_WHEN, backupCount=settings.LOG_BACKUP_COUNT,
+                                        encoding="utf-8", utc=True)
+    return RotatingFileHandler(path, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT,
+                               encoding="utf-8")
+
+def setup_logger(level: str = settings.LOG_LEVEL, log_format: str = settings.LOG_FORMAT,
+                 log_file: str = settings.LOG_FILE, queue_size: int = settings.LOG_QUEUE_SIZE,
+                 debug_sample_rate: float = settings.LOG_DEBUG_SAMPLE_RATE) -> QueueListener:
+    """Route the root logger through a queue to a background writer thread
+
+    ``log_format`` is json for log shippers or text for a terminal; an empty
+    ``log_file`` logs to stdout only. When ``queue_size`` records are waiting,
+    further records are dropped rather than waited for. Calling it again
+    replaces the previous pipeline.
+    """
+    global _listener, _queue_handler
+    shutdown_logger()
+
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s')
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    _queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+    _queue_handler.addFilter(RequestIdFilter())
 
-    # Configure root logger
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler) 
\ No newline at end of file
+    root_logger.setLevel(level)
+    root_logger.addHandler(_queue_handler)
+
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def shutdown_logger():
+    """Detach the queue handler and write out the records still queued"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = None
+
+def _logging_metric_families():
+    dropped = _queue_handler.dropped if _queue_handler is not None else 0
+    return [family("log_records_dropped_total", "counter", "Log records dropped because the log queue was full",
+                   samples=[((), dropped)])]
+
+metrics.register_collector(_logging_metric_families)
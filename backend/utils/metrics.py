@@ -0,0 +1,255 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of request and query duration histograms
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Gauges derived after merging workers: name -> (hits counter, misses counter)
+RATIOS = {"cache_hit_ratio": ("cache_hits_total", "cache_misses_total")}
+
+# A family is a JSON-serialisable dict:
+#   {"name", "type": counter|gauge|histogram, "help", "labels": [...],
+#    "buckets": [...] (histograms only), "samples": [[label values], value]}
+# where a histogram value is {"buckets": [per-bucket counts], "sum", "count"}.
+Family = Dict
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def family(self) -> Family:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {"name": self.name, "type": "counter", "help": self.help,
+                "labels": list(self.labels), "samples": samples}
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def family(self) -> Family:
+        with self._lock:
+            samples = [
+                [list(key), {"buckets": counts[:-1], "sum": counts[-1], "count": sum(counts[:-1])}]
+                for key, counts in self._values.items()
+            ]
+        return {"name": self.name, "type": "histogram", "help": self.help,
+                "labels": list(self.labels), "buckets": list(self.buckets), "samples": samples}
+
+def family(name: str, type: str, help: str, labels: Sequence[str] = (),
+           samples: Iterable[Tuple[Sequence[str], float]] = ()) -> Family:
+    """Family for collectors that read existing counters at scrape time"""
+    return {"name": name, "type": type, "help": help, "labels": list(labels),
+            "samples": [[list(key), value] for key, value in samples]}
+
+def bucket_family(name: str, help: str, labels: Sequence[str], bucket_bounds: Sequence[float],
+                  samples: Iterable[Tuple[Sequence[str], List[int], float]]) -> Family:
+    """Histogram family from existing per-bucket counts (last count is +Inf) and their sum"""
+    return {
+        "name": name, "type": "histogram", "help": help, "labels": list(labels),
+        "buckets": list(bucket_bounds),
+        "samples": [
+            [list(key), {"buckets": list(counts), "sum": total, "count": sum(counts)}]
+            for key, counts, total in samples
+        ],
+    }
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text format
+
+    Counters and histograms aggregate in memory behind a per-metric lock, so
+    recording costs a dict lookup. Collectors export counters the services
+    already keep (cache hits, pool checkouts) when scraped. With
+    ``multiproc_dir`` each worker writes its snapshot there every
+    ``flush_interval`` seconds and a scrape of any worker merges them all:
+    counters and histograms are summed, gauges are labelled with the worker
+    pid and dropped once a worker stops writing. Clear the directory when
+    deploying, like prometheus_client's multiprocess mode.
+    """
+
+    def __init__(self, multiproc_dir: str = settings.METRICS_MULTIPROC_DIR,
+                 flush_interval: float = settings.METRICS_FLUSH_INTERVAL):
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(name, lambda: Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, help, labels, buckets))
+
+    def _register(self, name: str, create):
+        # Get-or-create, so reloaded modules and tests reuse the same metric
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = create()
+            return self._metrics[name]
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        self._collectors.append(collector)
+
+    def collect(self) -> List[Family]:
+        families = [metric.family() for metric in list(self._metrics.values())]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", getattr(collector, "__name__", collector), e)
+        return families
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics-{pid}.json")
+
+    def flush(self):
+        """Write this worker's snapshot for the other workers to merge"""
+        if not self.multiproc_dir:
+            return
+        path = self._path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.collect(), f)
+        os.replace(path + ".tmp", path)
+
+    def _snapshots(self) -> List[Tuple[Optional[int], List[Family]]]:
+        own = os.getpid()
+        snapshots = [(own if self.multiproc_dir else None, self.collect())]
+        if not self.multiproc_dir:
+            return snapshots
+        stale_before = time.time() - 3 * self.flush_interval
+        for entry in os.scandir(self.multiproc_dir):
+            if not (entry.name.startswith("metrics-") and entry.name.endswith(".json")):
+                continue
+            try:
+                pid = int(entry.name[len("metrics-"):-len(".json")])
+                if pid == own:
+                    continue
+                with open(entry.path) as f:
+                    families = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable metrics snapshot %s: %s", entry.path, e)
+                continue
+            if entry.stat().st_mtime < stale_before:
+                # Worker gone: its counters still count, its gauges no longer hold
+                families = [f for f in families if f["type"] != "gauge"]
+            snapshots.append((pid, families))
+        return snapshots
+
+    def render(self) -> str:
+        return render(merge(self._snapshots()))
+
+def merge(snapshots: List[Tuple[Optional[int], List[Family]]]) -> List[Family]:
+    merged: Dict[str, Family] = {}
+    values: Dict[str, Dict[Tuple[str, ...], object]] = {}
+    for pid, families in snapshots:
+        for source in families:
+            name = source["name"]
+            gauge_pid = source["type"] == "gauge" and pid is not None
+            if name not in merged:
+                merged[name] = dict(source, labels=source["labels"] + (["pid"] if gauge_pid else []))
+                values[name] = {}
+            target = values[name]
+            for label_values, value in source["samples"]:
+                key = tuple(label_values) + ((str(pid),) if gauge_pid else ())
+                if source["type"] == "histogram":
+                    current = target.get(key)
+                    if current is None:
+                        target[key] = {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                    else:
+                        current["buckets"] = [a + b for a, b in zip(current["buckets"], value["buckets"])]
+                        current["sum"] += value["sum"]
+                        current["count"] += value["count"]
+                else:
+                    target[key] = target.get(key, 0) + value
+    for name, merged_family in merged.items():
+        merged_family["samples"] = [[list(key), value] for key, value in values[name].items()]
+
+    for name, (hits_name, misses_name) in RATIOS.items():
+        if hits_name not in merged:
+            continue
+        hits = {tuple(key): value for key, value in merged[hits_name]["samples"]}
+        misses = {tuple(key): value for key, value in merged.get(misses_name, {"samples": []})["samples"]}
+        merged[name] = family(name, "gauge", "Hit ratio since start, over all workers", merged[hits_name]["labels"], [
+            (key, value / (value + misses.get(key, 0)) if value + misses.get(key, 0) else 0.0)
+            for key, value in hits.items()
+        ])
+    return list(merged.values())
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(families: List[Family]) -> str:
+    lines = []
+    for family in families:
+        if not family["samples"]:
+            continue
+        name, labels = family["name"], family["labels"]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for label_values, value in family["samples"]:
+            if family["type"] != "histogram":
+                lines.append(f"{name}{_labels(labels, label_values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*family["buckets"], "+Inf"], value["buckets"]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_labels(labels, label_values, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels, label_values)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(labels, label_values)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+async def run_flusher(registry: "MetricsRegistry"):
+    """Write this worker's snapshot periodically, off the event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, registry.flush)
+        except Exception as e:
+            logger.warning("Failed to write metrics snapshot: %s", e)
+        await asyncio.sleep(registry.flush_interval)
+
+metrics = MetricsRegistry()
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import and_, bindparam, desc, or_
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past the row with the given sort key"""
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def apply_keyset(query, created_at_column, id_column, limit: int, cursor: Optional[str] = None):
+    """Restrict a Query or select() to one page newest first, ordered on (created_at, id)
+
+    Seeks past the cursor so the database can start from a composite
+    (created_at, id) index instead of scanning and discarding an OFFSET.
+    The comparison is spelled out rather than written as a row value, which
+    MySQL 5.7 does not match against the index. One extra row is fetched to
+    detect the next page.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        created_at = bindparam(None, created_at, type_=created_at_column.type)
+        query = query.filter(or_(
+            created_at_column < created_at,
+            and_(created_at_column == created_at, id_column < bindparam(None, row_id, type_=id_column.type))
+        ))
+    return query.order_by(desc(created_at_column), desc(id_column)).limit(limit + 1)
+
+def split_page(rows: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """Rows of the page and the cursor of the next one, or None on the last page"""
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.created_at, last.id)
+
+def keyset_page(query, created_at_column, id_column, limit: int,
+                cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    """One page of a Query, see ``apply_keyset``"""
+    rows = apply_keyset(query, created_at_column, id_column, limit, cursor).all()
+    return split_page(rows, limit)
@@ -14,16 +14,25 @@ interface Project {
 
 export function ProjectList() {
   const [projects, setProjects] = useState<Project[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loading, setLoading] = useState(true)
   
-  useEffect(() => {
-    const fetchProjects = async () => {
-      const data = await listProjects()
-      setProjects(data)
+  const fetchProjects = async (cursor?: string) => {
+    setLoading(true)
+    try {
+      const page = await listProjects({ cursor })
+      setProjects(previous => cursor ? [...previous, ...page.items] : page.items)
+      setNextCursor(page.nextCursor)
+    } finally {
+      setLoading(false)
     }
+  }
+  
+  useEffect(() => {
     fetchProjects()
   }, [])
   
-  if (projects.length === 0) {
+  if (loading && projects.length === 0) {
     return <div>Loading...</div>
   }
   
@@ -65,6 +74,17 @@ export function ProjectList() {
           </li>
         ))}
       </ul>
+      {nextCursor && (
+        <div className="p-4">
+          <button
+            className="btn-primary w-full"
+            onClick={() => fetchProjects(nextCursor)}
+            disabled={loading}
+          >
+            {loading ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   )
 } 
\ No newline at end of file
@@ -16,8 +16,26 @@ api.interceptors.request.use(config => {
   return config
 })
 
-export const generateProject = async (requirements: string) => {
-  const response = await api.post('/api/generate', { description: requirements })
+// 生成在后台任务中执行：入队后轮询任务状态，成功时返回生成的项目
+export const generateProject = async (requirements: string, pollInterval = 2000) => {
+  let job = (await api.post('/api/generate', { prompt: requirements })).data
+  while (job.status === 'queued' || job.status === 'running') {
+    await new Promise(resolve => setTimeout(resolve, pollInterval))
+    job = await getGenerationJob(job.id)
+  }
+  if (job.status !== 'succeeded') {
+    throw new Error(job.error || `Generation ${job.status}`)
+  }
+  return { job, project: { id: job.project_id } }
+}
+
+export const getGenerationJob = async (jobId: number) => {
+  const response = await api.get(`/api/generate/jobs/${jobId}`)
+  return response.data
+}
+
+export const cancelGenerationJob = async (jobId: number) => {
+  const response = await api.delete(`/api/generate/jobs/${jobId}`)
   return response.data
 }
 
@@ -26,13 +44,23 @@ export const getProject = async (projectId: string) => {
   return response.data
 }
 
-export const listProjects = async (params?: {
-  skip?: number
+// 键集分页：nextCursor 为下一页游标，最后一页为 null
+export const listProjects = async (params: {
+  cursor?: string
   limit?: number
   projectType?: string
-}) => {
-  const response = await api.get('/api/projects', { params })
-  return response.data
+} = {}) => {
+  const response = await api.get('/api/projects', {
+    params: {
+      cursor: params.cursor,
+      limit: params.limit,
+      project_type: params.projectType
+    }
+  })
+  return {
+    items: response.data,
+    nextCursor: (response.headers['x-next-cursor'] as string | undefined) ?? null
+  }
 }
 
 export const login = async (email: string, password: string) => {